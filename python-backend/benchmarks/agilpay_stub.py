@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita a Agilpay para pruebas de carga y benchmarks sin conexión.
+
+Implementa el endpoint de tokens (/oauth/paymenttoken) y la página de pago (/Payment), que
+envía el callback a payment-response. La latencia, los errores, los timeouts y las respuestas
+lentas son configurables por argumentos, variables de entorno (STUB_*) o en caliente con
+POST /__stub/config.
+
+    python benchmarks/agilpay_stub.py --port 5055 --latency-ms 200 --latency-dist lognormal \\
+        --error-rate 0.02 --callback-url http://127.0.0.1:5000/api/agilpay/payment-response
+
+    export AGILPAY_TOKEN_URL=http://127.0.0.1:5055/oauth/paymenttoken
+    export AGILPAY_PAYMENT_URL=http://127.0.0.1:5055/Payment
+"""
+import argparse
+import base64
+import html
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+# Valores por defecto; cada uno se puede sobreescribir con la variable STUB_<NOMBRE>
+DEFAULTS = {
+    'latency_ms': 50.0,          # Media (o mediana en lognormal) de la latencia del token
+    'latency_dist': 'fixed',
+    'jitter_ms': 0.0,            # Amplitud (uniform) o desviación (normal) en ms
+    'sigma': 0.5,                # Dispersión de la lognormal
+    'error_rate': 0.0,           # Fracción de respuestas 5xx
+    'error_status': 503,
+    'timeout_rate': 0.0,         # Fracción de peticiones que nunca responden a tiempo
+    'timeout_s': 60.0,
+    'slow_body_rate': 0.0,       # Fracción de respuestas cuyo cuerpo se envía por goteo
+    'slow_body_s': 5.0,
+    'client_id': '',             # Si se configura, se validan las credenciales (401)
+    'client_secret': '',
+    'approve_rate': 1.0,         # Fracción de pagos aprobados en /Payment
+    'callback_url': '',          # URL de payment-response a la que se envía el callback
+    'callback_delay_s': 0.0,
+    'callback_duplicates': 1,    # Veces que se envía cada callback (para probar la deduplicación)
+}
+
+
+class StubConfig:
+    """Configuración compartida por los hilos del servidor; se puede cambiar en caliente"""
+
+    def __init__(self, **overrides):
+        self._lock = threading.Lock()
+        self._values = dict(DEFAULTS)
+        for name, default in DEFAULTS.items():
+            env = os.environ.get(f'STUB_{name.upper()}')
+            if env is not None:
+                self._values[name] = type(default)(env)
+        self.update({name: value for name, value in overrides.items() if value is not None})
+
+    def update(self, values):
+        unknown = [name for name in values if name not in DEFAULTS]
+        if unknown:
+            raise ValueError(f'Opciones desconocidas: {", ".join(unknown)}')
+        if values.get('latency_dist', self._values['latency_dist']) not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f'latency_dist debe ser una de: {", ".join(LATENCY_DISTRIBUTIONS)}')
+        with self._lock:
+            for name, value in values.items():
+                self._values[name] = type(DEFAULTS[name])(value)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+def sample_latency(config):
+    """Latencia en segundos según la distribución configurada"""
+    mean = config['latency_ms'] / 1000
+    jitter = config['jitter_ms'] / 1000
+    dist = config['latency_dist']
+    if dist == 'uniform':
+        value = random.uniform(mean - jitter, mean + jitter)
+    elif dist == 'normal':
+        value = random.gauss(mean, jitter)
+    elif dist == 'lognormal':
+        value = random.lognormvariate(math.log(mean), config['sigma']) if mean > 0 else 0.0
+    elif dist == 'exponential':
+        value = random.expovariate(1 / mean) if mean > 0 else 0.0
+    else:
+        value = mean
+    return max(value, 0.0)
+
+
+class StubStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.in_flight = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, **self.counts}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config):
+        super().__init__(address, StubHandler)
+        self.config = config
+        self.stats = StubStats()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _send(self, status, body, content_type='application/json', slow_s=0.0):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if slow_s <= 0 or not body:
+            self.wfile.write(body)
+            return
+        # Cuerpo por goteo: los bytes se reparten a lo largo de slow_s segundos
+        chunks = min(len(body), 20)
+        size = math.ceil(len(body) / chunks)
+        for start in range(0, len(body), size):
+            self.wfile.write(body[start:start + size])
+            self.wfile.flush()
+            time.sleep(slow_s / chunks)
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == '/__stub/stats':
+            self._send(200, self.server.stats.snapshot())
+        elif path == '/__stub/config':
+            self._send(200, self.server.config.snapshot())
+        elif path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        stats = self.server.stats
+        with stats._lock:
+            stats.in_flight += 1
+        try:
+            if path == '/oauth/paymenttoken':
+                self._token()
+            elif path == '/Payment':
+                self._payment()
+            elif path == '/__stub/config':
+                self._update_config()
+            else:
+                self._read_body()
+                self._send(404, {'error': 'not found'})
+        finally:
+            with stats._lock:
+                stats.in_flight -= 1
+
+    def _update_config(self):
+        try:
+            self.server.config.update(json.loads(self._read_body() or b'{}'))
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+            return
+        self._send(200, self.server.config.snapshot())
+
+    def _token(self):
+        config = self.server.config.snapshot()
+        stats = self.server.stats
+        try:
+            payload = json.loads(self._read_body() or b'{}')
+        except ValueError:
+            stats.incr('token_bad_request')
+            self._send(400, {'error': 'invalid_request'})
+            return
+
+        if config['client_id'] and (payload.get('client_id') != config['client_id']
+                                    or payload.get('client_secret') != config['client_secret']):
+            stats.incr('token_unauthorized')
+            self._send(401, {'error': 'invalid_client'})
+            return
+
+        roll = random.random()
+        if roll < config['timeout_rate']:
+            stats.incr('token_timeout')
+            time.sleep(config['timeout_s'])
+            self.close_connection = True
+            return
+
+        time.sleep(sample_latency(config))
+        roll -= config['timeout_rate']
+        if roll < config['error_rate']:
+            stats.incr('token_error')
+            self._send(config['error_status'], {'error': 'upstream_unavailable'})
+            return
+
+        token_body = {
+            'sub': payload.get('client_id'),
+            'orderId': payload.get('orderId'),
+            'amount': payload.get('amount'),
+            'jti': uuid.uuid4().hex
+        }
+        token = 'stub.' + base64.urlsafe_b64encode(json.dumps(token_body).encode()).decode().rstrip('=')
+        slow = random.random() < config['slow_body_rate']
+        stats.incr('token_slow_body' if slow else 'token_ok')
+        self._send(200, {'access_token': token, 'token_type': 'bearer', 'expires_in': 600},
+                   slow_s=config['slow_body_s'] if slow else 0.0)
+
+    def _payment(self):
+        config = self.server.config.snapshot()
+        form = dict(urllib.parse.parse_qsl(self._read_body().decode('utf-8')))
+        try:
+            detail = json.loads(form.get('Detail', '{}'))
+            payment = detail['Payments'][0]
+            order_id = payment['Service']
+            amount = payment.get('Amount')
+        except (ValueError, KeyError, IndexError, TypeError):
+            self.server.stats.incr('payment_bad_request')
+            self._send(400, '<p>Detail inválido</p>', 'text/html; charset=utf-8')
+            return
+
+        approved = random.random() < config['approve_rate']
+        self.server.stats.incr('payment_approved' if approved else 'payment_declined')
+        callback = {
+            'TransactionId': uuid.uuid4().hex,
+            'Service': order_id,
+            'Status': '00' if approved else 'declined',
+            'Amount': str(amount),
+        }
+        if config['callback_url']:
+            threading.Thread(target=self._send_callback, args=(config, callback), daemon=True).start()
+
+        target = form.get('SuccessURL') if approved else form.get('ReturnURL')
+        page = (f'<html><head><meta http-equiv="refresh" content="0;url={html.escape(target or "")}"></head>'
+                f'<body><p>Pago {"aprobado" if approved else "rechazado"} (stub): '
+                f'orden {html.escape(order_id)}, transacción {callback["TransactionId"]}</p></body></html>')
+        self._send(200, page, 'text/html; charset=utf-8')
+
+    def _send_callback(self, config, callback):
+        time.sleep(config['callback_delay_s'])
+        data = urllib.parse.urlencode(callback).encode('utf-8')
+        for _ in range(max(config['callback_duplicates'], 1)):
+            try:
+                urllib.request.urlopen(config['callback_url'], data=data, timeout=10).close()
+                self.server.stats.incr('callback_sent')
+            except OSError:
+                self.server.stats.incr('callback_failed')
+
+
+def start_in_thread(host='127.0.0.1', port=0, **config):
+    """Arranca el stub en un hilo (para benchmarks en proceso); devuelve el servidor"""
+    server = StubServer((host, port), StubConfig(**config))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('STUB_PORT', '5055')))
+    for name, default in DEFAULTS.items():
+        kwargs = {'type': type(default), 'default': None, 'help': f'(por defecto {default!r})'}
+        if name == 'latency_dist':
+            kwargs['choices'] = LATENCY_DISTRIBUTIONS
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, **kwargs)
+    args = vars(parser.parse_args())
+    host, port = args.pop('host'), args.pop('port')
+
+    server = StubServer((host, port), StubConfig(**args))
+    print(f"Stub de Agilpay escuchando en http://{host}:{server.server_port}")
+    print(f"  AGILPAY_TOKEN_URL=http://{host}:{server.server_port}/oauth/paymenttoken")
+    print(f"  AGILPAY_PAYMENT_URL=http://{host}:{server.server_port}/Payment")
+    print(f"  Configuración: {json.dumps(server.config.snapshot())}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Control de admisión: un cliente abusivo satura create-payment mientras otro cliente normal paga.
+
+Levanta el stub local de Agilpay y gunicorn (clientes identificados por X-API-Key) y, con y sin
+límites, lanza a la vez:
+
+    abusivo     --flood clientes concurrentes sin pausa con la misma API key
+    normal      una petición cada 1/--rate segundos con otra API key (dentro de su límite)
+
+y reporta, por cliente, peticiones atendidas (200), rechazadas (429/503) y la latencia del
+cliente normal. Sin límites el abusivo ocupa todos los hilos y la cola de Agilpay; con límites
+se le responde 429 de inmediato y el cliente normal mantiene la latencia del token.
+
+    pip install -r requirements-async.txt gunicorn
+    python benchmarks/bench_admission.py --flood 64 --duration 10 --latency 200
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import aiohttp
+
+from loadgen import percentile, start_server, start_stub, stop_process
+
+PAYMENT_BODY = {
+    'customer_name': 'Juan Pérez',
+    'customer_email': 'juan@example.com',
+    'customer_address': 'Calle 123, Ciudad',
+    'items': [{'sku': 'PROD-A', 'quantity': 1}]
+}
+
+
+async def post(client, api_key, stats):
+    started = time.perf_counter()
+    try:
+        async with client.post('/api/agilpay/create-payment', json=PAYMENT_BODY,
+                               headers={'X-API-Key': api_key}) as response:
+            await response.read()
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        status = 'error'
+    stats.setdefault(status, 0)
+    stats[status] += 1
+    return time.perf_counter() - started, status
+
+
+async def flood(client, stop_at, stats):
+    while time.perf_counter() < stop_at:
+        _, status = await post(client, 'abusive', stats)
+        if status != 200:
+            await asyncio.sleep(0.01)  # un cliente que reintenta sin respetar Retry-After
+
+
+async def steady(client, stop_at, rate, stats, latencies):
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        elapsed, status = await post(client, 'steady', stats)
+        if status == 200:
+            latencies.append(elapsed)
+        await asyncio.sleep(max(1 / rate - (time.perf_counter() - started), 0))
+
+
+async def run(base_url, flood_clients, rate, duration):
+    connector = aiohttp.TCPConnector(limit=flood_clients + 2)
+    timeout = aiohttp.ClientTimeout(total=60)
+    abusive, normal, latencies = {}, {}, []
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=timeout) as client:
+        stop_at = time.perf_counter() + duration
+        await asyncio.gather(steady(client, stop_at, rate, normal, latencies),
+                             *(flood(client, stop_at, abusive) for _ in range(flood_clients)))
+    return abusive, normal, latencies
+
+
+def describe(stats):
+    return ' '.join(f'{status}:{count}' for status, count in sorted(stats.items(), key=str))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flood', type=int, default=64, help='Conexiones concurrentes del cliente abusivo')
+    parser.add_argument('--rate', type=float, default=2, help='Peticiones por segundo del cliente normal')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=200, help='Latencia del stub en ms')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rules', default='agilpay.create_payment=5/s:10', help='RATE_LIMIT_RULES')
+    parser.add_argument('--max-in-flight', default='16', help='AGILPAY_MAX_IN_FLIGHT')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(latency_ms=args.latency)
+    db_dir = tempfile.mkdtemp(prefix='bench-admission-')
+    base_env = dict(os.environ,
+                    AGILPAY_TOKEN_URL=f'{stub_url}/oauth/paymenttoken',
+                    DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+                    WORKER_THREADS=str(args.threads),
+                    AGILPAY_BREAKER_SLOW_CALL='60',
+                    RATE_LIMIT_KEY_HEADER='X-API-Key')
+    variants = {
+        'sin límites': dict(RATE_LIMIT_ENABLED='false', AGILPAY_MAX_IN_FLIGHT='0'),
+        'con límites': dict(RATE_LIMIT_ENABLED='true', RATE_LIMIT_RULES=args.rules,
+                            AGILPAY_MAX_IN_FLIGHT=args.max_in_flight),
+    }
+    print(f"Stub {args.latency:.0f} ms | abusivo {args.flood} conexiones | normal {args.rate}/s | "
+          f"{args.threads} hilos | {args.duration:.0f} s")
+    print(f"{'variante':<12} {'normal p50 ms':>14} {'normal p99 ms':>14} {'normal':<24} {'abusivo'}")
+    try:
+        for name, overrides in variants.items():
+            process, base_url = start_server('gunicorn', dict(base_env, **overrides), args.threads)
+            try:
+                abusive, normal, latencies = asyncio.run(run(base_url, args.flood, args.rate, args.duration))
+            finally:
+                stop_process(process)
+            p50 = percentile(latencies, 50) * 1000 if latencies else float('nan')
+            p99 = percentile(latencies, 99) * 1000 if latencies else float('nan')
+            print(f"{name:<12} {p50:>14.1f} {p99:>14.1f} {describe(normal):<24} {describe(abusive)}")
+    finally:
+        stop_process(stub)
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
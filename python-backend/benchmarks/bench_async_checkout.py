@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: create-payment síncrono (Flask + gunicorn gthread) vs asíncrono (src/asgi.py + uvicorn).
+
+Levanta el stub local de Agilpay (agilpay_stub.py) con latencia inyectada, arranca cada
+servidor en un subproceso y lo somete a la misma carga concurrente.
+
+    pip install -r requirements-async.txt gunicorn
+    python benchmarks/bench_async_checkout.py --latency 200 --concurrency 200 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import aiohttp
+
+from loadgen import start_server, start_stub, stop_process, summarize
+
+PAYMENT_BODY = {
+    'customer_name': 'Juan Pérez',
+    'customer_email': 'juan@example.com',
+    'customer_address': 'Calle 123, Ciudad',
+    'items': [{'sku': 'PROD-A', 'quantity': 1}]
+}
+
+
+async def run_load(base_url, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=timeout) as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with client.post('/api/agilpay/create-payment', json=PAYMENT_BODY) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=200, help='Latencia del stub en ms')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8, help='Hilos del worker síncrono')
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--output', help='Guarda los resultados en un archivo JSON')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(latency_ms=args.latency)
+    db_dir = tempfile.mkdtemp(prefix='bench-checkout-')
+    env = dict(os.environ,
+               AGILPAY_TOKEN_URL=f'{stub_url}/oauth/paymenttoken',
+               DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+               WORKER_THREADS=str(args.threads),
+               AGILPAY_BREAKER_SLOW_CALL='60',
+               RATE_LIMIT_ENABLED='false',
+               AGILPAY_MAX_IN_FLIGHT='0')
+
+    results = {}
+    for mode in args.modes.split(','):
+        process, base_url = start_server('gunicorn' if mode == 'sync' else 'uvicorn', env, args.threads)
+        try:
+            asyncio.run(run_load(base_url, min(args.concurrency, 50), args.concurrency))  # calentamiento
+            results[mode] = asyncio.run(run_load(base_url, args.requests, args.concurrency))
+        finally:
+            stop_process(process)
+
+    print(f"Latencia upstream: {args.latency:.0f} ms | concurrencia: {args.concurrency} | "
+          f"peticiones: {args.requests} | hilos sync: {args.threads}")
+    print(f"{'modo':<6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    for mode, result in results.items():
+        print(f"{mode:<6} {result['throughput_rps']:>9} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2)
+
+    stop_process(stub)
+    shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Lote de órdenes: N llamadas a create-payment en serie vs una llamada a create-payments.
+
+Levanta el stub local de Agilpay (agilpay_stub.py) con latencia lognormal y mide, en proceso
+(cliente de pruebas de Flask), el tiempo total de cada forma de enviar el lote y, para el modo
+NDJSON, cuándo llega el primer resultado. La suma y el máximo de las latencias de los tokens
+en serie son las referencias: el lote debería acercarse al máximo (por tandas de
+AGILPAY_BATCH_CONCURRENCY tokens) y no a la suma.
+
+    python benchmarks/bench_batch_checkout.py --orders 8,24,48 --latency 200
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadgen import start_stub, stop_process
+
+ORDER = {
+    'customer_name': 'Juan Pérez',
+    'customer_email': 'juan@example.com',
+    'customer_address': 'Calle 123, Ciudad',
+    'items': [{'sku': 'PROD-A', 'quantity': 1}]
+}
+
+
+def sequential(client, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = client.post('/api/agilpay/create-payment', json=ORDER)
+        assert response.status_code == 200, response.get_json()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def batch(client, count):
+    started = time.perf_counter()
+    response = client.post('/api/agilpay/create-payments', json={'orders': [ORDER] * count})
+    summary = response.get_json()['summary']
+    return time.perf_counter() - started, summary['succeeded']
+
+
+def batch_ndjson(client, count):
+    started = time.perf_counter()
+    response = client.post('/api/agilpay/create-payments?format=ndjson', json={'orders': [ORDER] * count},
+                           buffered=False)
+    lines = response.iter_encoded()
+    next(lines)
+    first = time.perf_counter() - started
+    for _ in lines:
+        pass
+    response.close()
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', default='8,24,48', help='Tamaños de lote separados por comas')
+    parser.add_argument('--latency', type=float, default=200, help='Mediana de la latencia del stub en ms')
+    parser.add_argument('--concurrency', type=int, default=8, help='AGILPAY_BATCH_CONCURRENCY')
+    args = parser.parse_args()
+
+    stub, stub_url = start_stub(latency_ms=args.latency, latency_dist='lognormal', sigma=0.4)
+    work_dir = tempfile.mkdtemp(prefix='bench-batch-')
+    # La configuración de Agilpay se lee al importar la app
+    os.environ.update(AGILPAY_TOKEN_URL=f'{stub_url}/oauth/paymenttoken',
+                      AGILPAY_BATCH_CONCURRENCY=str(args.concurrency),
+                      AGILPAY_POOL_SIZE=str(max(args.concurrency, 8)),
+                      AGILPAY_BREAKER_SLOW_CALL='60',
+                      RATE_LIMIT_ENABLED='false')
+    from src.main import create_app, init_database
+    from src.services.orders import order_queue
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(work_dir, 'batch.db')}",
+                      'CHECK_SCHEMA': False})
+    logging.disable(logging.WARNING)
+    try:
+        with app.app_context():
+            init_database()
+        client = app.test_client()
+        sequential(client, 4)  # calentamiento (conexiones keep-alive, índice de precios)
+
+        print(f"Latencia del token: lognormal, mediana {args.latency:.0f} ms | concurrencia {args.concurrency}")
+        print(f"{'órdenes':>8} {'serie s':>9} {'suma tokens s':>14} {'máx token s':>12} "
+              f"{'lote s':>8} {'NDJSON 1º s':>12} {'NDJSON s':>9} {'ok':>5}")
+        for count in (int(value) for value in args.orders.split(',')):
+            started = time.perf_counter()
+            latencies = sequential(client, count)
+            serial = time.perf_counter() - started
+            elapsed, succeeded = batch(client, count)
+            first, streamed = batch_ndjson(client, count)
+            print(f"{count:>8} {serial:>9.2f} {sum(latencies):>14.2f} {max(latencies):>12.2f} "
+                  f"{elapsed:>8.2f} {first:>12.2f} {streamed:>9.2f} {succeeded:>5}")
+    finally:
+        order_queue.stop()
+        stop_process(stub)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tiempo de arranque en frío de un worker.
+
+Cada repetición usa un intérprete nuevo y mide: importar src.main, create_app() y la primera
+petición (test client). Con --auto-create se repite con AUTO_CREATE_SCHEMA (el trabajo de
+esquema por worker que antes se hacía al importar), y con --gunicorn se mide también desde
+que se lanza gunicorn hasta la primera respuesta 200.
+
+    python benchmarks/bench_cold_start.py --runs 10 --auto-create --gunicorn
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadgen import BACKEND_DIR, init_database, start_server, stop_process
+
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+app = src.main.create_app({'AUTO_CREATE_SCHEMA': %s})
+created = time.perf_counter()
+response = app.test_client().get('/api/agilpay/products')
+assert response.status_code == 200, response.status_code
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (done - created) * 1000,
+    'ready_ms': (done - started) * 1000,
+}))
+'''
+
+
+def run_child(env, auto_create):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD % auto_create], cwd=BACKEND_DIR, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def median_of(runs):
+    return {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--auto-create', action='store_true',
+                        help='Comparar con la creación del esquema en cada worker')
+    parser.add_argument('--gunicorn', action='store_true', help='Medir también el arranque de gunicorn')
+    parser.add_argument('--output', help='Guarda los resultados en un archivo JSON')
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix='bench-cold-')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+               APP_ENV='production')
+    init_database(env)
+
+    results = {}
+    variants = [('lazy', False)] + ([('auto_create', True)] if args.auto_create else [])
+    try:
+        for name, auto_create in variants:
+            run_child(env, auto_create)  # calentamiento de la caché de disco y de .pyc
+            results[name] = median_of([run_child(env, auto_create) for _ in range(args.runs)])
+
+        if args.gunicorn:
+            boots = []
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                process, _ = start_server('gunicorn', env, threads=4, init_db=False)
+                boots.append({'process_ms': (time.perf_counter() - started) * 1000})
+                stop_process(process)
+            results['gunicorn'] = median_of(boots)
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+    print(f"Mediana de {args.runs} arranques (ms)")
+    print(f"{'variante':<12} {'import':>8} {'create_app':>11} {'1a petición':>12} {'listo':>8} {'proceso':>8}")
+    for name, result in results.items():
+        print(f"{name:<12} {result.get('import_ms', '-'):>8} {result.get('create_app_ms', '-'):>11} "
+              f"{result.get('first_request_ms', '-'):>12} {result.get('ready_ms', '-'):>8} "
+              f"{result['process_ms']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Lecturas y escrituras concurrentes de usuarios sobre SQLite, con y sin los ajustes del engine
+(src/services/db_engine.py).
+
+Cada modo usa su propia base en --dir con --users usuarios. Durante --seconds, --readers hilos
+consultan usuarios (GET /api/users/<id> y una página de GET /api/users) y --writers hilos los
+modifican (PUT y, cada 4 operaciones, POST + DELETE), todo a través de las rutas de la app con la
+caché de usuarios desactivada. Modos:
+
+    rollback   diario clásico (DELETE), synchronous=FULL y el pool por defecto (antes de este módulo)
+    wal        los pragmas y el pool de DB_ENGINE_CONFIG (WAL, synchronous=NORMAL...)
+
+    python benchmarks/bench_db_concurrency.py --readers 6 --writers 2 --seconds 10
+
+Con --dir en el mismo disco que la base de producción el costo de fsync es el real.
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text
+
+from src.main import create_app, init_database
+from src.models.user import User, db
+from src.services.db_engine import engine_options, sqlite_pragmas
+from src.services.user_cache import user_cache
+
+MODES = ('rollback', 'wal')
+
+
+def mode_config(mode, path):
+    uri = f'sqlite:///{path}'
+    if mode == 'rollback':
+        options, pragmas = {}, {}
+    else:
+        options, pragmas = engine_options(uri), sqlite_pragmas()
+    return {'SQLALCHEMY_DATABASE_URI': uri, 'SQLALCHEMY_ENGINE_OPTIONS': options,
+            'SQLITE_PRAGMAS': pragmas, 'AUTO_CREATE_SCHEMA': False, 'CHECK_SCHEMA': False}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.write_latencies = []
+
+    def add(self, reads=0, writes=0, errors=0, latency=None):
+        with self.lock:
+            self.reads += reads
+            self.writes += writes
+            self.errors += errors
+            if latency is not None:
+                self.write_latencies.append(latency)
+
+
+def reader(app, user_count, deadline, stats):
+    client = app.test_client()
+    while time.monotonic() < deadline:
+        if random.random() < 0.8:
+            response = client.get(f'/api/users/{random.randint(1, user_count)}')
+        else:
+            response = client.get('/api/users?limit=50')
+        stats.add(reads=1, errors=int(response.status_code >= 500))
+
+
+def writer(app, number, writers, user_count, deadline, stats):
+    client = app.test_client()
+    # Cada escritor modifica su propia partición de usuarios: sin conflictos de versión
+    own_ids = list(range(number + 1, user_count + 1, writers))
+    operation = 0
+    while time.monotonic() < deadline:
+        operation += 1
+        started = time.perf_counter()
+        if operation % 4:
+            user_id = random.choice(own_ids)
+            responses = [client.put(f'/api/users/{user_id}',
+                                    json={'email': f'user{user_id}-{operation}@example.com'})]
+        else:
+            created = client.post('/api/users', json={'username': f'bench-w{number}-{operation}',
+                                                      'email': f'bench-w{number}-{operation}@example.com'})
+            responses = [created]
+            if created.status_code == 201:
+                responses.append(client.delete(f"/api/users/{created.get_json()['data']['id']}"))
+        failed = sum(response.status_code >= 500 for response in responses)
+        stats.add(writes=len(responses), errors=failed, latency=time.perf_counter() - started)
+
+
+def run_mode(mode, args, work_dir):
+    path = os.path.join(work_dir, f'{mode}.db')
+    app = create_app(mode_config(mode, path))
+    with app.app_context():
+        init_database(seed=False)
+        db.session.execute(insert(User), [{'username': f'user{i}', 'email': f'user{i}@example.com'}
+                                          for i in range(1, args.users + 1)])
+        db.session.commit()
+        journal_mode = db.session.execute(text('PRAGMA journal_mode')).scalar()
+
+    stats = Stats()
+    deadline = time.monotonic() + args.seconds
+    threads = [threading.Thread(target=reader, args=(app, args.users, deadline, stats))
+               for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(app, number, args.writers, args.users, deadline, stats))
+                for number in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        db.engine.dispose()
+    latencies = sorted(stats.write_latencies) or [0]
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000
+    print(f"{mode:<9} {journal_mode:<8} {stats.reads / args.seconds:>9.0f} {stats.writes / args.seconds:>10.0f} "
+          f"{p99:>13.1f} {stats.errors:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--dir', help='Directorio para las bases (por defecto uno temporal)')
+    args = parser.parse_args()
+
+    random.seed(1)
+    # Se mide la base de datos, no la caché de GET /api/users/<id>
+    user_cache.enabled = False
+    work_dir = tempfile.mkdtemp(prefix='bench-db-', dir=args.dir)
+    logging.disable(logging.WARNING)
+    try:
+        print(f"{args.readers} lectores, {args.writers} escritores, {args.seconds:.0f} s, {args.users} usuarios")
+        print(f"{'modo':<9} {'diario':<8} {'lect/s':>9} {'escr/s':>10} {'escr p99 ms':>13} {'errores':>8}")
+        for mode in args.modes.split(','):
+            run_mode(mode, args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Costo de serialización de las respuestas JSON, sin servidor ni base de datos en el camino.
+
+Compara, para los cuerpos de productos (página de 50 y de 200), usuarios (200 filas) y
+create-payment (10 items): el proveedor por defecto de Flask (json), el proveedor de la app
+(orjson si está instalado) y el cuerpo pre-serializado con json_response(). También mide el
+parseo del cuerpo de create-payment (request.get_json).
+
+    python benchmarks/bench_json.py --iterations 2000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench-json.db')}")
+
+from flask.json.provider import DefaultJSONProvider
+
+from src.main import create_app
+from src.routes.agilpay import build_payment_result
+from src.services import json_provider
+from src.services.json_provider import encode_json, json_response
+from src.services.pricing import PriceIndex, price_cart, to_amount
+
+PAYMENT_BODY = {
+    'customer_name': 'Juan Pérez',
+    'customer_email': 'juan@example.com',
+    'customer_address': 'Calle 123, Ciudad',
+    'items': [{'product_id': i, 'quantity': 1 + i % 3} for i in range(1, 11)]
+}
+
+PRICE_INDEX = PriceIndex.from_rows([(i, f'SKU-{i:05d}', f'Producto {i}', f'{19.99 + i:.2f}', 'general')
+                                    for i in range(1, 11)])
+
+
+def products_body(count):
+    return {
+        'success': True,
+        'data': [{
+            'id': i,
+            'sku': f'SKU-{i:05d}',
+            'name': f'Producto {i}',
+            'description': 'Descripción detallada del producto con varias palabras de texto',
+            'price': round(9.99 + i * 1.5, 2),
+            'category': ('básico', 'premium', 'hogar')[i % 3],
+            'image_url': f'https://cdn.example.com/img/{i}.jpg',
+            'active': True,
+        } for i in range(1, count + 1)],
+        'pagination': {'page': 1, 'per_page': count, 'total': 1000, 'pages': 1000 // count},
+    }
+
+
+def users_body(count):
+    return {
+        'success': True,
+        'data': [{'id': i, 'username': f'usuario_{i}', 'email': f'usuario_{i}@example.com'}
+                 for i in range(1, count + 1)],
+        'next_cursor': 'eyJpZCI6MjAwfQ',
+    }
+
+
+def payment_order():
+    cart = price_cart(PAYMENT_BODY['items'], index=PRICE_INDEX)
+    return {'order_id': 'ORD-20240101-abcdef12', 'total_amount': to_amount(cart.total),
+            'items': cart.agilpay_items(), 'cart': cart}
+
+
+def timed(fn, iterations):
+    for _ in range(min(iterations // 10, 200)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app({'APP_ENV': 'production', 'CHECK_SCHEMA': False})
+    # Los logs de cada pago dominarían la medición
+    logging.disable(logging.INFO)
+    stdlib = DefaultJSONProvider(app)
+    fast = app.json
+    order = payment_order()
+    raw_payment = json.dumps(PAYMENT_BODY).encode('utf-8')
+
+    def payment_result():
+        return build_payment_result(PAYMENT_BODY, order, 'token-' + 'x' * 200)
+
+    def with_stdlib(fn):
+        # Detail de create-payment también pasa por encode_json: se fuerza la librería estándar
+        def run():
+            previous, json_provider.USE_ORJSON = json_provider.USE_ORJSON, False
+            try:
+                return fn()
+            finally:
+                json_provider.USE_ORJSON = previous
+        return run
+
+    cases = [
+        ('products (50)', products_body(50)),
+        ('products (200)', products_body(200)),
+        ('users (200)', users_body(200)),
+    ]
+    rows = []
+    with app.app_context():
+        for name, body in cases:
+            encoded = encode_json(body)
+            rows.append((name, len(encoded),
+                         timed(lambda: stdlib.response(body), args.iterations),
+                         timed(lambda: fast.response(body), args.iterations),
+                         timed(lambda: json_response(encoded), args.iterations)))
+        rows.append(('create-payment', len(encode_json(payment_result())),
+                     timed(with_stdlib(lambda: stdlib.response(payment_result())), args.iterations),
+                     timed(lambda: fast.response(payment_result()), args.iterations),
+                     None))
+        rows.append(('get_json (pago)', len(raw_payment),
+                     timed(lambda: stdlib.loads(raw_payment), args.iterations),
+                     timed(lambda: fast.loads(raw_payment), args.iterations),
+                     None))
+
+    print(f"Serialización, µs por respuesta (orjson {'sí' if json_provider.USE_ORJSON else 'no'})")
+    print(f"{'cuerpo':<16} {'bytes':>7} {'flask/json':>11} {'app.json':>9} {'pre-serializado':>16}")
+    for name, size, baseline, provider, pre_encoded in rows:
+        pre = f'{pre_encoded:.1f}' if pre_encoded is not None else '-'
+        print(f"{name:<16} {size:>7} {baseline:>11.1f} {provider:>9.1f} {pre:>16}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Valorización de carritos sintéticos con el motor de precios (src/services/pricing.py).
+
+Crea un catálogo de --products productos en una base SQLite temporal y valoriza carritos de
+distintos tamaños de tres formas: con el índice de precios en memoria (lo que usa
+create-payment), con una consulta IN por carrito y con una consulta por línea.
+
+    python benchmarks/bench_pricing.py --products 20000 --lines 10,1000,5000
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+
+from src.main import create_app, init_database
+from src.models.product import Product
+from src.models.user import db
+from src.services.pricing import PRICING_CONFIG, PriceIndex, parse_tiers, price_cart, price_index
+
+CATEGORIES = ('premium', 'estandar', 'basico', 'especial')
+
+# Reglas de ejemplo para que el benchmark incluya descuentos e impuesto
+RULES = dict(PRICING_CONFIG, tax_bp=1800, tax_exempt_categories=frozenset({'basico'}),
+             volume_discounts=parse_tiers('10:5,100:12.5'))
+
+
+def seed_catalog(count):
+    db.session.execute(insert(Product), [{
+        'sku': f'SKU-{i:06d}',
+        'name': f'Producto {i}',
+        'price': f'{random.randint(100, 99999) / 100:.2f}',
+        'category': CATEGORIES[i % len(CATEGORIES)],
+    } for i in range(1, count + 1)])
+    db.session.commit()
+
+
+def synthetic_cart(product_ids, lines):
+    return [{'product_id': random.choice(product_ids), 'quantity': random.randint(1, 150)}
+            for _ in range(lines)]
+
+
+def per_line_queries(cart):
+    # Referencia: una consulta por línea
+    index = PriceIndex.from_rows(
+        db.session.execute(select(Product.id, Product.sku, Product.name, Product.price, Product.category)
+                           .where(Product.id == item['product_id'])).one()
+        for item in cart)
+    return price_cart(cart, index=index, config=RULES)
+
+
+def batched_query(cart):
+    # Referencia: una sola consulta IN con los productos del carrito, sin caché
+    ids = {item['product_id'] for item in cart}
+    index = PriceIndex.from_rows(db.session.execute(
+        select(Product.id, Product.sku, Product.name, Product.price, Product.category)
+        .where(Product.id.in_(ids))).all())
+    return price_cart(cart, index=index, config=RULES)
+
+
+def cached_index(cart):
+    return price_cart(cart, index=price_index.current(), config=RULES)
+
+
+def timed(fn, cart, runs):
+    fn(cart)
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn(cart)
+    return (time.perf_counter() - started) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--lines', default='10,1000,5000', help='Tamaños de carrito separados por comas')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(1)
+    work_dir = tempfile.mkdtemp(prefix='bench-pricing-')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(work_dir, 'pricing.db')}",
+                      'CHECK_SCHEMA': False})
+    logging.disable(logging.INFO)
+    try:
+        with app.app_context():
+            init_database(seed=False)
+            seed_catalog(args.products)
+            product_ids = [row.id for row in db.session.execute(select(Product.id))]
+
+            started = time.perf_counter()
+            price_index.current()
+            build_ms = (time.perf_counter() - started) * 1000
+
+            print(f"Catálogo: {args.products} productos; índice construido en {build_ms:.1f} ms")
+            print(f"{'líneas':>7} {'índice ms':>10} {'IN ms':>9} {'por línea ms':>13} {'total':>14}")
+            for lines in (int(value) for value in args.lines.split(',')):
+                cart = synthetic_cart(product_ids, lines)
+                runs = max(args.runs * 10 // max(lines // 100, 1), 3)
+                cached = timed(cached_index, cart, runs)
+                batched = timed(batched_query, cart, runs)
+                per_line = timed(per_line_queries, cart, max(runs // 5, 1))
+                total = cached_index(cart).total
+                print(f"{lines:>7} {cached:>10.2f} {batched:>9.2f} {per_line:>13.2f} {total / 100:>14,.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
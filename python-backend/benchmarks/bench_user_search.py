@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Latencia de GET /api/users/search sobre una base SQLite temporal con --users usuarios sintéticos.
+
+Mide, con consultas tomadas de los datos generados:
+
+    prefix      prefijo de username/email con los índices lower(...) (modo por defecto)
+    fulltext    palabra del nombre o del email en la tabla FTS5 (mode=fulltext)
+    scan        referencia sin índice: lower(username) LIKE 'q%' OR lower(email) LIKE 'q%'
+
+    python benchmarks/bench_user_search.py --users 1000000 --queries 200
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, or_, select
+
+from src.main import create_app, init_database
+from src.models.user import User, db
+
+FIRST_NAMES = ('ana', 'juan', 'maria', 'jose', 'luis', 'carmen', 'pedro', 'laura', 'jorge', 'sofia',
+               'miguel', 'lucia', 'diego', 'elena', 'pablo', 'marta', 'andres', 'paula', 'raul', 'rosa')
+LAST_NAMES = ('garcia', 'rodriguez', 'martinez', 'lopez', 'gonzalez', 'perez', 'sanchez', 'ramirez',
+              'torres', 'flores', 'rivera', 'gomez', 'diaz', 'cruz', 'morales', 'reyes', 'jimenez',
+              'ortiz', 'castillo', 'vargas')
+DOMAINS = ('example.com', 'correo.do', 'empresa.com.do', 'mail.net')
+INSERT_BATCH = 50000
+
+
+def synthetic_user(i):
+    # Determinista por número: las consultas reconstruyen usuarios existentes
+    rng = random.Random(i)
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {'username': f'{first}_{last}{i}', 'email': f'{first}.{last}{i}@{rng.choice(DOMAINS)}'}
+
+
+def seed_users(count):
+    for start in range(1, count + 1, INSERT_BATCH):
+        stop = min(start + INSERT_BATCH, count + 1)
+        db.session.execute(insert(User), [synthetic_user(i) for i in range(start, stop)])
+    db.session.commit()
+
+
+def prefix_queries(user_count, count):
+    # Prefijos de 3 a 12 caracteres de usuarios existentes (username o email)
+    queries = []
+    for _ in range(count):
+        user = synthetic_user(random.randint(1, user_count))
+        value = random.choice((user['username'], user['email']))
+        queries.append(value[:random.randint(3, 12)])
+    return queries
+
+
+def fulltext_queries(user_count, count):
+    # Apellido con parte del número (p. ej. "garcia12") o nombre + apellido completos
+    queries = []
+    for _ in range(count):
+        number = random.randint(1, user_count)
+        user = synthetic_user(number)
+        last = user['username'].split('_')[1]
+        queries.append(last[:random.randint(len(last) - len(str(number)) + 1, len(last))]
+                       if random.random() < 0.5 else user['username'].replace('_', ' '))
+    return queries
+
+
+def scan(query, limit):
+    pattern = f'{query.lower()}%'
+    return db.session.execute(
+        select(User.id, User.username, User.email)
+        .where(or_(func.lower(User.username).like(pattern), func.lower(User.email).like(pattern)))
+        .limit(limit)).all()
+
+
+def measure(client, mode, queries, limit):
+    latencies = []
+    matched = 0
+    for query in queries:
+        started = time.perf_counter()
+        response = client.get('/api/users/search', query_string={'q': query, 'mode': mode, 'limit': limit})
+        latencies.append(time.perf_counter() - started)
+        matched += response.get_json()['count'] > 0
+    return latencies, matched
+
+
+def report(name, latencies, matched, total):
+    latencies.sort()
+    average = sum(latencies) / len(latencies) * 1000
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000
+    print(f"{name:<10} {average:>9.2f} {latencies[len(latencies) // 2] * 1000:>9.2f} {p99:>9.2f} "
+          f"{matched:>6}/{total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--scan-queries', type=int, default=20, help='Consultas de la referencia sin índice')
+    args = parser.parse_args()
+
+    random.seed(1)
+    work_dir = tempfile.mkdtemp(prefix='bench-search-')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(work_dir, 'search.db')}",
+                      'CHECK_SCHEMA': False})
+    logging.disable(logging.INFO)
+    try:
+        with app.app_context():
+            init_database(seed=False)
+            started = time.perf_counter()
+            seed_users(args.users)
+            print(f"{args.users} usuarios insertados (con índices y FTS5) en {time.perf_counter() - started:.1f} s")
+
+        client = app.test_client()
+        print(f"{'modo':<10} {'media ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'con resultados':>14}")
+        queries = prefix_queries(args.users, args.queries)
+        report('prefix', *measure(client, 'prefix', queries, args.limit), len(queries))
+        queries = fulltext_queries(args.users, args.queries)
+        report('fulltext', *measure(client, 'fulltext', queries, args.limit), len(queries))
+
+        with app.app_context():
+            latencies, matched = [], 0
+            for query in prefix_queries(args.users, args.scan_queries):
+                started = time.perf_counter()
+                matched += bool(scan(query, args.limit))
+                latencies.append(time.perf_counter() - started)
+            report('scan', latencies, matched, args.scan_queries)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
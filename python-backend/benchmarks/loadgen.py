@@ -0,0 +1,117 @@
+"""Utilidades compartidas por los benchmarks: servidores en subproceso y estadísticas de latencia."""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(BACKEND_DIR, 'benchmarks')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """Resumen de una serie de latencias (segundos) en el formato de los reportes JSON"""
+    total = len(latencies)
+    return {
+        'requests': total,
+        'errors': errors,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / total * 1000, 2) if total else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2) if total else 0.0,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url, process=None, attempts=150):
+    for _ in range(attempts):
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+DEVSERVER_CODE = ("from src.main import create_app; "
+                  "create_app('development').run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)")
+
+
+def server_command(kind, port, threads=8, workers=1):
+    """Comando para servir la app: gunicorn (gunicorn.conf.py), uvicorn (src/asgi.py) o devserver
+    (el servidor de desarrollo de `python main.py`, sin el reloader)"""
+    if kind == 'gunicorn':
+        if shutil.which('gunicorn') is None:
+            raise RuntimeError('gunicorn no está instalado (pip install gunicorn)')
+        return ['gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers), '--threads', str(threads),
+                '-b', f'127.0.0.1:{port}', '--log-level', 'warning']
+    if kind == 'devserver':
+        return [sys.executable, '-c', DEVSERVER_CODE.format(port=port)]
+    if kind == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'src.asgi:app', '--host', '127.0.0.1',
+                '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+    raise ValueError(f'Servidor desconocido: {kind}')
+
+
+def init_database(env):
+    """Crea el esquema de la base de datos de env['DATABASE_URL'] (flask init-db)"""
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'src.main', 'init-db'], cwd=BACKEND_DIR,
+                   env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def start_server(kind, env, threads=8, workers=1, init_db=True):
+    """Arranca la app en un subproceso y espera a que responda; devuelve (proceso, url base)"""
+    if init_db:
+        init_database(env)
+    port = free_port()
+    process = subprocess.Popen(server_command(kind, port, threads, workers), cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    if not wait_ready(f'{base_url}/api/agilpay/upstream/status', process):
+        stop_process(process)
+        raise RuntimeError(f'El servidor {kind} no arrancó')
+    return process, base_url
+
+
+def start_stub(**options):
+    """Arranca agilpay_stub.py en un subproceso; devuelve (proceso, url base)"""
+    port = free_port()
+    cmd = [sys.executable, os.path.join(BENCHMARKS_DIR, 'agilpay_stub.py'), '--port', str(port)]
+    for name, value in options.items():
+        cmd += ['--' + name.replace('_', '-'), str(value)]
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    if not wait_ready(f'{base_url}/health', process):
+        stop_process(process)
+        raise RuntimeError('El stub de Agilpay no arrancó')
+    return process, base_url
+
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
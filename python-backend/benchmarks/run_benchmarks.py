@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Suite de carga y latencia del backend.
+
+Ejecuta escenarios (productos, CRUD de usuarios, importación masiva y create-payment contra el
+stub local de Agilpay) con N clientes concurrentes durante un tiempo fijo, en proceso (cliente
+de pruebas de Flask) o contra un servidor real (gunicorn, uvicorn o el de desarrollo). Reporta
+throughput, p50/p95/p99 y tasa de errores, y guarda los resultados en JSON para comparar entre commits.
+
+    python benchmarks/run_benchmarks.py --modes inprocess,gunicorn --concurrency 16 --duration 10
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/<anterior>.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from loadgen import BACKEND_DIR, start_server, start_stub, stop_process, summarize
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'benchmarks', 'results')
+
+PAYMENT_BODY = {
+    'customer_name': 'Juan Pérez',
+    'customer_email': 'juan@example.com',
+    'customer_address': 'Calle 123, Ciudad',
+    'items': [{'sku': 'PROD-A', 'quantity': 1}]
+}
+
+
+class InProcessClient:
+    """Cliente sobre el test client de Flask (sin red ni servidor)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, **kwargs):
+        response = self.client.open(path, method=method, **kwargs)
+        return response.status_code, response.headers, response.get_data()
+
+
+class HttpClient:
+    """Cliente HTTP con keep-alive contra un servidor real"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def request(self, method, path, **kwargs):
+        response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+        return response.status_code, response.headers, response.content
+
+
+class Recorder:
+    """Latencias por (escenario, operación); cada hilo escribe en sus propias listas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.series = {}
+
+    def series_for(self, scenario, op):
+        key = (scenario, op)
+        with self._lock:
+            return self.series.setdefault(key, ([], [0]))
+
+
+class Worker:
+    def __init__(self, scenario, client, recorder, unique, options):
+        self.scenario = scenario
+        self.client = client
+        self.recorder = recorder
+        self.unique = unique
+        self.options = options
+        self.recording = False
+        self.etag = None
+        self.user_id = None
+        self._series = {}
+
+    def call(self, op, method, path, expect=(200,), **kwargs):
+        """Ejecuta y mide una petición; devuelve (status, cabeceras, cuerpo)"""
+        started = time.perf_counter()
+        try:
+            status, headers, body = self.client.request(method, path, **kwargs)
+        except requests.RequestException:
+            status, headers, body = None, {}, b''
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            series = self._series.get(op)
+            if series is None:
+                series = self._series[op] = self.recorder.series_for(self.scenario, op)
+            series[0].append(elapsed)
+            if status not in expect:
+                series[1][0] += 1
+        return status, headers, body
+
+
+# --- Escenarios: cada función ejecuta una iteración con una o más peticiones medidas ---
+
+def scenario_products(worker):
+    worker.call('list', 'GET', '/api/agilpay/products')
+
+
+def scenario_products_conditional(worker):
+    # Revalidación de un cliente con caché: tras la primera respuesta solo llegan 304
+    if worker.etag is None:
+        _, headers, _ = worker.call('list', 'GET', '/api/agilpay/products')
+        worker.etag = headers.get('ETag')
+        return
+    worker.call('not_modified', 'GET', '/api/agilpay/products',
+                headers={'If-None-Match': worker.etag}, expect=(304,))
+
+
+def scenario_users_list(worker):
+    worker.call('list', 'GET', '/api/users?limit=50')
+
+
+def scenario_users_list_conditional(worker):
+    # Igual que products_conditional: la página no cambia, así que el servidor responde 304
+    if worker.etag is None:
+        _, headers, _ = worker.call('list', 'GET', '/api/users?limit=50')
+        worker.etag = headers.get('ETag')
+        return
+    worker.call('not_modified', 'GET', '/api/users?limit=50',
+                headers={'If-None-Match': worker.etag}, expect=(304,))
+
+
+def scenario_user_crud(worker):
+    n = next(worker.unique)
+    status, _, body = worker.call('create', 'POST', '/api/users', expect=(201,),
+                               json={'username': f'bench_{n}', 'email': f'bench_{n}@example.com'})
+    if status != 201:
+        return
+    user_id = json.loads(body)['data']['id']
+    worker.call('get', 'GET', f'/api/users/{user_id}')
+    worker.call('update', 'PUT', f'/api/users/{user_id}', json={'username': f'bench_{n}_upd'})
+    worker.call('delete', 'DELETE', f'/api/users/{user_id}')
+
+
+def scenario_user_profile(worker):
+    # Lecturas repetidas del mismo perfil (storefront); cada cliente crea su usuario al empezar
+    if worker.user_id is None:
+        n = next(worker.unique)
+        status, _, body = worker.client.request('POST', '/api/users',
+                                                json={'username': f'profile_{n}', 'email': f'profile_{n}@example.com'})
+        if status == 201:
+            worker.user_id = json.loads(body)['data']['id']
+        return
+    worker.call('get', 'GET', f'/api/users/{worker.user_id}')
+
+
+def scenario_users_bulk(worker):
+    rows = worker.options.bulk_rows
+    start = next(worker.unique) * rows
+    payload = '\n'.join(json.dumps({'username': f'bulk_{i}', 'email': f'bulk_{i}@example.com'})
+                        for i in range(start, start + rows))
+    worker.call('bulk', 'POST', '/api/users/bulk', data=payload,
+                headers={'Content-Type': 'application/x-ndjson'})
+
+
+def scenario_create_payment(worker):
+    worker.call('create', 'POST', '/api/agilpay/create-payment', json=PAYMENT_BODY)
+
+
+SCENARIOS = {
+    'products': scenario_products,
+    'products_conditional': scenario_products_conditional,
+    'users_list': scenario_users_list,
+    'users_list_conditional': scenario_users_list_conditional,
+    'user_crud': scenario_user_crud,
+    'user_profile': scenario_user_profile,
+    'users_bulk': scenario_users_bulk,
+    'create_payment': scenario_create_payment,
+}
+
+
+def run_scenario(name, make_client, options):
+    recorder = Recorder()
+    unique = itertools.count(int(time.time() * 1000) % 10 ** 9 * 1000)
+    workers = [Worker(name, make_client(), recorder, unique, options) for _ in range(options.concurrency)]
+
+    stop_at = [0.0]
+    record_from = [0.0]
+
+    def loop(worker):
+        scenario = SCENARIOS[name]
+        while time.perf_counter() < stop_at[0]:
+            worker.recording = time.perf_counter() >= record_from[0]
+            scenario(worker)
+
+    now = time.perf_counter()
+    record_from[0] = now + options.warmup
+    stop_at[0] = record_from[0] + options.duration
+    threads = [threading.Thread(target=loop, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - record_from[0]
+
+    results = {}
+    for (_, op), (latencies, errors) in sorted(recorder.series.items()):
+        results[op] = summarize(latencies, errors[0], elapsed)
+        if name == 'users_bulk':
+            results[op]['rows_per_s'] = round(results[op]['throughput_rps'] * options.bulk_rows, 1)
+    return results
+
+
+def app_env(options, stub_url, db_path):
+    return dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{db_path}',
+        AGILPAY_TOKEN_URL=f'{stub_url}/oauth/paymenttoken',
+        AGILPAY_PAYMENT_URL=f'{stub_url}/Payment',
+        AGILPAY_BREAKER_SLOW_CALL='60',
+        WORKER_THREADS=str(options.threads),
+        # Todo el tráfico sale de un cliente: se mide el servicio, no el control de admisión
+        RATE_LIMIT_ENABLED='false',
+        AGILPAY_MAX_IN_FLIGHT='0',
+    )
+
+
+def run_mode(mode, scenarios, options, stub_url, work_dir):
+    db_path = os.path.join(work_dir, f'{mode}.db')
+    env = app_env(options, stub_url, db_path)
+
+    if mode == 'inprocess':
+        # Los módulos de la app leen su configuración del entorno al importarse
+        os.environ.update(env)
+        sys.path.insert(0, BACKEND_DIR)
+        from src.main import create_app
+        app = create_app({'AUTO_CREATE_SCHEMA': True})
+        import logging
+        logging.getLogger().setLevel(logging.WARNING)
+        try:
+            return {name: run_scenario(name, lambda: InProcessClient(app), options) for name in scenarios}
+        finally:
+            # Las colas confirman lo pendiente antes de que se borre la base temporal
+            from src.services.orders import order_queue
+            from src.services.payment_callbacks import callback_queue
+            for queue in (order_queue, callback_queue):
+                queue.stop()
+
+    process, base_url = start_server(mode, env, options.threads, options.workers)
+    try:
+        return {name: run_scenario(name, lambda: HttpClient(base_url), options) for name in scenarios}
+    finally:
+        stop_process(process)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(report, baseline=None):
+    header = f"{'modo':<10} {'escenario':<21} {'op':<13} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>6}"
+    if baseline:
+        header += f" {'Δrps %':>8} {'Δp99 %':>8}"
+    print(header)
+    for mode, scenarios in report['results'].items():
+        for scenario, ops in scenarios.items():
+            for op, result in ops.items():
+                line = (f"{mode:<10} {scenario:<21} {op:<13} {result['throughput_rps']:>9} "
+                        f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+                        f"{result['error_rate'] * 100:>6.2f}")
+                base = (baseline or {}).get('results', {}).get(mode, {}).get(scenario, {}).get(op)
+                if base:
+                    line += f" {_delta(base['throughput_rps'], result['throughput_rps']):>8} " \
+                            f"{_delta(base['p99_ms'], result['p99_ms']):>8}"
+                print(line)
+
+
+def _delta(before, after):
+    if not before:
+        return '-'
+    return f'{(after - before) / before * 100:+.1f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='inprocess',
+                        help='inprocess, devserver, gunicorn y/o uvicorn separados por comas')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='Segundos medidos por escenario')
+    parser.add_argument('--warmup', type=float, default=2, help='Segundos de calentamiento (no medidos)')
+    parser.add_argument('--threads', type=int, default=8, help='Hilos por worker del servidor')
+    parser.add_argument('--workers', type=int, default=1, help='Procesos del servidor')
+    parser.add_argument('--bulk-rows', type=int, default=500, help='Filas por petición en users_bulk')
+    parser.add_argument('--stub-latency-ms', type=float, default=50)
+    parser.add_argument('--output', help='Archivo JSON (por defecto benchmarks/results/<fecha>-<commit>.json)')
+    parser.add_argument('--baseline', help='JSON de una ejecución anterior para mostrar diferencias')
+    options = parser.parse_args()
+
+    scenarios = [name for name in options.scenarios.split(',') if name]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f'Escenarios desconocidos: {", ".join(unknown)}')
+
+    stub, stub_url = start_stub(latency_ms=options.stub_latency_ms)
+    work_dir = tempfile.mkdtemp(prefix='bench-suite-')
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'params': vars(options),
+        'results': {}
+    }
+    try:
+        for mode in options.modes.split(','):
+            report['results'][mode] = run_mode(mode, scenarios, options, stub_url, work_dir)
+    finally:
+        stop_process(stub)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = options.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['commit']}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResultados guardados en {output}')
+
+
+if __name__ == '__main__':
+    main()
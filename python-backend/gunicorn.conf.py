@@ -0,0 +1,92 @@
+"""
+Configuración de gunicorn para producción (se carga sola al ejecutar `gunicorn` en este directorio).
+
+    flask --app src.main init-db
+    gunicorn                      # o: gunicorn -c gunicorn.conf.py
+
+Workers gthread: cada worker atiende WORKER_THREADS peticiones a la vez, la mayor parte del
+tiempo esperando a Agilpay o a la base de datos. Todos los valores se pueden cambiar con
+variables de entorno (GUNICORN_*, WEB_CONCURRENCY, WORKER_THREADS).
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+cpu_count = multiprocessing.cpu_count()
+
+wsgi_app = 'src.main:create_app()'
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+
+# Un proceso por CPU (mínimo 2 para no perder capacidad al reciclar uno) y hilos para la espera de E/S
+workers = int(os.environ.get('WEB_CONCURRENCY', max(cpu_count, 2)))
+worker_class = 'gthread'
+threads = int(os.environ.get('WORKER_THREADS', min(max(4 * cpu_count, 8), 32)))
+# El pool de conexiones hacia Agilpay se dimensiona con WORKER_THREADS (src/services/upstream.py)
+os.environ.setdefault('WORKER_THREADS', str(threads))
+# Con varios workers la caché de usuarios debe ser común a todos: si no, tras un cambio los demás
+# seguirían sirviendo el perfil y el ETag viejos (y un If-Match con ese ETag fallaría con 412).
+# El archivo es propio de este master: otra instancia o una base distinta no lo comparten
+_user_cache_path = None
+if workers > 1 and 'USER_CACHE_BACKEND' not in os.environ:
+    os.environ['USER_CACHE_BACKEND'] = 'sqlite'
+    if 'USER_CACHE_PATH' not in os.environ:
+        _user_cache_path = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                                        f'agilpay-users-{os.getpid()}.db')
+        os.environ['USER_CACHE_PATH'] = _user_cache_path
+backlog = int(os.environ.get('GUNICORN_BACKLOG', '2048'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# La app se importa una vez en el master y los workers la heredan al hacer fork: arrancar o
+# agregar workers (TTIN) no vuelve a pagar la importación
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Reciclado de workers para acotar el crecimiento de memoria; el jitter evita reinicios simultáneos.
+# Al reciclar se cierran las conexiones keep-alive del worker (un proxy como nginx reintenta)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+
+# Apagado ordenado: tras SIGTERM se deja de aceptar y las peticiones en curso tienen hasta
+# graceful_timeout para terminar (mayor que AGILPAY_TOKEN_BUDGET, el límite de un checkout)
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+
+# Latido de los workers en memoria y no en disco
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Con preload, el master pudo abrir conexiones (p. ej. DB_AUTO_CREATE); un socket compartido
+    # entre procesos corrompe el protocolo, así que cada worker empieza con pools vacíos
+    if not server.cfg.preload_app:
+        return
+    from src.models.user import db
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Confirma las órdenes y callbacks encolados antes de que el worker termine (SIGTERM o max_requests).
+    # Las colas se vacían en paralelo y comparten la ventana de graceful_timeout: una detrás de otra
+    # podrían tardar el doble y el master mataría el worker (SIGKILL) antes de guardar lo pendiente
+    import threading
+    from src.services.orders import order_queue
+    from src.services.payment_callbacks import callback_queue
+    stoppers = [threading.Thread(target=queue.stop, kwargs={'timeout': graceful_timeout})
+                for queue in (order_queue, callback_queue)]
+    for stopper in stoppers:
+        stopper.start()
+    for stopper in stoppers:
+        stopper.join()
+
+
+def on_exit(server):
+    # La caché compartida de usuarios (ver arriba) no sobrevive al master
+    if _user_cache_path:
+        for path in glob.glob(_user_cache_path + '*'):
+            os.remove(path)
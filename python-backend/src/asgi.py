@@ -0,0 +1,84 @@
+"""
+Punto de entrada ASGI.
+
+create-payment se atiende de forma nativa en el event loop (cliente aiohttp),
+así miles de checkouts esperando a Agilpay comparten pocos workers. El resto de rutas
+(usuarios, productos, estáticos) sigue en la app Flask, montada con sus mismos blueprints.
+
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import sys
+import time
+# Igual que en main.py, para poder ejecutar desde cualquier directorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from a2wsgi import WSGIMiddleware
+
+from src.main import create_app
+from src.services.metrics import METRICS_CONFIG, http_in_flight, record_request
+from src.routes.agilpay_async import create_payment_asgi
+from src.services.upstream_async import close_async_client, aiohttp
+
+if aiohttp is None:
+    raise RuntimeError('aiohttp no está instalado (pip install -r requirements-async.txt)')
+
+# Rutas servidas de forma asíncrona: (método, ruta) -> (endpoint para métricas, handler)
+ASYNC_ROUTES = {
+    ('POST', '/api/agilpay/create-payment'): ('agilpay.create_payment', create_payment_asgi),
+}
+
+
+class CheckoutASGIApp:
+    """Despacha las rutas asíncronas y delega todo lo demás a la app WSGI"""
+
+    def __init__(self, wsgi_app, routes):
+        # Las rutas síncronas corren en un pool de hilos, como en gunicorn gthread
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=int(os.environ.get('WORKER_THREADS', '10')))
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http':
+            route = self.routes.get((scope['method'], scope['path'].rstrip('/') or '/'))
+            if route is not None:
+                endpoint, handler = route
+                if METRICS_CONFIG['enabled']:
+                    await self._measured(endpoint, handler, scope, receive, send)
+                else:
+                    await handler(scope, receive, send)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def _measured(self, endpoint, handler, scope, receive, send):
+        # Mismas métricas que las rutas de Flask (las delegadas ya se miden dentro de la app)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        http_in_flight.inc(endpoint)
+        try:
+            await handler(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(endpoint)
+            record_request(endpoint, scope['method'], status, time.perf_counter() - started)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await close_async_client()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = CheckoutASGIApp(create_app(), ASYNC_ROUTES)
@@ -0,0 +1,57 @@
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATABASE_PATH = os.path.join(BASE_DIR, 'database', 'app.db')
+# Escrituras pendientes de las colas que no se pudieron guardar al apagar (write_behind)
+DEFAULT_SPILL_DIR = os.path.join(BASE_DIR, 'database')
+
+# Perfiles de configuración; APP_ENV elige el perfil por defecto
+CONFIG_PROFILES = {
+    'development': {
+        'DEBUG': True,
+        # Comodidad en desarrollo: crea/actualiza el esquema al arrancar
+        'AUTO_CREATE_SCHEMA': True,
+    },
+    'production': {
+        'DEBUG': False,
+        # El esquema se crea en el despliegue con `flask --app src.main init-db`
+        'AUTO_CREATE_SCHEMA': False,
+    },
+    'testing': {
+        'TESTING': True,
+        'AUTO_CREATE_SCHEMA': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    },
+}
+
+
+def _env_flag(name):
+    value = os.environ.get(name)
+    return value.lower() == 'true' if value else None
+
+
+def load_config(config=None):
+    """Configuración de la app: perfil (nombre o APP_ENV) + variables de entorno + overrides.
+
+    `config` puede ser el nombre de un perfil o un dict; el dict puede indicar el perfil con 'APP_ENV'.
+    """
+    overrides = {'APP_ENV': config} if isinstance(config, str) else dict(config or {})
+    profile = overrides.pop('APP_ENV', None) or os.environ.get('APP_ENV', 'production')
+    if profile not in CONFIG_PROFILES:
+        raise ValueError(f"Perfil desconocido: {profile} (opciones: {', '.join(CONFIG_PROFILES)})")
+
+    settings = {
+        'APP_ENV': profile,
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT'),
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL') or f'sqlite:///{DEFAULT_DATABASE_PATH}',
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }
+    settings.update(CONFIG_PROFILES[profile])
+    auto_create = _env_flag('DB_AUTO_CREATE')
+    if auto_create is not None:
+        settings['AUTO_CREATE_SCHEMA'] = auto_create
+    # Sin AUTO_CREATE_SCHEMA se comprueba al arrancar que el esquema exista (falla si falta)
+    check_schema = _env_flag('DB_CHECK_SCHEMA')
+    settings['CHECK_SCHEMA'] = True if check_schema is None else check_schema
+    settings.update(overrides)
+    return settings
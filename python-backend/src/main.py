@@ -1,72 +1,134 @@
 import os
 import sys
+import time
 import logging
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+import click
+from flask import Flask
 from flask_cors import CORS
+from src.config import load_config
 from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.agilpay import agilpay_bp
-
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configuración de seguridad
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
-
-# Configurar CORS
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["*"],  # En producción, especificar dominios exactos
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(agilpay_bp, url_prefix='/api/agilpay')
-
-# Configuración de base de datos
-database_url = os.environ.get('DATABASE_URL')
-if database_url:
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Crear directorio de base de datos si no existe
-db_dir = os.path.join(os.path.dirname(__file__), 'database')
-if not os.path.exists(db_dir):
-    os.makedirs(db_dir)
-
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+
+# Rutas, servicios y modelos se importan en create_app (y lo que solo usa init-db, en init_database):
+# importar este módulo no los carga, y los opcionales no se cargan si están desactivados
+
+logger = logging.getLogger(__name__)
+
+STATIC_FOLDER = os.path.join(os.path.dirname(__file__), 'static')
+
+
+def create_app(config=None):
+    """Crea la app Flask.
+
+    `config` es el nombre de un perfil (development, production, testing) o un dict de
+    overrides; sin él se usa APP_ENV. No toca el esquema de la base de datos salvo con
+    AUTO_CREATE_SCHEMA (perfil de desarrollo); en producción se usa `flask --app src.main init-db`
+    y, si falta alguna tabla, create_app falla con RuntimeError (CHECK_SCHEMA).
+    """
+    started = time.perf_counter()
+
+    # Configurar logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    # Sin la ruta estática de Flask: los archivos se sirven desde memoria (static_assets)
+    app = Flask(__name__, static_folder=None)
+    app.config.update(load_config(config))
+    from src.services import db_engine, json_provider, metrics, rate_limit
+    # jsonify/get_json con orjson si está instalado
+    json_provider.init_app(app)
+
+    # Métricas (GET /metrics); antes que el resto de hooks para medir la petición completa
+    metrics.init_app(app)
+    # Perfilado bajo demanda (desactivado por defecto, ver PROFILER_*): sin PROFILER_ENABLED ni
+    # PROFILER_ADMIN_TOKEN no hay nada que perfilar ni rutas que servir y no se importa
+    if os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true' or os.environ.get('PROFILER_ADMIN_TOKEN'):
+        from src.services import profiler
+        profiler.init_app(app)
+    # Límites por cliente (429) antes de cualquier trabajo de la petición, ver RATE_LIMIT_*
+    rate_limit.init_app(app)
+
+    # Configurar CORS
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["*"],  # En producción, especificar dominios exactos
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+
+    from src.routes.user import user_bp
+    from src.routes.agilpay import agilpay_bp
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(agilpay_bp, url_prefix='/api/agilpay')
+
+    # Pool de conexiones y pragmas de SQLite (WAL...), ver DB_POOL_* y DB_SQLITE_*
+    db_engine.init_app(app)
+    from src.services.orders import order_queue
+    from src.services.payment_callbacks import callback_queue
+    from src.services.pricing import price_index
+    order_queue.init_app(app)
+    callback_queue.init_app(app)
+    price_index.init_app(app)
+
+    from src.services import static_assets
+    static_assets.init_app(app, STATIC_FOLDER)
+    app.cli.add_command(init_db_command)
+
+    if app.config['AUTO_CREATE_SCHEMA']:
+        with app.app_context():
+            init_database()
+    elif app.config['CHECK_SCHEMA'] and not _loaded_for_cli_command():
+        from src.models.schema import check_schema
+        with app.app_context():
+            check_schema()
+
+    logger.info(f"App creada en {(time.perf_counter() - started) * 1000:.1f} ms "
+                f"(perfil {app.config['APP_ENV']})")
+    return app
+
+
+def _loaded_for_cli_command():
+    """Indica si la app se carga para un comando de `flask` (init-db...) y no para servir.
+
+    `flask run` carga la app dentro de su propio comando; el resto de comandos la cargan antes,
+    al resolverlos, con el contexto del grupo `flask` activo.
+    """
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.info_name != 'run'
+
+
+def init_database(seed=True):
+    """Crea/actualiza el esquema y carga el catálogo inicial (requiere app context)"""
+    from src.models.order import Order, OrderItem, PaymentEvent  # Registra las tablas en db.metadata
+    from src.models.product import seed_default_products
+    from src.models.schema import create_schema
+    from src.services.user_search import create_search_index
+    create_schema()
+    create_search_index()
+    if seed:
+        seed_default_products()
+
+
+@click.command('init-db')
+@click.option('--no-seed', is_flag=True, help='No cargar el catálogo inicial de productos')
+def init_db_command(no_seed):
+    """Crea las tablas, aplica las columnas/índices nuevos y carga el catálogo inicial."""
+    init_database(seed=not no_seed)
+    click.echo(f"Base de datos lista: {db.engine.url.render_as_string(hide_password=True)}")
+
+
+def __getattr__(name):
+    # `src.main:app` (gunicorn, flask, asgi.py) crea la app en el primer acceso, no al importar
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app('development').run(host='0.0.0.0', port=5000, debug=True)
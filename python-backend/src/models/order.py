@@ -0,0 +1,57 @@
+from datetime import datetime
+from src.models.user import db
+
+class Order(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.String(36), unique=True, nullable=False)
+    customer_name = db.Column(db.String(200), nullable=False)
+    customer_email = db.Column(db.String(120), nullable=False, index=True)
+    customer_address = db.Column(db.String(500), nullable=False)
+    total_amount = db.Column(db.Numeric(12, 2), nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default='840')
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    items = db.relationship('OrderItem', backref='order', lazy='selectin', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<Order {self.order_id}>'
+
+    def to_dict(self):
+        return {
+            'order_id': self.order_id,
+            'customer_name': self.customer_name,
+            'customer_email': self.customer_email,
+            'customer_address': self.customer_address,
+            'total_amount': float(self.total_amount),
+            'currency': self.currency,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'items': [item.to_dict() for item in self.items]
+        }
+
+class OrderItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_pk = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    description = db.Column(db.String(200), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Numeric(12, 2), nullable=False)
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+
+    def to_dict(self):
+        return {
+            'description': self.description,
+            'quantity': self.quantity,
+            'unit_price': float(self.unit_price),
+            'amount': float(self.amount)
+        }
+
+class PaymentEvent(db.Model):
+    """Callback de Agilpay ya procesado; el índice único de transaction_id deduplica reintentos"""
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.String(100), unique=True, nullable=False)
+    order_id = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    received_at = db.Column(db.DateTime, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
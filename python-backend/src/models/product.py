@@ -0,0 +1,86 @@
+from datetime import datetime
+from src.models.user import db
+
+class Product(db.Model):
+    __table_args__ = (
+        # Listado del storefront: activos, filtrados por categoría y paginados por id
+        db.Index('ix_product_active_category_id', 'active', 'category', 'id'),
+        db.Index('ix_product_active_id', 'active', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sku = db.Column(db.String(64), unique=True, nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False, default='')
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    category = db.Column(db.String(80), nullable=False, default='general')
+    image = db.Column(db.String(500))
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<Product {self.sku}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sku': self.sku,
+            'name': self.name,
+            'description': self.description,
+            'price': float(self.price),
+            'category': self.category,
+            'image': self.image
+        }
+
+# Catálogo inicial (el que antes estaba fijo en /api/agilpay/products)
+DEFAULT_PRODUCTS = [
+    {
+        'sku': 'PROD-A',
+        'name': 'Producto Premium A',
+        'description': 'Descripción detallada del producto premium A',
+        'price': '99.99',
+        'category': 'premium',
+        'image': 'https://via.placeholder.com/300x200?text=Producto+A'
+    },
+    {
+        'sku': 'PROD-B',
+        'name': 'Producto Estándar B',
+        'description': 'Descripción detallada del producto estándar B',
+        'price': '59.99',
+        'category': 'estandar',
+        'image': 'https://via.placeholder.com/300x200?text=Producto+B'
+    },
+    {
+        'sku': 'PROD-C',
+        'name': 'Producto Básico C',
+        'description': 'Descripción detallada del producto básico C',
+        'price': '29.99',
+        'category': 'basico',
+        'image': 'https://via.placeholder.com/300x200?text=Producto+C'
+    },
+    {
+        'sku': 'PROD-D',
+        'name': 'Producto Deluxe D',
+        'description': 'Descripción detallada del producto deluxe D',
+        'price': '149.99',
+        'category': 'premium',
+        'image': 'https://via.placeholder.com/300x200?text=Producto+D'
+    },
+    {
+        'sku': 'PROD-E',
+        'name': 'Producto Especial E',
+        'description': 'Descripción detallada del producto especial E',
+        'price': '79.99',
+        'category': 'especial',
+        'image': 'https://via.placeholder.com/300x200?text=Producto+E'
+    }
+]
+
+def seed_default_products():
+    """Carga el catálogo inicial si la tabla de productos está vacía"""
+    if db.session.query(Product.id).first() is not None:
+        return 0
+    db.session.add_all(Product(**data) for data in DEFAULT_PRODUCTS)
+    db.session.commit()
+    return len(DEFAULT_PRODUCTS)
@@ -0,0 +1,88 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.sql.elements import TextClause
+import logging
+import os
+
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+def _default_sql(column):
+    """DEFAULT de la columna para ALTER TABLE (solo server_default)"""
+    if column.server_default is None:
+        return ''
+    arg = column.server_default.arg
+    if isinstance(arg, TextClause):
+        return f' DEFAULT {arg.text}'
+    return " DEFAULT '{}'".format(str(arg).replace("'", "''"))
+
+def _index_names(conn, inspector, table_name):
+    """Índices de la tabla; en SQLite se leen de sqlite_master porque el inspector omite los de expresiones"""
+    if conn.dialect.name == 'sqlite':
+        return set(conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {'table': table_name}
+        ).scalars())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+def upgrade_schema():
+    """Agrega a las tablas existentes las columnas e índices nuevos de los modelos.
+
+    db.create_all() solo crea tablas que no existen; esto cubre las bases ya creadas
+    (por ejemplo src/database/app.db) sin herramienta de migraciones. Las columnas con
+    info={'backfill': expr} se rellenan con esa expresión en las filas existentes.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                not_null = ' NOT NULL' if not column.nullable and column.server_default is not None else ''
+                conn.execute(text(
+                    f'ALTER TABLE {preparer.format_table(table)} '
+                    f'ADD COLUMN {preparer.format_column(column)} {column_type}{_default_sql(column)}{not_null}'
+                ))
+                backfill = column.info.get('backfill')
+                if backfill is not None:
+                    conn.execute(table.update().where(column.is_(None)).values({column.name: backfill}))
+                logger.info(f"Columna agregada: {table.name}.{column.name}")
+
+            existing_indexes = _index_names(conn, inspector, table.name)
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+                    logger.info(f"Índice creado: {index.name}")
+
+def check_schema():
+    """Falla al arrancar si faltan tablas de los modelos (la base nunca pasó por init-db).
+
+    Sin esto la app arranca y cada escritura falla después: las colas de órdenes y callbacks
+    apartan todo lo que ya se confirmó al cliente.
+    """
+    existing_tables = set(inspect(db.engine).get_table_names())
+    missing = [table.name for table in db.metadata.sorted_tables if table.name not in existing_tables]
+    if missing:
+        raise RuntimeError(
+            f"Faltan tablas en {db.engine.url.render_as_string(hide_password=True)} "
+            f"({', '.join(missing)}): ejecute `flask --app src.main init-db` antes de arrancar "
+            f"o use DB_AUTO_CREATE=true"
+        )
+
+def create_schema():
+    """Crea las tablas que falten y aplica upgrade_schema (paso explícito de despliegue)"""
+    url = db.engine.url
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'):
+        # Directorio del archivo SQLite (p. ej. src/database)
+        os.makedirs(os.path.dirname(os.path.abspath(url.database)), exist_ok=True)
+    db.create_all()
+    upgrade_schema()
@@ -1,12 +1,29 @@
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
 import re
 
 db = SQLAlchemy()
 
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
+    # Para sincronizaciones incrementales (export con updated_since)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           index=True, info={'backfill': func.current_timestamp()})
+    # Bloqueo optimista: cada UPDATE/DELETE de la sesión exige la versión leída y la incrementa.
+    # Se expone como ETag (If-None-Match / If-Match)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __mapper_args__ = {'version_id_col': version}
+    # Búsqueda por prefijo sin distinguir mayúsculas (GET /api/users/search)
+    __table_args__ = (
+        db.Index('ix_user_username_lower', func.lower(username)),
+        db.Index('ix_user_email_lower', func.lower(email)),
+    )
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -20,17 +37,31 @@ class User(db.Model):
     
     def validate(self):
         """Valida los datos del usuario"""
+        return User.validate_fields(self.username, self.email)
+    
+    @staticmethod
+    def validate_fields(username, email):
+        """Valida username y email sin necesidad de instanciar el modelo"""
+        return User.validate_changes({'username': username, 'email': email})
+
+    @staticmethod
+    def validate_changes(changes):
+        """Valida solo los campos presentes en `changes` (actualizaciones parciales)"""
         errors = []
-        
-        if not self.username or len(self.username.strip()) < 2:
-            errors.append("Username debe tener al menos 2 caracteres")
-        
-        if not self.email or not self._is_valid_email(self.email):
-            errors.append("Email debe tener un formato válido")
-            
+
+        if 'username' in changes:
+            username = changes['username']
+            if not username or len(username.strip()) < 2:
+                errors.append("Username debe tener al menos 2 caracteres")
+
+        if 'email' in changes:
+            email = changes['email']
+            if not email or not User._is_valid_email(email):
+                errors.append("Email debe tener un formato válido")
+
         return errors
     
-    def _is_valid_email(self, email):
+    @staticmethod
+    def _is_valid_email(email):
         """Valida formato de email"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return EMAIL_PATTERN.match(email) is not None
@@ -1,9 +1,24 @@
-from flask import Blueprint, request, jsonify
-import requests
-import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from itertools import chain
 import uuid
 import logging
+import math
 import os
+import re
+import threading
+import time
+from src.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from src.services.catalog import catalog_cache
+from src.models.product import Product
+from src.models.order import Order
+from src.services.orders import order_queue, order_record
+from src.services.write_behind import QueueFull
+from src.services.payment_callbacks import callback_queue, parse_callback
+from src.services.metrics import upstream_latency, upstream_rejections
+from src.services.json_provider import encode_json, json_response
+from src.services.pricing import PricingError, price_cart, to_amount
+from src.services.rate_limit import Overloaded, upstream_slots
 
 agilpay_bp = Blueprint('agilpay', __name__)
 logger = logging.getLogger(__name__)
@@ -14,53 +29,215 @@ AGILPAY_CONFIG = {
     'client_secret': os.environ.get('AGILPAY_CLIENT_SECRET', 'Dynapay'),
     'merchant_key': os.environ.get('AGILPAY_MERCHANT_KEY', 'TEST-001'),
     'token_url': os.environ.get('AGILPAY_TOKEN_URL', 'https://sandbox-webapi.agilpay.net/oauth/paymenttoken'),
-    'payment_url': os.environ.get('AGILPAY_PAYMENT_URL', 'https://sandbox-webpay.agilpay.net/Payment')
+    'payment_url': os.environ.get('AGILPAY_PAYMENT_URL', 'https://sandbox-webpay.agilpay.net/Payment'),
+    # Presupuesto total (segundos) para obtener el token, incluyendo reintentos
+    'token_budget': float(os.environ.get('AGILPAY_TOKEN_BUDGET', '15'))
 }
 
-def get_oauth_token(order_id, customer_id, amount):
-    """Obtiene el token JWT de Agilpay"""
+# Lotes de create-payments: tokens en paralelo con un pool de hilos acotado y un deadline por lote
+BATCH_CONFIG = {
+    'max_orders': int(os.environ.get('AGILPAY_BATCH_MAX_ORDERS', '50')),
+    # Tokens simultáneos por proceso (las conexiones las acota además el pool hacia Agilpay)
+    'concurrency': int(os.environ.get('AGILPAY_BATCH_CONCURRENCY', os.environ.get('WORKER_THREADS', '8'))),
+    # Presupuesto (segundos) del lote completo; las órdenes que no alcanzan a pedir su token fallan con 504
+    'budget': float(os.environ.get('AGILPAY_BATCH_BUDGET', AGILPAY_CONFIG['token_budget']))
+}
+
+# Breaker del endpoint de tokens: mientras está abierto se falla rápido sin contactar a Agilpay
+token_breaker = CircuitBreaker('agilpay_token')
+
+def _token_payload(order_id, customer_id, amount):
+    """Cuerpo de la solicitud de token (compartido por las rutas síncrona y asíncrona)"""
+    return encode_json({
+        'grant_type': 'client_credentials',
+        'client_id': AGILPAY_CONFIG['client_id'],
+        'client_secret': AGILPAY_CONFIG['client_secret'],
+        'orderId': order_id,
+        'customerId': customer_id,
+        'amount': amount
+    }, sort_keys=False)
+
+TOKEN_HEADERS = {
+    'Content-Type': 'application/json'
+}
+
+def _extract_token(order_id, status_code, response):
+    """Extrae el access_token de la respuesta de Agilpay o registra el error"""
+    if status_code == 200:
+        token = response.json().get('access_token')
+        if token:
+            logger.info(f"Token obtenido exitosamente para orden {order_id}")
+            return token
+        logger.error(f"Token no encontrado en respuesta para orden {order_id}")
+        return None
+    logger.error(f"Error obteniendo token: {status_code} - {response.text}")
+    return None
+
+def get_oauth_token(order_id, customer_id, amount, deadline=None):
+    """Obtiene el token JWT de Agilpay (lanza CircuitOpenError si el circuito está abierto
+    y Overloaded si ya hay AGILPAY_MAX_IN_FLIGHT llamadas en curso)"""
+    # requests/urllib3 se cargan con la primera llamada a Agilpay, no al arrancar el worker
+    import requests
+    from src.services.upstream import get_client, deadline_in
+
+    upstream_slots.acquire()
+    try:
+        token_breaker.allow()
+    except CircuitOpenError:
+        upstream_slots.release()
+        upstream_rejections.inc('agilpay_token')
+        raise
+    started = time.monotonic()
+    failed = True
+    outcome = 'exception'
     try:
-        payload = {
-            'grant_type': 'client_credentials',
-            'client_id': AGILPAY_CONFIG['client_id'],
-            'client_secret': AGILPAY_CONFIG['client_secret'],
-            'orderId': order_id,
-            'customerId': customer_id,
-            'amount': amount
-        }
-        
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        
         logger.info(f"Solicitando token para orden {order_id}")
         
-        response = requests.post(
+        if deadline is None:
+            deadline = deadline_in(AGILPAY_CONFIG['token_budget'])
+        
+        response = get_client().post(
             AGILPAY_CONFIG['token_url'],
-            data=json.dumps(payload),
-            headers=headers,
-            timeout=30
+            data=_token_payload(order_id, customer_id, amount),
+            headers=TOKEN_HEADERS,
+            deadline=deadline
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            token = data.get('access_token')
-            if token:
-                logger.info(f"Token obtenido exitosamente para orden {order_id}")
-                return token
-            else:
-                logger.error(f"Token no encontrado en respuesta para orden {order_id}")
-                return None
-        else:
-            logger.error(f"Error obteniendo token: {response.status_code} - {response.text}")
-            return None
+        failed = response.status_code >= 500
+        token = _extract_token(order_id, response.status_code, response)
+        outcome = 'ok' if token else 'error'
+        return token
             
     except requests.RequestException as e:
+        outcome = 'timeout' if isinstance(e, requests.Timeout) else 'connection_error'
         logger.error(f"Error de conexión obteniendo token: {str(e)}")
         return None
     except Exception as e:
         logger.error(f"Excepción obteniendo token: {str(e)}")
         return None
+    finally:
+        upstream_slots.release()
+        elapsed = time.monotonic() - started
+        token_breaker.record(elapsed, failed)
+        upstream_latency.observe(elapsed, 'agilpay_token', outcome)
+
+# Cuerpos constantes serializados una vez: se devuelven en ráfagas cuando hay sobrecarga
+CIRCUIT_OPEN_BODY = encode_json({
+    'success': False,
+    'error': 'Servicio de pagos no disponible temporalmente'
+})
+BUSY_BODY = encode_json({
+    'success': False,
+    'error': 'Servicio ocupado, intenta de nuevo'
+})
+CALLBACK_RECEIVED_BODY = encode_json({
+    'success': True,
+    'status': 'received',
+    'message': 'Respuesta procesada correctamente'
+})
+
+def _circuit_open_response(error):
+    """Respuesta 503 inmediata mientras el circuito hacia Agilpay está abierto"""
+    return json_response(CIRCUIT_OPEN_BODY, status=503,
+                         headers={'Retry-After': str(max(math.ceil(error.retry_after), 1))})
+
+def _busy_response():
+    """Respuesta 503 cuando la cola de órdenes o el cupo de llamadas a Agilpay están llenos"""
+    return json_response(BUSY_BODY, status=503, headers={'Retry-After': '1'})
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Longitud máxima de los campos de texto (columnas de Order): lo que se acepta aquí debe poder guardarse
+CUSTOMER_FIELD_MAX_LENGTHS = {
+    'customer_name': Order.customer_name.type.length,
+    'customer_email': Order.customer_email.type.length,
+    'customer_address': Order.customer_address.type.length
+}
+
+def validate_payment_request(data):
+    """Valida la solicitud de pago; devuelve el mensaje de error o None"""
+    if not data:
+        return 'No se enviaron datos'
+    if not isinstance(data, dict):
+        return 'La solicitud debe ser un objeto JSON'
+    
+    # Validar datos requeridos
+    required_fields = ['customer_name', 'customer_email', 'customer_address', 'items']
+    missing_fields = [field for field in required_fields if field not in data or not data[field]]
+    
+    if missing_fields:
+        return f'Campos requeridos faltantes: {", ".join(missing_fields)}'
+    
+    # La orden se confirma antes de guardarse (write-behind): un valor que la base rechace se perdería
+    for field, max_length in CUSTOMER_FIELD_MAX_LENGTHS.items():
+        if not isinstance(data[field], str):
+            return f'{field} debe ser un texto'
+        if len(data[field]) > max_length:
+            return f'{field} no puede superar {max_length} caracteres'
+    
+    # Las líneas se validan al valorizarlas (prepare_order), en la misma pasada
+    
+    # Validar email
+    if not EMAIL_PATTERN.match(data['customer_email']):
+        return 'Email inválido'
+    
+    return None
+
+def prepare_order(data):
+    """Genera el ID de la orden y valoriza el carrito con los precios del catálogo (lanza PricingError)"""
+    order_id = str(uuid.uuid4())
+    logger.info(f"Creando pago para orden {order_id}")
+    
+    cart = price_cart(data['items'])
+    total_amount = to_amount(cart.total)
+    
+    logger.info(f"Total calculado para orden {order_id}: ${total_amount} ({len(cart.lines)} líneas)")
+    
+    return {
+        'order_id': order_id,
+        'total_amount': total_amount,
+        'items': cart.agilpay_items(),
+        'cart': cart
+    }
+
+def build_payment_result(data, order, token):
+    """Arma la respuesta de create-payment con los datos del formulario de Agilpay"""
+    order_id = order['order_id']
+    
+    # Preparar detalles del pago
+    payment_details = {
+        'MerchantKey': AGILPAY_CONFIG['merchant_key'],
+        'Service': order_id,
+        'MerchantName': 'Webflow Store',
+        'Description': f'Orden {order_id}',
+        'Amount': order['total_amount'],
+        'Tax': to_amount(order['cart'].tax),
+        'Currency': '840',  # USD
+        'Items': order['items']
+    }
+    
+    # Preparar datos para el formulario de Agilpay
+    agilpay_data = {
+        'SiteId': AGILPAY_CONFIG['client_id'],
+        'UserId': data['customer_email'],
+        'Names': data['customer_name'],
+        'Email': data['customer_email'],
+        'Address': data['customer_address'],
+        'Detail': encode_json({'Payments': [payment_details]}, sort_keys=False).decode('utf-8'),
+        'SuccessURL': data.get('success_url', 'https://example.com/success'),
+        'ReturnURL': data.get('return_url', 'https://example.com/return'),
+        'token': token,
+        'NoHeader': '2'  # Modo iframe
+    }
+    
+    logger.info(f"Pago creado exitosamente para orden {order_id}")
+    
+    return {
+        'success': True,
+        'payment_url': AGILPAY_CONFIG['payment_url'],
+        'payment_data': agilpay_data,
+        'order_id': order_id,
+        'totals': order['cart'].totals()
+    }
 
 @agilpay_bp.route('/create-payment', methods=['POST'])
 def create_payment():
@@ -68,130 +245,228 @@ def create_payment():
     try:
         data = request.get_json()
         
-        if not data:
+        error = validate_payment_request(data)
+        if error:
             return jsonify({
                 'success': False,
-                'error': 'No se enviaron datos'
+                'error': error
             }), 400
         
-        # Validar datos requeridos
-        required_fields = ['customer_name', 'customer_email', 'customer_address', 'items']
-        missing_fields = [field for field in required_fields if field not in data or not data[field]]
-        
-        if missing_fields:
+        try:
+            order = prepare_order(data)
+        except PricingError as e:
             return jsonify({
                 'success': False,
-                'error': f'Campos requeridos faltantes: {", ".join(missing_fields)}'
+                'error': str(e)
             }), 400
         
-        # Validar items
-        if not isinstance(data['items'], list) or len(data['items']) == 0:
-            return jsonify({
-                'success': False,
-                'error': 'Items debe ser una lista no vacía'
-            }), 400
-        
-        # Validar cada item
-        for i, item in enumerate(data['items']):
-            if not isinstance(item, dict):
-                return jsonify({
-                    'success': False,
-                    'error': f'Item {i+1} debe ser un objeto'
-                }), 400
-            
-            required_item_fields = ['name', 'price', 'quantity']
-            missing_item_fields = [field for field in required_item_fields if field not in item]
-            
-            if missing_item_fields:
-                return jsonify({
-                    'success': False,
-                    'error': f'Item {i+1} falta campos: {", ".join(missing_item_fields)}'
-                }), 400
-            
-            try:
-                price = float(item['price'])
-                quantity = int(item['quantity'])
-                if price <= 0 or quantity <= 0:
-                    raise ValueError("Precio y cantidad deben ser positivos")
-            except (ValueError, TypeError):
-                return jsonify({
-                    'success': False,
-                    'error': f'Item {i+1} tiene precio o cantidad inválidos'
-                }), 400
-        
-        # Validar email
-        import re
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, data['customer_email']):
+        # Obtener token JWT (con el presupuesto de tiempo de la petición)
+        from src.services.upstream import deadline_in
+        deadline = deadline_in(AGILPAY_CONFIG['token_budget'])
+        token = get_oauth_token(order['order_id'], data['customer_email'], order['total_amount'], deadline=deadline)
+        if not token:
             return jsonify({
                 'success': False,
-                'error': 'Email inválido'
-            }), 400
+                'error': 'No se pudo obtener el token de autenticación'
+            }), 500
         
-        # Generar ID único para la orden
-        order_id = str(uuid.uuid4())
-        logger.info(f"Creando pago para orden {order_id}")
+        result = build_payment_result(data, order, token)
         
-        # Calcular el total
-        total_amount = 0
-        items = []
-        for item in data['items']:
-            item_total = float(item['price']) * int(item['quantity'])
-            total_amount += item_total
-            items.append({
-                'Description': item['name'],
-                'Quantity': str(item['quantity']),
-                'Amount': item_total,
-                'Tax': 0
-            })
+        # La orden se guarda en segundo plano (group commit): la petición no espera el fsync
+        order_queue.submit(order_record(data, order))
         
-        logger.info(f"Total calculado para orden {order_id}: ${total_amount}")
+        return jsonify(result)
         
-        # Obtener token JWT
-        token = get_oauth_token(order_id, data['customer_email'], total_amount)
+    except CircuitOpenError as e:
+        logger.warning(f"Pago rechazado, circuito abierto: {str(e)}")
+        return _circuit_open_response(e)
+    except Overloaded as e:
+        logger.warning(f"Pago rechazado, sin cupo hacia Agilpay: {str(e)}")
+        return _busy_response()
+    except QueueFull as e:
+        logger.error(f"Pago rechazado, no se pudo encolar la orden: {str(e)}")
+        return _busy_response()
+    except Exception as e:
+        logger.error(f"Error interno creando pago: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Error interno del servidor: {str(e)}'
+        }), 500
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+def _get_batch_executor():
+    """Pool de hilos del proceso para los tokens de los lotes (se crea en el primer uso, tras el fork)"""
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONFIG['concurrency'],
+                                                     thread_name_prefix='agilpay-batch')
+    return _batch_executor
+
+def _batch_error(status, error, **extra):
+    return status, dict({'success': False, 'error': error}, **extra)
+
+def _prepare_batch(orders):
+    """Valida y valoriza todas las órdenes antes de pedir tokens.
+
+    Devuelve (resultados de las órdenes rechazadas, [(índice, datos, orden)] de las válidas).
+    """
+    rejected = []
+    accepted = []
+    for index, data in enumerate(orders):
+        error = validate_payment_request(data) if isinstance(data, dict) else 'La orden debe ser un objeto'
+        if error is None:
+            try:
+                accepted.append((index, data, prepare_order(data)))
+                continue
+            except PricingError as e:
+                error = str(e)
+        rejected.append(dict({'index': index, 'status': 400}, success=False, error=error))
+    return rejected, accepted
+
+class _BatchGate:
+    """Decide, bajo un lock, si una orden del lote todavía puede guardarse.
+
+    Cuando el lote deja de esperar (close) las órdenes que no se reclamaron ya no se guardan
+    aunque su hilo siga en curso: el cliente recibe 504 para ellas. Las reclamadas antes se
+    esperan, porque se van a guardar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._closed = False
+        self._claimed = set()
+
+    def claim(self, index):
+        with self._lock:
+            if self._closed:
+                return False
+            self._claimed.add(index)
+            return True
+
+    def close(self):
+        """Cierra el lote; devuelve los índices reclamados antes del cierre"""
+        with self._lock:
+            self._closed = True
+            return set(self._claimed)
+
+def _checkout_order(index, data, order, deadline, gate):
+    """Token y resultado de una orden del lote (corre en el pool); devuelve (status, cuerpo)"""
+    if time.monotonic() >= deadline:
+        return _batch_error(504, 'Tiempo del lote agotado antes de solicitar el token')
+    try:
+        token = get_oauth_token(order['order_id'], data['customer_email'], order['total_amount'],
+                                deadline=deadline)
         if not token:
+            if time.monotonic() >= deadline:
+                return _batch_error(504, 'Tiempo del lote agotado obteniendo el token')
+            return _batch_error(500, 'No se pudo obtener el token de autenticación')
+        # Una orden que llega tarde no se guarda: el lote ya pudo responder 504 para ella
+        if time.monotonic() >= deadline or not gate.claim(index):
+            return _batch_error(504, 'Tiempo del lote agotado obteniendo el token')
+        result = build_payment_result(data, order, token)
+        order_queue.submit(order_record(data, order))
+        return 200, result
+    except CircuitOpenError as e:
+        return _batch_error(503, 'Servicio de pagos no disponible temporalmente',
+                            retry_after=max(math.ceil(e.retry_after), 1))
+    except (Overloaded, QueueFull):
+        return _batch_error(503, 'Servicio ocupado, intenta de nuevo', retry_after=1)
+    except Exception as e:
+        logger.error(f"Error interno creando pago del lote: {str(e)}")
+        return _batch_error(500, f'Error interno del servidor: {str(e)}')
+
+# Margen sobre el deadline para recoger resultados: las llamadas ya respetan el deadline
+BATCH_GRACE_SECONDS = 1.0
+
+def _run_batch(accepted, deadline):
+    """Pide los tokens en paralelo y produce los resultados a medida que terminan"""
+    executor = _get_batch_executor()
+    gate = _BatchGate()
+    futures = {executor.submit(_checkout_order, index, data, order, deadline, gate): index
+               for index, data, order in accepted}
+    try:
+        for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0) + BATCH_GRACE_SECONDS):
+            status, body = future.result()
+            yield dict({'index': futures.pop(future), 'status': status}, **body)
+    except FuturesTimeout:
+        # cancel() no detiene los hilos ya en curso: el cierre impide que guarden su orden
+        claimed = gate.close()
+        for future, index in futures.items():
+            if index in claimed:
+                status, body = future.result()
+                yield dict({'index': index, 'status': status}, **body)
+                continue
+            future.cancel()
+            yield dict({'index': index, 'status': 504}, success=False, error='Tiempo del lote agotado')
+
+def _batch_summary(results, started):
+    succeeded = sum(1 for result in results if result['status'] == 200)
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+def _ndjson_results(results_iter, started):
+    results = []
+    for result in results_iter:
+        results.append(result)
+        yield encode_json(result, sort_keys=False) + b'\n'
+    summary = _batch_summary(results, started)
+    logger.info(f"Lote de pagos: {summary}")
+    yield encode_json({'summary': summary}, sort_keys=False) + b'\n'
+
+@agilpay_bp.route('/create-payments', methods=['POST'])
+def create_payments():
+    """Crea los pagos de un lote de órdenes pidiendo los tokens en paralelo (JSON o NDJSON)"""
+    try:
+        started = time.monotonic()
+        data = request.get_json(silent=True)
+        orders = data.get('orders') if isinstance(data, dict) else None
+        if not isinstance(orders, list) or not orders:
             return jsonify({
                 'success': False,
-                'error': 'No se pudo obtener el token de autenticación'
-            }), 500
+                'error': 'Se esperaba {"orders": [...]} con al menos una orden'
+            }), 400
+        if len(orders) > BATCH_CONFIG['max_orders']:
+            return jsonify({
+                'success': False,
+                'error': f"El lote admite como máximo {BATCH_CONFIG['max_orders']} órdenes"
+            }), 400
         
-        # Preparar detalles del pago
-        payment_details = {
-            'MerchantKey': AGILPAY_CONFIG['merchant_key'],
-            'Service': order_id,
-            'MerchantName': 'Webflow Store',
-            'Description': f'Orden {order_id}',
-            'Amount': total_amount,
-            'Tax': 0,
-            'Currency': '840',  # USD
-            'Items': items
-        }
+        output_format = request.args.get('format', 'json').lower()
+        if output_format not in ('json', 'ndjson'):
+            return jsonify({
+                'success': False,
+                'error': 'format debe ser json o ndjson'
+            }), 400
         
-        # Preparar datos para el formulario de Agilpay
-        agilpay_data = {
-            'SiteId': AGILPAY_CONFIG['client_id'],
-            'UserId': data['customer_email'],
-            'Names': data['customer_name'],
-            'Email': data['customer_email'],
-            'Address': data['customer_address'],
-            'Detail': json.dumps({'Payments': [payment_details]}),
-            'SuccessURL': data.get('success_url', 'https://example.com/success'),
-            'ReturnURL': data.get('return_url', 'https://example.com/return'),
-            'token': token,
-            'NoHeader': '2'  # Modo iframe
-        }
+        # Todas las órdenes se validan y valorizan antes de contactar a Agilpay
+        rejected, accepted = _prepare_batch(orders)
+        deadline = started + BATCH_CONFIG['budget']
+        completions = _run_batch(accepted, deadline)
         
-        logger.info(f"Pago creado exitosamente para orden {order_id}")
+        if output_format == 'ndjson':
+            # Un resultado por línea en orden de llegada y al final el resumen
+            return Response(stream_with_context(_ndjson_results(chain(rejected, completions), started)),
+                            mimetype='application/x-ndjson')
         
+        results = sorted((*rejected, *completions), key=lambda result: result['index'])
+        summary = _batch_summary(results, started)
+        logger.info(f"Lote de pagos: {summary}")
         return jsonify({
             'success': True,
-            'payment_url': AGILPAY_CONFIG['payment_url'],
-            'payment_data': agilpay_data,
-            'order_id': order_id
+            'summary': summary,
+            'results': results
         })
         
     except Exception as e:
-        logger.error(f"Error interno creando pago: {str(e)}")
+        logger.error(f"Error interno creando lote de pagos: {str(e)}")
         return jsonify({
             'success': False,
             'error': f'Error interno del servidor: {str(e)}'
@@ -199,14 +474,10 @@ def create_payment():
 
 @agilpay_bp.route('/payment-response', methods=['POST'])
 def payment_response():
-    """Maneja la respuesta de Agilpay después del pago"""
+    """Recibe el callback de Agilpay, lo encola y confirma de inmediato"""
     try:
         # Obtener datos del formulario
         data = request.form.to_dict()
-        logger.info(f"Respuesta de Agilpay recibida: {data}")
-        
-        # En una implementación real, aquí se validaría la respuesta
-        # y se actualizaría el estado de la orden en la base de datos
         
         # Validar que se recibieron datos
         if not data:
@@ -216,15 +487,25 @@ def payment_response():
                 'error': 'No se recibieron datos'
             }), 400
         
-        # Aquí podrías agregar validaciones específicas de Agilpay
-        # Por ejemplo, verificar firmas, estados de transacción, etc.
+        event, error = parse_callback(data)
+        if error:
+            logger.warning(f"Respuesta de Agilpay inválida: {error}")
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
         
-        return jsonify({
-            'success': True,
-            'status': 'received',
-            'message': 'Respuesta procesada correctamente'
-        })
+        # La deduplicación y la actualización de la orden ocurren en los workers de la cola
+        callback_queue.submit(event)
+        logger.info(f"Respuesta de Agilpay encolada: transacción {event['transaction_id']}, "
+                    f"orden {event['order_id']}")
         
+        return json_response(CALLBACK_RECEIVED_BODY)
+        
+    except QueueFull as e:
+        # Agilpay reintenta el callback; no se pierde aunque se rechace ahora
+        logger.error(f"Respuesta de Agilpay rechazada, cola llena: {str(e)}")
+        return _busy_response()
     except Exception as e:
         logger.error(f"Error procesando respuesta de Agilpay: {str(e)}")
         return jsonify({
@@ -232,54 +513,68 @@ def payment_response():
             'error': f'Error procesando respuesta: {str(e)}'
         }), 500
 
+@agilpay_bp.route('/queues/status', methods=['GET'])
+def queues_status():
+    """Devuelve profundidad, retraso y contadores de las colas en segundo plano"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'orders': order_queue.stats(),
+            'payment_callbacks': callback_queue.stats()
+        }
+    })
+
+PRODUCTS_DEFAULT_PER_PAGE = 50
+PRODUCTS_MAX_PER_PAGE = 200
+
+def _render_products_page(categories, page, per_page):
+    """Consulta una página del catálogo activo y arma el cuerpo de la respuesta"""
+    query = Product.query.filter(Product.active.is_(True))
+    if categories:
+        query = query.filter(Product.category.in_(categories))
+    
+    total = query.count()
+    products = query.order_by(Product.id).offset((page - 1) * per_page).limit(per_page).all()
+    
+    logger.info(f"Catálogo reconstruido: página {page}, {len(products)} productos")
+    
+    return {
+        'success': True,
+        'data': [product.to_dict() for product in products],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        }
+    }
+
 @agilpay_bp.route('/products', methods=['GET'])
 def get_products():
-    """Devuelve la lista de productos disponibles"""
+    """Devuelve la lista de productos disponibles (paginada y filtrable por categoría)"""
     try:
-        products = [
-            {
-                'id': 1,
-                'name': 'Producto Premium A',
-                'description': 'Descripción detallada del producto premium A',
-                'price': 99.99,
-                'image': 'https://via.placeholder.com/300x200?text=Producto+A'
-            },
-            {
-                'id': 2,
-                'name': 'Producto Estándar B',
-                'description': 'Descripción detallada del producto estándar B',
-                'price': 59.99,
-                'image': 'https://via.placeholder.com/300x200?text=Producto+B'
-            },
-            {
-                'id': 3,
-                'name': 'Producto Básico C',
-                'description': 'Descripción detallada del producto básico C',
-                'price': 29.99,
-                'image': 'https://via.placeholder.com/300x200?text=Producto+C'
-            },
-            {
-                'id': 4,
-                'name': 'Producto Deluxe D',
-                'description': 'Descripción detallada del producto deluxe D',
-                'price': 149.99,
-                'image': 'https://via.placeholder.com/300x200?text=Producto+D'
-            },
-            {
-                'id': 5,
-                'name': 'Producto Especial E',
-                'description': 'Descripción detallada del producto especial E',
-                'price': 79.99,
-                'image': 'https://via.placeholder.com/300x200?text=Producto+E'
-            }
-        ]
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', PRODUCTS_DEFAULT_PER_PAGE, type=int)
+        if page < 1 or per_page < 1:
+            return jsonify({
+                'success': False,
+                'error': 'page y per_page deben ser enteros positivos'
+            }), 400
+        per_page = min(per_page, PRODUCTS_MAX_PER_PAGE)
         
-        logger.info(f"Productos solicitados: {len(products)} productos devueltos")
+        category = request.args.get('category', '')
+        categories = tuple(sorted({c.strip() for c in category.split(',') if c.strip()}))
         
-        return jsonify({
-            'success': True,
-            'data': products
-        })
+        # El cuerpo ya serializado solo se reconstruye cuando cambia el catálogo
+        body, etag = catalog_cache.get(
+            (categories, page, per_page),
+            lambda: _render_products_page(categories, page, per_page)
+        )
+        
+        response = json_response(body)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
         
     except Exception as e:
         logger.error(f"Error obteniendo productos: {str(e)}")
@@ -288,3 +583,17 @@ def get_products():
             'error': 'Error interno del servidor'
         }), 500
 
+@agilpay_bp.route('/upstream/status', methods=['GET'])
+def upstream_status():
+    """Devuelve las estadísticas del cliente HTTP y el estado del breaker hacia Agilpay"""
+    from src.services.upstream import get_client
+    client = get_client()
+    return jsonify({
+        'success': True,
+        'data': {
+            'pool_size': client.pool_size,
+            'pool': client.stats.snapshot(),
+            'breaker': token_breaker.snapshot(),
+            'in_flight': upstream_slots.snapshot()
+        }
+    })
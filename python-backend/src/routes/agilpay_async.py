@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import math
+import time
+
+from src.routes.agilpay import (AGILPAY_CONFIG, TOKEN_HEADERS, token_breaker, _token_payload,
+                                _extract_token, validate_payment_request, prepare_order,
+                                build_payment_result)
+from src.services.circuit_breaker import CircuitOpenError
+from src.services.orders import order_queue, order_record
+from src.services.write_behind import QueueFull
+from src.services.upstream import deadline_in
+from src.services.metrics import upstream_latency, upstream_rejections
+from src.services.json_provider import decode_json, encode_json
+from src.services.pricing import PricingError
+from src.services.rate_limit import (MemoryRateLimiter, Overloaded, admission, client_id, upstream_slots,
+                                     RATE_LIMIT_CONFIG, RATE_LIMITED_BODY)
+from src.services.upstream_async import get_async_client, AsyncDeadlineExceeded, aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+async def get_oauth_token_async(order_id, customer_id, amount, deadline=None):
+    """Obtiene el token JWT de Agilpay sin bloquear el event loop"""
+    upstream_slots.acquire()
+    try:
+        token_breaker.allow()
+    except CircuitOpenError:
+        upstream_slots.release()
+        upstream_rejections.inc('agilpay_token')
+        raise
+    started = time.monotonic()
+    failed = True
+    outcome = 'exception'
+    try:
+        logger.info(f"Solicitando token para orden {order_id}")
+
+        if deadline is None:
+            deadline = deadline_in(AGILPAY_CONFIG['token_budget'])
+
+        response = await get_async_client().post(
+            AGILPAY_CONFIG['token_url'],
+            data=_token_payload(order_id, customer_id, amount),
+            headers=TOKEN_HEADERS,
+            deadline=deadline
+        )
+        failed = response.status_code >= 500
+        token = _extract_token(order_id, response.status_code, response)
+        outcome = 'ok' if token else 'error'
+        return token
+
+    except (aiohttp.ClientError, asyncio.TimeoutError, AsyncDeadlineExceeded) as e:
+        timed_out = isinstance(e, (asyncio.TimeoutError, AsyncDeadlineExceeded))
+        outcome = 'timeout' if timed_out else 'connection_error'
+        logger.error(f"Error de conexión obteniendo token: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"Excepción obteniendo token: {str(e)}")
+        return None
+    finally:
+        upstream_slots.release()
+        elapsed = time.monotonic() - started
+        token_breaker.record(elapsed, failed)
+        upstream_latency.observe(elapsed, 'agilpay_token', outcome)
+
+
+async def create_payment_async(data):
+    """Versión asíncrona de create_payment; devuelve (status, cuerpo, cabeceras extra)"""
+    try:
+        error = validate_payment_request(data)
+        if error:
+            return 400, {'success': False, 'error': error}, {}
+
+        try:
+            # Puede consultar la BD (índice de precios): fuera del event loop
+            order = await asyncio.to_thread(prepare_order, data)
+        except PricingError as e:
+            return 400, {'success': False, 'error': str(e)}, {}
+
+        deadline = deadline_in(AGILPAY_CONFIG['token_budget'])
+        token = await get_oauth_token_async(order['order_id'], data['customer_email'],
+                                            order['total_amount'], deadline=deadline)
+        if not token:
+            return 500, {
+                'success': False,
+                'error': 'No se pudo obtener el token de autenticación'
+            }, {}
+
+        result = build_payment_result(data, order, token)
+
+        # Sin esperar en el event loop: si la cola está llena se rechaza de inmediato
+        order_queue.submit(order_record(data, order), timeout=0)
+
+        return 200, result, {}
+
+    except Overloaded as e:
+        logger.warning(f"Pago rechazado, sin cupo hacia Agilpay: {str(e)}")
+        return 503, {
+            'success': False,
+            'error': 'Servicio ocupado, intenta de nuevo'
+        }, {'Retry-After': '1'}
+    except QueueFull as e:
+        logger.error(f"Pago rechazado, no se pudo encolar la orden: {str(e)}")
+        return 503, {
+            'success': False,
+            'error': 'Servicio ocupado, intenta de nuevo'
+        }, {'Retry-After': '1'}
+    except CircuitOpenError as e:
+        logger.warning(f"Pago rechazado, circuito abierto: {str(e)}")
+        return 503, {
+            'success': False,
+            'error': 'Servicio de pagos no disponible temporalmente'
+        }, {'Retry-After': str(max(math.ceil(e.retry_after), 1))}
+    except Exception as e:
+        logger.error(f"Error interno creando pago: {str(e)}")
+        return 500, {
+            'success': False,
+            'error': f'Error interno del servidor: {str(e)}'
+        }, {}
+
+
+async def _admission_retry_after(scope):
+    """Mismo control de admisión que el before_request de Flask, con los datos del scope ASGI.
+
+    El backend es síncrono: el de memoria solo toma un lock breve y se llama en el event loop; un
+    almacén compartido (modulo:fabrica) puede hacer E/S de red y se llama en un hilo para no
+    detener los demás checkouts en curso.
+    """
+    headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope.get('headers', ())}
+    key_header = RATE_LIMIT_CONFIG['key_header'].lower()
+    client = scope.get('client')
+    client = client_id(headers.get(key_header) if key_header else None,
+                       headers.get('x-forwarded-for'), client[0] if client else None)
+    if not admission.enabled or isinstance(admission.backend, MemoryRateLimiter):
+        return admission.admit('agilpay.create_payment', 'agilpay', client)
+    return await asyncio.to_thread(admission.admit, 'agilpay.create_payment', 'agilpay', client)
+
+
+async def create_payment_asgi(scope, receive, send):
+    """Endpoint ASGI nativo para POST /api/agilpay/create-payment"""
+    # Se rechaza antes de leer el cuerpo
+    retry_after = await _admission_retry_after(scope)
+    if retry_after is not None:
+        status, payload = 429, RATE_LIMITED_BODY
+        headers = {'Retry-After': str(max(math.ceil(retry_after), 1))}
+    else:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+
+        try:
+            data = decode_json(b''.join(chunks) or b'null')
+        except ValueError:
+            status, body, headers = 400, {'success': False, 'error': 'JSON inválido'}, {}
+        else:
+            status, body, headers = await create_payment_async(data)
+        payload = encode_json(body)
+
+    raw_headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(payload)).encode('latin-1')),
+        (b'access-control-allow-origin', b'*'),
+    ]
+    raw_headers.extend((name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in headers.items())
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': payload})
@@ -1,20 +1,123 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from src.models.user import User, db
+from src.services.json_provider import encode_json, json_response
+from src.services.user_cache import track_user_changes, user_cache
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import datetime, timedelta, timezone
+import base64
+import csv
+import hashlib
+import io
+import json
 import logging
+import os
 
 user_bp = Blueprint('user', __name__)
 logger = logging.getLogger(__name__)
 
+USERS_DEFAULT_LIMIT = 50
+USERS_MAX_LIMIT = 200
+
+# Columnas que se pueden pedir con ?fields= (id siempre se incluye para el cursor)
+USER_FIELDS = {
+    'id': User.id,
+    'username': User.username,
+    'email': User.email
+}
+
+def _encode_cursor(last_id):
+    """Cursor opaco con el último id devuelto"""
+    raw = json.dumps({'id': last_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor):
+    """Devuelve el id del cursor; lanza ValueError si no es válido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        last_id = json.loads(raw)['id']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Cursor inválido')
+    if not isinstance(last_id, int):
+        raise ValueError('Cursor inválido')
+    return last_id
+
+def _user_etag(user_id, version):
+    """ETag de un usuario: cambia con cada actualización (columna version)"""
+    return f'{user_id}-{version}'
+
+def _not_modified(etag):
+    """Respuesta 304 sin cuerpo para un cliente que ya tiene la versión vigente"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _precondition_failed():
+    return jsonify({
+        'success': False,
+        'error': 'El usuario fue modificado por otra petición; vuelve a obtenerlo'
+    }), 412
+
+def _parse_fields(fields):
+    """Lista de columnas a seleccionar a partir de ?fields=; lanza ValueError con los desconocidos"""
+    if not fields:
+        return list(USER_FIELDS)
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in USER_FIELDS]
+    if unknown:
+        raise ValueError(f'Campos inválidos: {", ".join(unknown)}')
+    return ['id'] + [field for field in dict.fromkeys(requested) if field != 'id']
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    """Obtiene todos los usuarios"""
+    """Obtiene los usuarios paginados por cursor (keyset sobre id)"""
     try:
-        users = User.query.all()
-        return jsonify({
+        limit = request.args.get('limit', USERS_DEFAULT_LIMIT, type=int)
+        if limit < 1:
+            return jsonify({
+                'success': False,
+                'error': 'limit debe ser un entero positivo'
+            }), 400
+        limit = min(limit, USERS_MAX_LIMIT)
+        
+        try:
+            cursor = request.args.get('cursor')
+            after_id = _decode_cursor(cursor) if cursor else 0
+            fields = _parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        # Solo se seleccionan las columnas pedidas (más version para el ETag), sin cargar entidades ORM
+        rows = db.session.execute(
+            select(*[USER_FIELDS[field] for field in fields], User.version)
+            .where(User.id > after_id)
+            .order_by(User.id)
+            .limit(limit + 1)
+        ).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        # El ETag de la página depende de qué usuarios trae y de sus versiones: si no cambió,
+        # se responde 304 sin serializar el cuerpo
+        etag = hashlib.sha256(repr((fields, has_more, [(row.id, row.version) for row in rows]))
+                              .encode('utf-8')).hexdigest()[:32]
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        
+        response = jsonify({
             'success': True,
-            'data': [user.to_dict() for user in users]
+            'data': [dict(zip(fields, row)) for row in rows],
+            'next_cursor': _encode_cursor(rows[-1].id) if has_more else None
         })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         logger.error(f"Error obteniendo usuarios: {str(e)}")
         return jsonify({
@@ -22,6 +125,81 @@ def get_users():
             'error': 'Error interno del servidor'
         }), 500
 
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ['id', 'username', 'email', 'updated_at']
+# updated_at se fija al hacer flush, antes del commit: una transacción que lo estampó antes de
+# la exportación y confirma después no sale en esta. La marca de agua retrocede este margen
+# (mayor que la transacción más larga) para que la siguiente exportación la incluya
+EXPORT_WATERMARK_OVERLAP = timedelta(seconds=float(os.environ.get('USER_EXPORT_OVERLAP', '300')))
+
+def _parse_updated_since(value):
+    """Convierte updated_since (ISO 8601) a datetime UTC sin zona, como se guarda en BD"""
+    since = datetime.fromisoformat(value)
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+def _export_rows(updated_since):
+    """Recorre los usuarios en lotes con un cursor del servidor (yield_per)"""
+    query = select(User.id, User.username, User.email, User.updated_at).order_by(User.updated_at, User.id)
+    if updated_since is not None:
+        query = query.where(User.updated_at >= updated_since)
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for batch in result.partitions():
+        yield [(row.id, row.username, row.email,
+                row.updated_at.isoformat() if row.updated_at else None) for row in batch]
+
+def _ndjson_chunks(batches):
+    for batch in batches:
+        yield b''.join(encode_json(dict(zip(EXPORT_COLUMNS, row)), sort_keys=False) + b'\n'
+                       for row in batch)
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+@user_bp.route('/users/export', methods=['GET'])
+def export_users():
+    """Exporta todos los usuarios en streaming (NDJSON o CSV), opcionalmente incrementales"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({
+            'success': False,
+            'error': 'format debe ser ndjson o csv'
+        }), 400
+    
+    updated_since = None
+    if request.args.get('updated_since'):
+        try:
+            updated_since = _parse_updated_since(request.args['updated_since'])
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'updated_since debe tener formato ISO 8601'
+            }), 400
+    
+    # Marca de agua para la siguiente sincronización incremental (con margen: las filas de los
+    # últimos EXPORT_WATERMARK_OVERLAP se vuelven a exportar y el cliente las aplica de nuevo)
+    watermark = (datetime.now(timezone.utc).replace(tzinfo=None) - EXPORT_WATERMARK_OVERLAP).isoformat()
+    logger.info(f"Exportando usuarios ({export_format}) desde {updated_since or 'el inicio'}")
+    
+    if export_format == 'csv':
+        chunks, mimetype = _csv_chunks(_export_rows(updated_since)), 'text/csv'
+    else:
+        chunks, mimetype = _ndjson_chunks(_export_rows(updated_since)), 'application/x-ndjson'
+    
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['X-Export-Watermark'] = watermark
+    response.headers['Content-Disposition'] = f'attachment; filename=users.{export_format}'
+    return response
+
 @user_bp.route('/users', methods=['POST'])
 def create_user():
     """Crea un nuevo usuario"""
@@ -58,10 +236,12 @@ def create_user():
         db.session.add(user)
         db.session.commit()
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': user.to_dict()
-        }), 201
+        })
+        response.set_etag(_user_etag(user.id, user.version))
+        return response, 201
         
     except IntegrityError:
         db.session.rollback()
@@ -77,39 +257,198 @@ def create_user():
             'error': 'Error interno del servidor'
         }), 500
 
-@user_bp.route('/users/<int:user_id>', methods=['GET'])
-def get_user(user_id):
-    """Obtiene un usuario específico"""
+BULK_CHUNK_SIZE = 1000
+
+@user_bp.route('/users/bulk', methods=['POST'])
+def bulk_create_users():
+    """Importa usuarios en lote (arreglo JSON o NDJSON) con resultado por fila"""
+    # Solo lo usa esta ruta: se importa en la primera importación masiva, no al crear la app
+    from src.services.user_import import import_users, iter_json_rows, iter_ndjson_rows
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            rows = iter_ndjson_rows(request.stream)
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, list):
+                return jsonify({
+                    'success': False,
+                    'error': 'Se esperaba un arreglo JSON o un cuerpo NDJSON'
+                }), 400
+            rows = iter_json_rows(data)
+        
+        results = import_users(rows, BULK_CHUNK_SIZE)
+        summary = {
+            'total': len(results),
+            'created': sum(1 for result in results if result['status'] == 'created'),
+            'conflicts': sum(1 for result in results if result['status'] == 'conflict'),
+            'errors': sum(1 for result in results if result['status'] == 'error')
+        }
+        logger.info(f"Importación masiva de usuarios: {summary}")
+        
+        return jsonify({
+            'success': True,
+            'summary': summary,
+            'results': results
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error en importación masiva de usuarios: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Error interno del servidor'
+        }), 500
+
+@user_bp.route('/users/search', methods=['GET'])
+def search_users():
+    """Busca usuarios por prefijo de username/email o, con mode=fulltext, por palabras"""
+    # Solo lo usa esta ruta: se importa en la primera búsqueda, no al crear la app
+    from src.services.user_search import USER_SEARCH_CONFIG, fulltext_backend, fulltext_search, prefix_search
     try:
-        user = User.query.get(user_id)
-        if not user:
+        query = request.args.get('q', '').strip()
+        if not query or len(query) > USER_SEARCH_CONFIG['max_query_length']:
             return jsonify({
                 'success': False,
-                'error': 'Usuario no encontrado'
-            }), 404
+                'error': f"q es requerido (máximo {USER_SEARCH_CONFIG['max_query_length']} caracteres)"
+            }), 400
+        
+        limit = request.args.get('limit', USER_SEARCH_CONFIG['default_limit'], type=int)
+        if limit < 1:
+            return jsonify({
+                'success': False,
+                'error': 'limit debe ser un entero positivo'
+            }), 400
+        limit = min(limit, USER_SEARCH_CONFIG['max_limit'])
+        
+        mode = request.args.get('mode', 'prefix')
+        if mode == 'prefix':
+            users = prefix_search(query, limit)
+        elif mode == 'fulltext':
+            if fulltext_backend() is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'La búsqueda de texto completo no está disponible en esta base de datos'
+                }), 400
+            users = fulltext_search(query, limit)
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'mode debe ser prefix o fulltext'
+            }), 400
         
         return jsonify({
             'success': True,
-            'data': user.to_dict()
+            'data': users,
+            'mode': mode,
+            'count': len(users)
         })
     except Exception as e:
-        logger.error(f"Error obteniendo usuario {user_id}: {str(e)}")
+        logger.error(f"Error buscando usuarios: {str(e)}")
         return jsonify({
             'success': False,
             'error': 'Error interno del servidor'
         }), 500
 
-@user_bp.route('/users/<int:user_id>', methods=['PUT'])
-def update_user(user_id):
-    """Actualiza un usuario existente"""
+def _load_user_body(user_id):
+    """(etag, cuerpo serializado) de GET /users/<id>, o None si el usuario no existe"""
+    user = User.query.get(user_id)
+    if not user:
+        return None
+    return _user_etag(user.id, user.version), encode_json({
+        'success': True,
+        'data': user.to_dict()
+    })
+
+@user_bp.route('/users/<int:user_id>', methods=['GET'])
+def get_user(user_id):
+    """Obtiene un usuario específico (desde la caché si ya se leyó)"""
     try:
-        user = User.query.get(user_id)
-        if not user:
+        entry = user_cache.get(user_id, lambda: _load_user_body(user_id))
+        if entry is None:
             return jsonify({
                 'success': False,
                 'error': 'Usuario no encontrado'
             }), 404
         
+        etag, body = entry
+        if request.if_none_match.contains_weak(etag):
+            return _not_modified(etag)
+        response = json_response(body)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        logger.error(f"Error obteniendo usuario {user_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Error interno del servidor'
+        }), 500
+
+# Columnas que devuelven PUT (y el ETag) sin cargar la entidad
+USER_RETURNING = (User.id, User.username, User.email, User.version)
+
+def _user_changes(data):
+    """Campos a actualizar presentes en el cuerpo de PUT, normalizados como al crear"""
+    changes = {}
+    if 'username' in data:
+        changes['username'] = data['username'].strip()
+    if 'email' in data:
+        changes['email'] = data['email'].strip().lower()
+    return changes
+
+def _if_match_versions(user_id):
+    """Versiones aceptadas por If-Match, o None si no hay condición (sin cabecera o '*')"""
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    prefix = f'{user_id}-'
+    return {int(etag[len(prefix):]) for etag in request.if_match.as_set()
+            if etag.startswith(prefix) and etag[len(prefix):].isdigit()}
+
+def _versioned(statement, user_id, versions):
+    statement = statement.where(User.id == user_id)
+    return statement if versions is None else statement.where(User.version.in_(versions))
+
+def _update_returning(user_id, changes, versions):
+    """Un solo UPDATE ... RETURNING (o SELECT si no hay cambios); None si no aplicó"""
+    if not changes:
+        return db.session.execute(_versioned(select(*USER_RETURNING), user_id, versions)).one_or_none()
+    # Sentencia Core: version se incrementa aquí (version_id_col solo actúa en el flush de la sesión)
+    row = db.session.execute(
+        _versioned(update(User), user_id, versions)
+        .values(version=User.version + 1, **changes)
+        .returning(*USER_RETURNING)
+        .execution_options(synchronize_session=False)
+    ).one_or_none()
+    if row is not None:
+        track_user_changes(db.session, [user_id])
+        db.session.commit()
+    return row
+
+def _update_loaded(user_id, changes, versions):
+    """Camino con la entidad cargada, para bases sin UPDATE ... RETURNING"""
+    user = db.session.get(User, user_id)
+    if not user or (versions is not None and user.version not in versions):
+        return None
+    for field, value in changes.items():
+        setattr(user, field, value)
+    # El UPDATE exige la versión leída: si otra petición la cambió, falla con StaleDataError
+    db.session.commit()
+    return user.id, user.username, user.email, user.version
+
+def _missing_or_stale(user_id, versions):
+    """404 si el usuario no existe; 412 si existe pero no está en la versión de If-Match"""
+    db.session.rollback()
+    if versions is None or db.session.get(User, user_id) is None:
+        return jsonify({
+            'success': False,
+            'error': 'Usuario no encontrado'
+        }), 404
+    return _precondition_failed()
+
+@user_bp.route('/users/<int:user_id>', methods=['PUT'])
+def update_user(user_id):
+    """Actualiza un usuario existente (con If-Match, solo si no cambió desde que se leyó)"""
+    try:
         data = request.get_json()
         if not data:
             return jsonify({
@@ -117,14 +456,9 @@ def update_user(user_id):
                 'error': 'No se enviaron datos'
             }), 400
         
-        # Actualizar campos si se proporcionan
-        if 'username' in data:
-            user.username = data['username'].strip()
-        if 'email' in data:
-            user.email = data['email'].strip().lower()
-        
-        # Validar datos actualizados
-        validation_errors = user.validate()
+        # Validar solo los campos enviados, sin cargar el usuario
+        changes = _user_changes(data)
+        validation_errors = User.validate_changes(changes)
         if validation_errors:
             return jsonify({
                 'success': False,
@@ -132,13 +466,25 @@ def update_user(user_id):
                 'details': validation_errors
             }), 400
         
-        db.session.commit()
+        versions = _if_match_versions(user_id)
+        if db.engine.dialect.update_returning:
+            row = _update_returning(user_id, changes, versions)
+        else:
+            row = _update_loaded(user_id, changes, versions)
+        if row is None:
+            return _missing_or_stale(user_id, versions)
         
-        return jsonify({
+        user_id, username, email, version = row
+        response = jsonify({
             'success': True,
-            'data': user.to_dict()
+            'data': {'id': user_id, 'username': username, 'email': email}
         })
+        response.set_etag(_user_etag(user_id, version))
+        return response
         
+    except StaleDataError:
+        db.session.rollback()
+        return _precondition_failed()
     except IntegrityError:
         db.session.rollback()
         return jsonify({
@@ -153,25 +499,48 @@ def update_user(user_id):
             'error': 'Error interno del servidor'
         }), 500
 
+def _delete_returning(user_id, versions):
+    """Un solo DELETE ... RETURNING; False si no borró nada"""
+    deleted = db.session.execute(
+        _versioned(delete(User), user_id, versions)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if deleted is None:
+        return False
+    track_user_changes(db.session, [user_id])
+    db.session.commit()
+    return True
+
+def _delete_loaded(user_id, versions):
+    """Camino con la entidad cargada, para bases sin DELETE ... RETURNING"""
+    user = db.session.get(User, user_id)
+    if not user or (versions is not None and user.version not in versions):
+        return False
+    db.session.delete(user)
+    db.session.commit()
+    return True
+
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
-    """Elimina un usuario"""
+    """Elimina un usuario (con If-Match, solo si no cambió desde que se leyó)"""
     try:
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({
-                'success': False,
-                'error': 'Usuario no encontrado'
-            }), 404
-        
-        db.session.delete(user)
-        db.session.commit()
+        versions = _if_match_versions(user_id)
+        if db.engine.dialect.delete_returning:
+            deleted = _delete_returning(user_id, versions)
+        else:
+            deleted = _delete_loaded(user_id, versions)
+        if not deleted:
+            return _missing_or_stale(user_id, versions)
         
         return jsonify({
             'success': True,
             'message': 'Usuario eliminado correctamente'
         })
         
+    except StaleDataError:
+        db.session.rollback()
+        return _precondition_failed()
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error eliminando usuario {user_id}: {str(e)}")
@@ -179,3 +548,11 @@ def delete_user(user_id):
             'success': False,
             'error': 'Error interno del servidor'
         }), 500
+
+@user_bp.route('/users/cache/status', methods=['GET'])
+def user_cache_status():
+    """Devuelve aciertos, fallos, desalojos e invalidaciones de la caché de usuarios"""
+    return jsonify({
+        'success': True,
+        'data': user_cache.stats()
+    })
@@ -0,0 +1,268 @@
+"""
+Almacenes de caché clave -> bytes.
+
+CacheBackend es la interfaz; MemoryCache la implementación en proceso (LRU acotado con TTL),
+compartida por todos los hilos de un worker. SQLiteCache es un archivo SQLite local (en /dev/shm
+si existe) compartido por los workers de la misma máquina. Un almacén remoto (Redis,
+memcached...) se conecta con una fábrica `paquete.modulo:fabrica` que reciba las mismas opciones
+(ver load_backend). Los valores son bytes para que cualquier almacén pueda guardarlos.
+"""
+import importlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from src.services.metrics import cache_events
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Interfaz de un almacén de caché"""
+
+    def get(self, key):
+        """Valor guardado o None si no está o expiró"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, keys):
+        """Elimina varias claves (las que no existen se ignoran)"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    """LRU en memoria con TTL y contadores de aciertos, fallos, desalojos y expiraciones"""
+
+    def __init__(self, name, max_entries=10000, ttl=60.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cache_events.inc(self.name, 'hit')
+                    return entry[0]
+                del self._entries[key]
+                self.expirations += 1
+                cache_events.inc(self.name, 'expired')
+            self.misses += 1
+        cache_events.inc(self.name, 'miss')
+        return None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            cache_events.inc(self.name, 'eviction', amount=evicted)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+def default_shared_path(name):
+    """Archivo por defecto de SQLiteCache: en memoria compartida (/dev/shm) si existe"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f'agilpay-{name}-cache.db')
+
+
+class SQLiteCache(CacheBackend):
+    """Caché compartida por los procesos de una máquina sobre un archivo SQLite (WAL).
+
+    Cada hilo abre su propia conexión (también tras el fork). delete() deja una marca durante
+    `tombstone_ttl` segundos: un set() de otro proceso que leyó la BD antes de la invalidación no
+    puede volver a guardar el valor viejo. Los errores del archivo cuentan como fallos de caché.
+    """
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, name, path=None, max_entries=10000, ttl=60.0, tombstone_ttl=5.0):
+        self.name = name
+        self.path = path or default_shared_path(name)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._connect()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        # Es una caché: se puede perder ante un corte, no hace falta fsync
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                     '(key TEXT PRIMARY KEY, value BLOB, expires_at REAL NOT NULL) WITHOUT ROWID')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _error(self, operation, error):
+        with self._lock:
+            self.errors += 1
+        logger.warning(f"Caché '{self.name}' ({self.path}): error en {operation}: {str(error)}")
+
+    def get(self, key):
+        try:
+            row = self._connect().execute(
+                'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())).fetchone()
+        except sqlite3.Error as e:
+            self._error('get', e)
+            row = None
+        value = row[0] if row is not None else None
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        cache_events.inc(self.name, 'miss' if value is None else 'hit')
+        return value
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        try:
+            conn = self._connect()
+            # No se pisa una marca de borrado vigente (value NULL)
+            conn.execute(
+                'INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at '
+                'WHERE cache.value IS NOT NULL OR cache.expires_at <= ?',
+                (key, value, expires_at, now))
+            with self._lock:
+                self._sets += 1
+                sweep = self._sets % self.SWEEP_EVERY == 0
+            if sweep:
+                self._sweep(conn, now)
+        except sqlite3.Error as e:
+            self._error('set', e)
+
+    def _sweep(self, conn, now):
+        conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+        # Por encima del máximo se descartan las entradas que expiran antes
+        conn.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at '
+            'LIMIT max((SELECT count(*) FROM cache) - ?, 0))', (self.max_entries,))
+
+    def delete(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        expires_at = time.time() + self.tombstone_ttl
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'INSERT INTO cache (key, value, expires_at) VALUES (?, NULL, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = NULL, expires_at = excluded.expires_at',
+                [(key, expires_at) for key in keys])
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            # Sin la invalidación otros workers servirían el valor viejo hasta el TTL
+            logger.error(f"Caché '{self.name}': no se pudieron invalidar {len(keys)} claves: {str(e)}")
+            with self._lock:
+                self.errors += 1
+            try:
+                self._connect().execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        try:
+            self._connect().execute('DELETE FROM cache')
+        except sqlite3.Error as e:
+            self._error('clear', e)
+
+    def stats(self):
+        try:
+            entries = self._connect().execute(
+                'SELECT count(*) FROM cache WHERE value IS NOT NULL AND expires_at > ?', (time.time(),)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                # Aciertos y fallos de este worker; las entradas son las de todos
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'errors': self.errors
+            }
+
+
+def load_backend(spec, name, path=None, **options):
+    """'memory', 'sqlite' o 'paquete.modulo:fabrica'; la fábrica recibe name y las opciones
+    (max_entries, ttl). path es el archivo de 'sqlite' (por defecto en /dev/shm)"""
+    if spec == 'memory':
+        return MemoryCache(name, **options)
+    if spec == 'sqlite':
+        return SQLiteCache(name, path=path, **options)
+    module_name, _, attribute = spec.partition(':')
+    if not attribute:
+        raise ValueError(f"Backend de caché inválido: {spec} (se espera 'memory', 'sqlite' o 'modulo:fabrica')")
+    factory = getattr(importlib.import_module(module_name), attribute)
+    return factory(name=name, **options)
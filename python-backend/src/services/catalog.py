@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from src.models.user import db
+from src.models.product import Product
+from src.services.json_provider import encode_json
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CONFIG = {
+    # Cada cuánto se compara la huella del catálogo en BD (cambios de otros procesos)
+    'revalidate_seconds': float(os.environ.get('CATALOG_REVALIDATE_SECONDS', '5')),
+    'max_entries': int(os.environ.get('CATALOG_CACHE_ENTRIES', '256')),
+}
+
+
+class CatalogCache:
+    """Respuestas del catálogo pre-serializadas, reconstruidas solo cuando el catálogo cambia"""
+
+    def __init__(self, revalidate_seconds=None, max_entries=None):
+        self.revalidate_seconds = (CATALOG_CONFIG['revalidate_seconds']
+                                   if revalidate_seconds is None else revalidate_seconds)
+        self.max_entries = max_entries or CATALOG_CONFIG['max_entries']
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._generation = 0
+        self.hits = 0
+        self.builds = 0
+
+    def invalidate(self):
+        """Descarta todas las respuestas (tras un commit que modifica productos)"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._checked_at = 0.0
+
+    def _revalidate(self):
+        """Compara la huella del catálogo en BD como mucho una vez cada revalidate_seconds"""
+        now = time.monotonic()
+        if now - self._checked_at < self.revalidate_seconds:
+            return
+        fingerprint = tuple(db.session.query(func.count(Product.id), func.max(Product.updated_at)).one())
+        with self._lock:
+            self._checked_at = now
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._entries.clear()
+                self._generation += 1
+
+    def generation(self):
+        """Generación vigente del catálogo; cambia con cada invalidación (revalida la huella si toca)"""
+        self._revalidate()
+        return self._generation
+
+    def get(self, key, build):
+        """Devuelve (cuerpo, etag) de la clave; build() genera el dict de respuesta si no está"""
+        self._revalidate()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            generation = self._generation
+
+        body = encode_json(build())
+        entry = (body, hashlib.sha256(body).hexdigest()[:32])
+        with self._lock:
+            self.builds += 1
+            # Si el catálogo cambió mientras se construía, no se guarda una respuesta vieja
+            if generation != self._generation:
+                return entry
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+catalog_cache = CatalogCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_product_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product):
+            session.info['catalog_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('catalog_changed', False):
+        logger.info("Catálogo modificado, invalidando respuestas en caché")
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('catalog_changed', None)
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Umbrales por defecto del breaker del endpoint de tokens
+BREAKER_CONFIG = {
+    'window_seconds': float(os.environ.get('AGILPAY_BREAKER_WINDOW', '30')),
+    'min_calls': int(os.environ.get('AGILPAY_BREAKER_MIN_CALLS', '10')),
+    'failure_rate': float(os.environ.get('AGILPAY_BREAKER_FAILURE_RATE', '0.5')),
+    'slow_call_seconds': float(os.environ.get('AGILPAY_BREAKER_SLOW_CALL', '5')),
+    'slow_call_rate': float(os.environ.get('AGILPAY_BREAKER_SLOW_RATE', '0.8')),
+    'open_seconds': float(os.environ.get('AGILPAY_BREAKER_OPEN_SECONDS', '30')),
+    'half_open_calls': int(os.environ.get('AGILPAY_BREAKER_HALF_OPEN_CALLS', '3')),
+}
+
+
+class CircuitOpenError(Exception):
+    """Se rechaza la llamada porque el circuito está abierto"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuito '{name}' abierto")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Circuit breaker por tasa de errores o de llamadas lentas en una ventana deslizante"""
+
+    def __init__(self, name, window_seconds=None, min_calls=None, failure_rate=None,
+                 slow_call_seconds=None, slow_call_rate=None, open_seconds=None,
+                 half_open_calls=None, clock=time.monotonic):
+        self.name = name
+        self.window_seconds = BREAKER_CONFIG['window_seconds'] if window_seconds is None else window_seconds
+        self.min_calls = BREAKER_CONFIG['min_calls'] if min_calls is None else min_calls
+        self.failure_rate = BREAKER_CONFIG['failure_rate'] if failure_rate is None else failure_rate
+        self.slow_call_seconds = BREAKER_CONFIG['slow_call_seconds'] if slow_call_seconds is None else slow_call_seconds
+        self.slow_call_rate = BREAKER_CONFIG['slow_call_rate'] if slow_call_rate is None else slow_call_rate
+        self.open_seconds = BREAKER_CONFIG['open_seconds'] if open_seconds is None else open_seconds
+        self.half_open_calls = BREAKER_CONFIG['half_open_calls'] if half_open_calls is None else half_open_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls = deque()  # (instante, fallo, lenta)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _trim(self, now):
+        limit = now - self.window_seconds
+        while self._calls and self._calls[0][0] < limit:
+            self._calls.popleft()
+
+    def _open(self, now, reason):
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.times_opened += 1
+        logger.warning(f"Circuito '{self.name}' abierto: {reason}")
+
+    def _maybe_half_open(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            logger.info(f"Circuito '{self.name}' semiabierto, probando el servicio")
+
+    def allow(self):
+        """Reserva una llamada; lanza CircuitOpenError si el circuito no la permite"""
+        with self._lock:
+            now = self._clock()
+            self._maybe_half_open(now)
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_calls:
+                self._probes_in_flight += 1
+                return
+            self.rejected += 1
+            if self._state == OPEN:
+                retry_after = max(self.open_seconds - (now - self._opened_at), 0)
+            else:
+                retry_after = 1
+            raise CircuitOpenError(self.name, retry_after)
+
+    def record(self, duration, failed):
+        """Registra el resultado de una llamada permitida por allow()"""
+        with self._lock:
+            now = self._clock()
+            slow = duration >= self.slow_call_seconds
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed or slow:
+                    self._open(now, 'falló la llamada de prueba')
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"Circuito '{self.name}' cerrado")
+                return
+            if self._state != CLOSED:
+                return
+
+            self._calls.append((now, failed, slow))
+            self._trim(now)
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for call in self._calls if call[1])
+            slow_calls = sum(1 for call in self._calls if call[2])
+            if failures / total >= self.failure_rate:
+                self._open(now, f'tasa de errores {failures}/{total}')
+            elif slow_calls / total >= self.slow_call_rate:
+                self._open(now, f'tasa de llamadas lentas {slow_calls}/{total}')
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            return self._state
+
+    def snapshot(self):
+        """Estado actual del breaker para endpoints de estado y métricas"""
+        with self._lock:
+            now = self._clock()
+            self._maybe_half_open(now)
+            self._trim(now)
+            total = len(self._calls)
+            failures = sum(1 for call in self._calls if call[1])
+            slow_calls = sum(1 for call in self._calls if call[2])
+            retry_after = 0
+            if self._state == OPEN:
+                retry_after = round(max(self.open_seconds - (now - self._opened_at), 0), 3)
+            return {
+                'name': self.name,
+                'state': self._state,
+                'window_calls': total,
+                'window_failures': failures,
+                'window_slow_calls': slow_calls,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened,
+                'retry_after': retry_after,
+            }
@@ -0,0 +1,125 @@
+"""
+Ajustes del engine de la base de datos.
+
+- SQLite: en cada conexión nueva se aplican pragmas (por defecto WAL, synchronous=NORMAL,
+  busy_timeout y cache_size). Con WAL los lectores no se bloquean mientras otro escribe y el
+  commit no hace fsync del archivo principal; synchronous=NORMAL es seguro con WAL (un corte de
+  luz puede perder las últimas transacciones, no corromper la base).
+- Pool de conexiones: tamaño, desborde, espera, reciclado y pre-ping configurables (DB_POOL_*).
+  SQLite en memoria usa un pool de una sola conexión y no recibe estas opciones.
+
+Los valores de DB_ENGINE_CONFIG son los de la app; create_app acepta SQLALCHEMY_ENGINE_OPTIONS
+y SQLITE_PRAGMAS propios (benchmarks/bench_db_concurrency.py compara así ambos modos).
+"""
+import os
+from functools import partial
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def _env_flag(name):
+    value = os.environ.get(name)
+    return value.lower() == 'true' if value else None
+
+
+DB_ENGINE_CONFIG = {
+    # Pragmas de SQLite; una cadena vacía deja el valor por defecto de SQLite
+    'sqlite_journal_mode': os.environ.get('DB_SQLITE_JOURNAL_MODE', 'WAL').upper(),
+    'sqlite_synchronous': os.environ.get('DB_SQLITE_SYNCHRONOUS', 'NORMAL').upper(),
+    # Espera ante un bloqueo de escritura antes de fallar con "database is locked"
+    'sqlite_busy_timeout_ms': int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    # Caché de páginas por conexión (SQLite usa 2 MiB por defecto)
+    'sqlite_cache_size_kb': int(os.environ.get('DB_SQLITE_CACHE_SIZE_KB', '16384')),
+    # Conexiones por proceso: una por hilo del worker (WORKER_THREADS) más el desborde
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', os.environ.get('WORKER_THREADS', '5'))),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '10')),
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '30')),
+    # Segundos antes de reabrir una conexión (el servidor puede cerrar las inactivas); -1: nunca
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+    # Sin valor: solo con servidores de base de datos (en SQLite la conexión no se cae)
+    'pool_pre_ping': _env_flag('DB_POOL_PRE_PING'),
+}
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+
+
+def engine_options(uri, config=None):
+    """SQLALCHEMY_ENGINE_OPTIONS para la URL: opciones del pool salvo con SQLite en memoria"""
+    config = config or DB_ENGINE_CONFIG
+    url = make_url(uri)
+    if _is_memory_sqlite(url):
+        return {}
+    pre_ping = config['pool_pre_ping']
+    return {
+        'pool_size': config['pool_size'],
+        'max_overflow': config['max_overflow'],
+        'pool_timeout': config['pool_timeout'],
+        'pool_recycle': config['pool_recycle'],
+        'pool_pre_ping': url.get_backend_name() != 'sqlite' if pre_ping is None else pre_ping,
+    }
+
+
+def sqlite_pragmas(config=None):
+    """Pragmas a aplicar en cada conexión SQLite, como dict nombre -> valor"""
+    config = config or DB_ENGINE_CONFIG
+    pragmas = {}
+    if config['sqlite_journal_mode']:
+        if config['sqlite_journal_mode'] not in JOURNAL_MODES:
+            raise ValueError(f"DB_SQLITE_JOURNAL_MODE inválido: {config['sqlite_journal_mode']}")
+        pragmas['journal_mode'] = config['sqlite_journal_mode']
+    if config['sqlite_synchronous']:
+        if config['sqlite_synchronous'] not in SYNCHRONOUS_MODES:
+            raise ValueError(f"DB_SQLITE_SYNCHRONOUS inválido: {config['sqlite_synchronous']}")
+        pragmas['synchronous'] = config['sqlite_synchronous']
+    if config['sqlite_busy_timeout_ms'] > 0:
+        pragmas['busy_timeout'] = config['sqlite_busy_timeout_ms']
+    if config['sqlite_cache_size_kb'] > 0:
+        # Negativo: tamaño en KiB en lugar de páginas
+        pragmas['cache_size'] = -config['sqlite_cache_size_kb']
+    return pragmas
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+            if name == 'journal_mode':
+                # Algunos sistemas de archivos no admiten WAL y SQLite mantiene el modo anterior
+                mode = cursor.fetchone()[0].upper()
+                if mode != value:
+                    logger.warning(f"SQLite usa journal_mode={mode} (se pidió {value})")
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    """Inicializa Flask-SQLAlchemy (en lugar de db.init_app) con las opciones del engine y los pragmas"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(uri))
+    pragmas = app.config.setdefault('SQLITE_PRAGMAS', sqlite_pragmas())
+    db.init_app(app)
+
+    # Flask-SQLAlchemy crea los engines en init_app pero no conecta hasta la primera consulta
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name != 'sqlite':
+                continue
+            engine_pragmas = dict(pragmas)
+            if _is_memory_sqlite(engine.url):
+                # Una base en memoria no tiene diario en disco
+                engine_pragmas.pop('journal_mode', None)
+            if engine_pragmas:
+                event.listen(engine, 'connect', partial(_apply_pragmas, engine_pragmas))
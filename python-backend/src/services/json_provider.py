@@ -0,0 +1,94 @@
+"""
+Serialización JSON de la app.
+
+Con `orjson` instalado (pip install orjson) se usa para jsonify, request.get_json y los cuerpos
+pre-serializados; sin él, la librería estándar con los mismos ajustes que Flask (claves
+ordenadas, fechas en formato HTTP, Decimal/UUID como texto). JSON_ENCODER=stdlib fuerza la
+librería estándar, p. ej. para comparar en los benchmarks.
+
+Las respuestas que se repiten (catálogo, errores constantes) se serializan una vez con
+encode_json() y se envían con json_response(), sin volver a serializar en cada petición.
+"""
+import json
+import os
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_CONFIG = {
+    # auto: orjson si está instalado; stdlib: siempre la librería estándar
+    'encoder': os.environ.get('JSON_ENCODER', 'auto').lower(),
+}
+
+USE_ORJSON = orjson is not None and JSON_CONFIG['encoder'] != 'stdlib'
+
+# Tipos que la librería estándar no serializa: mismo criterio que Flask
+_default = DefaultJSONProvider.default
+
+if orjson is not None:
+    # Las fechas pasan por _default (formato HTTP, como jsonify) en vez del ISO nativo de orjson
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def encode_json(obj, sort_keys=True, indent=False):
+    """Serializa `obj` a bytes UTF-8 (compacto salvo con indent)"""
+    if USE_ORJSON:
+        option = ORJSON_OPTIONS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_default, option=option)
+        except orjson.JSONEncodeError:
+            # Enteros de más de 64 bits y similares: se reintenta con la librería estándar
+            pass
+    return json.dumps(obj, default=_default, ensure_ascii=False, sort_keys=sort_keys,
+                      indent=2 if indent else None,
+                      separators=None if indent else (',', ':')).encode('utf-8')
+
+
+def decode_json(data):
+    """Deserializa texto o bytes UTF-8; lanza ValueError si no es JSON válido"""
+    if USE_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_response(body, status=200, headers=None):
+    """Respuesta con un cuerpo JSON ya serializado (bytes de encode_json)"""
+    return current_app.response_class(body, status=status, headers=headers,
+                                      mimetype='application/json')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask que usa orjson cuando está disponible"""
+
+    def dumps(self, obj, **kwargs):
+        # Con argumentos propios de json.dumps (cls, separators...) se respeta la librería estándar
+        if kwargs or not USE_ORJSON:
+            return super().dumps(obj, **kwargs)
+        return encode_json(obj, sort_keys=self.sort_keys).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs or not USE_ORJSON:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if not USE_ORJSON:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(encode_json(obj, sort_keys=self.sort_keys, indent=indent),
+                                        mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Instala el proveedor JSON en la app (jsonify y request.get_json)"""
+    app.json = FastJSONProvider(app)
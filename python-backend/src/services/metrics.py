@@ -0,0 +1,275 @@
+"""
+Métricas en proceso expuestas en formato de texto de Prometheus (GET /metrics).
+
+Cada hilo acumula en su propio diccionario, sin locks en el camino caliente; al leer /metrics
+se suman los diccionarios de todos los hilos. Los de hilos ya terminados se pliegan en un
+acumulado para no perder cuentas. Con varios workers de gunicorn cada proceso expone las suyas.
+"""
+import bisect
+import os
+import threading
+import time
+from functools import lru_cache
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_CONFIG = {
+    'enabled': os.environ.get('METRICS_ENABLED', 'true').lower() == 'true',
+    'path': os.environ.get('METRICS_PATH', '/metrics'),
+}
+
+# Límites (segundos) de los buckets de los histogramas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Métricas registradas y los valores acumulados por cada hilo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._metrics = []
+        self._shards = []
+        self._retired = {}
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def shard(self):
+        """Diccionario del hilo actual: {(nombre, etiquetas): celda}"""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def _merge_into(self, target, values):
+        for key, cell in values.items():
+            merged = target.get(key)
+            if merged is None:
+                target[key] = list(cell)
+            else:
+                for index, value in enumerate(cell):
+                    merged[index] += value
+
+    def collect(self):
+        """Suma los valores de todos los hilos"""
+        with self._lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self._merge_into(self._retired, values.copy())
+            self._shards = alive
+            merged = {key: list(cell) for key, cell in self._retired.items()}
+            for _, values in alive:
+                # copy() es atómico con el GIL aunque el hilo dueño siga escribiendo
+                self._merge_into(merged, values.copy())
+            metrics = list(self._metrics)
+        return metrics, merged
+
+    def render(self):
+        metrics, merged = self.collect()
+        by_name = {}
+        for (name, labels), cell in merged.items():
+            by_name.setdefault(name, []).append((labels, cell))
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for labels, cell in sorted(by_name.get(metric.name, ())):
+                lines.extend(metric.render(labels, cell))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def inc(self, *labels, amount=1):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        cell = shard.get(key)
+        if cell is None:
+            cell = shard[key] = [0]
+        cell[0] += amount
+
+    def render(self, labels, cell):
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(cell[0])}']
+
+
+class Gauge(Counter):
+    """Valor que sube y baja; cada hilo guarda su aporte y se suman al leer"""
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def observe(self, value, *labels):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        cell = shard.get(key)
+        if cell is None:
+            # Cuentas por bucket (no acumuladas), +Inf y la suma de los valores
+            cell = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def render(self, labels, cell):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), cell[:-1]):
+            cumulative += count
+            le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_text} {_format_value(cell[-1])}')
+        lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+REGISTRY = Registry()
+
+http_requests = Counter('http_requests_total', 'Peticiones HTTP atendidas',
+                        ('endpoint', 'method', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'Latencia de las peticiones HTTP',
+                         ('endpoint', 'method'))
+http_in_flight = Gauge('http_requests_in_flight', 'Peticiones HTTP en curso', ('endpoint',))
+db_latency = Histogram('db_query_duration_seconds', 'Duración de las consultas SQL',
+                       ('statement',), DB_BUCKETS)
+db_errors = Counter('db_query_errors_total', 'Consultas SQL que fallaron', ('statement',))
+upstream_latency = Histogram('upstream_request_duration_seconds',
+                             'Latencia de las llamadas a servicios externos', ('upstream', 'outcome'))
+upstream_rejections = Counter('upstream_circuit_rejections_total',
+                              'Llamadas rechazadas con el circuito abierto', ('upstream',))
+admission_rejections = Counter('admission_rejections_total',
+                               'Peticiones rechazadas por el control de admisión', ('rule', 'reason'))
+upstream_in_flight = Gauge('upstream_requests_in_flight', 'Llamadas en curso a servicios externos',
+                           ('upstream',))
+cache_events = Counter('cache_events_total', 'Aciertos, fallos, expiraciones y desalojos de las cachés',
+                       ('cache', 'event'))
+
+
+def record_request(endpoint, method, status, duration):
+    http_requests.inc(endpoint, method, str(status))
+    http_latency.observe(duration, endpoint, method)
+
+
+def _start_request():
+    endpoint = request.endpoint or 'unmatched'
+    g._metrics_request = (time.perf_counter(), endpoint)
+    http_in_flight.inc(endpoint)
+
+
+def _capture_status(response):
+    g._metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exception=None):
+    started = g.pop('_metrics_request', None)
+    if started is None:
+        return
+    started_at, endpoint = started
+    http_in_flight.dec(endpoint)
+    record_request(endpoint, request.method, g.pop('_metrics_status', 500),
+                   time.perf_counter() - started_at)
+
+
+@lru_cache(maxsize=2048)
+def statement_kind(statement):
+    """Tipo de sentencia (SELECT, INSERT...) como etiqueta de baja cardinalidad"""
+    words = statement.lstrip().split(None, 1)
+    kind = words[0].upper() if words else ''
+    if kind in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'PRAGMA', 'BEGIN', 'COMMIT',
+                'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'CREATE', 'ALTER', 'DROP'):
+        return kind
+    return 'OTHER'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_query_started'].pop()
+    db_latency.observe(time.perf_counter() - started, statement_kind(statement))
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        pending = context.connection.info.get('metrics_query_started')
+        if pending:
+            pending.pop()
+    db_errors.inc(statement_kind(context.statement or ''))
+
+
+def _instrument_engines():
+    # Se escucha en la clase Engine: cubre el engine de Flask-SQLAlchemy y cualquier otro
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+
+def metrics_view():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    """Instrumenta peticiones y consultas y registra la ruta /metrics.
+
+    Debe llamarse antes de registrar otros hooks: su after_request corre el último y ve el
+    código de estado final.
+    """
+    if not METRICS_CONFIG['enabled']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_capture_status)
+    app.teardown_request(_finish_request)
+    app.add_url_rule(METRICS_CONFIG['path'], 'metrics', metrics_view)
+    _instrument_engines()
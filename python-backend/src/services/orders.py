@@ -0,0 +1,50 @@
+import os
+import logging
+
+from src.config import DEFAULT_SPILL_DIR
+from src.models.user import db
+from src.models.order import Order, OrderItem
+from src.services.write_behind import WriteBehindQueue
+from src.services.pricing import to_decimal
+
+logger = logging.getLogger(__name__)
+
+
+def order_record(data, order):
+    """Datos de la orden a persistir (dict plano, sin objetos ORM ligados a la petición)"""
+    return {
+        'order_id': order['order_id'],
+        'customer_name': data['customer_name'],
+        'customer_email': data['customer_email'],
+        'customer_address': data['customer_address'],
+        'total_amount': to_decimal(order['cart'].total),
+        'items': order['cart'].order_items()
+    }
+
+
+def write_orders(records):
+    """Inserta un lote de órdenes con sus items en una sola transacción"""
+    db.session.add_all(
+        Order(
+            order_id=record['order_id'],
+            customer_name=record['customer_name'],
+            customer_email=record['customer_email'],
+            customer_address=record['customer_address'],
+            total_amount=record['total_amount'],
+            items=[OrderItem(**item) for item in record['items']]
+        )
+        for record in records
+    )
+    db.session.commit()
+    logger.info(f"{len(records)} órdenes guardadas")
+
+
+order_queue = WriteBehindQueue(
+    'orders',
+    write_orders,
+    capacity=int(os.environ.get('ORDER_QUEUE_CAPACITY', '10000')),
+    batch_size=int(os.environ.get('ORDER_QUEUE_BATCH_SIZE', '500')),
+    linger=float(os.environ.get('ORDER_QUEUE_LINGER', '0.01')),
+    put_timeout=float(os.environ.get('ORDER_QUEUE_PUT_TIMEOUT', '2')),
+    spill_path=os.environ.get('ORDER_QUEUE_SPILL_PATH', os.path.join(DEFAULT_SPILL_DIR, 'orders.pending.jsonl'))
+)
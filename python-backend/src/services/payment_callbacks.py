@@ -0,0 +1,159 @@
+import json
+import os
+from datetime import datetime, timedelta
+import logging
+
+from sqlalchemy import insert, select, update
+
+from src.config import DEFAULT_SPILL_DIR
+from src.models.user import db
+from src.models.order import Order, PaymentEvent
+from src.services.write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+# Nombres de campo aceptados en el formulario que envía Agilpay
+TRANSACTION_ID_FIELDS = ('TransactionId', 'transactionId', 'transaction_id', 'IDTransaction')
+ORDER_ID_FIELDS = ('Service', 'OrderId', 'orderId', 'order_id')
+STATUS_FIELDS = ('Status', 'status', 'ResponseCode', 'responseCode')
+
+APPROVED_STATUSES = frozenset(['00', '0', 'approved', 'aprobado', 'success', 'paid'])
+DECLINED_STATUSES = frozenset(['declined', 'rechazado', 'rejected', 'failed', 'error'])
+# Precedencia entre estados: un callback no deja la orden en un estado de menor rango
+# (un 'failed' que llega tarde no pisa 'paid'); los demás estados tienen rango 0
+STATUS_RANK = {'paid': 2, 'failed': 1}
+
+# Tiempo máximo que un callback espera a que su orden llegue a la base (cola de órdenes,
+# reintentos de la base u otro worker); después se descarta sin registrarlo y cuenta el
+# reintento de Agilpay
+CALLBACK_ORDER_WAIT = float(os.environ.get('CALLBACK_ORDER_WAIT', '900'))
+
+
+def _first(data, fields):
+    for field in fields:
+        value = data.get(field)
+        if value:
+            return value.strip()
+    return None
+
+
+def _normalize_status(raw):
+    value = (raw or '').strip().lower()
+    if value in APPROVED_STATUSES:
+        return 'paid'
+    if value in DECLINED_STATUSES:
+        return 'failed'
+    return value[:20] or 'unknown'
+
+
+def parse_callback(data):
+    """Validación O(1) del callback; devuelve (evento, error)"""
+    transaction_id = _first(data, TRANSACTION_ID_FIELDS)
+    order_id = _first(data, ORDER_ID_FIELDS)
+    if not transaction_id or not order_id:
+        return None, 'Faltan el identificador de transacción o de orden'
+    return {
+        'transaction_id': transaction_id[:100],
+        'order_id': order_id[:64],
+        'status': _normalize_status(_first(data, STATUS_FIELDS)),
+        'payload': json.dumps(data, ensure_ascii=False),
+        'received_at': datetime.utcnow()
+    }, None
+
+
+def _insert_new_events(events):
+    """Inserta los eventos ignorando transaction_id repetidos; devuelve los ids insertados"""
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Solo se importa el dialecto en uso (el de postgresql tarda en cargarse)
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = (dialect_insert(PaymentEvent)
+                     .on_conflict_do_nothing(index_elements=['transaction_id'])
+                     .returning(PaymentEvent.transaction_id))
+        return set(db.session.scalars(statement, events).all())
+
+    # Otros motores: se filtran primero los ya existentes
+    existing = set(db.session.scalars(
+        select(PaymentEvent.transaction_id)
+        .where(PaymentEvent.transaction_id.in_([event['transaction_id'] for event in events]))
+    ))
+    new_events = [event for event in events if event['transaction_id'] not in existing]
+    if new_events:
+        db.session.execute(insert(PaymentEvent), new_events)
+    return {event['transaction_id'] for event in new_events}
+
+
+def _higher_statuses(status):
+    """Estados que `status` no puede reemplazar (los de mayor rango)"""
+    rank = STATUS_RANK.get(status, 0)
+    return [other for other, other_rank in STATUS_RANK.items() if other_rank > rank]
+
+
+def process_callbacks(events):
+    """Deduplica un lote de callbacks y actualiza el estado de sus órdenes en una transacción.
+
+    Devuelve los callbacks cuya orden aún no existe: no se registran (un reintento de Agilpay
+    no se tomaría como duplicado) y la cola los vuelve a intentar.
+    """
+    unique = {}
+    for event in events:
+        unique.setdefault(event['transaction_id'], event)
+
+    # La orden puede seguir en la cola de órdenes (o en la de otro worker): esos callbacks esperan
+    order_ids = {event['order_id'] for event in unique.values()}
+    existing = set(db.session.scalars(select(Order.order_id).where(Order.order_id.in_(order_ids))))
+    ready, parked = [], []
+    oldest_allowed = datetime.utcnow() - timedelta(seconds=CALLBACK_ORDER_WAIT)
+    for event in unique.values():
+        if event['order_id'] in existing:
+            ready.append(event)
+        elif event['received_at'] >= oldest_allowed:
+            parked.append(event)
+        else:
+            logger.error(f"Callback {event['transaction_id']} descartado: la orden {event['order_id']} "
+                         f"no existe tras {CALLBACK_ORDER_WAIT:.0f} s")
+    inserted = _insert_new_events(ready) if ready else set()
+
+    # Estado final por orden (manda el de mayor precedencia y, a igual rango, el último recibido)
+    final_status = {}
+    for event in sorted(ready, key=lambda event: (STATUS_RANK.get(event['status'], 0), event['received_at'])):
+        if event['transaction_id'] in inserted:
+            final_status[event['order_id']] = event['status']
+    by_status = {}
+    for order_id, status in final_status.items():
+        by_status.setdefault(status, []).append(order_id)
+
+    # La condición de precedencia va en el WHERE: dos lotes en paralelo pueden confirmar en
+    # cualquier orden y el que llega último no retrocede el estado
+    now = datetime.utcnow()
+    superseded = 0
+    for status, status_order_ids in by_status.items():
+        result = db.session.execute(
+            update(Order)
+            .where(Order.order_id.in_(status_order_ids), Order.status.notin_(_higher_statuses(status)))
+            .values(status=status, updated_at=now)
+        )
+        superseded += len(status_order_ids) - result.rowcount
+    db.session.commit()
+
+    duplicates = len(ready) - len(inserted) + len(events) - len(unique)
+    logger.info(f"Callbacks procesados: {len(inserted)} nuevos, {duplicates} duplicados, "
+                f"{superseded} sin efecto por precedencia, {len(parked)} esperando su orden")
+    return parked
+
+
+callback_queue = WriteBehindQueue(
+    'payment_callbacks',
+    process_callbacks,
+    capacity=int(os.environ.get('CALLBACK_QUEUE_CAPACITY', '50000')),
+    batch_size=int(os.environ.get('CALLBACK_QUEUE_BATCH_SIZE', '200')),
+    linger=float(os.environ.get('CALLBACK_QUEUE_LINGER', '0.05')),
+    put_timeout=float(os.environ.get('CALLBACK_QUEUE_PUT_TIMEOUT', '0')),
+    workers=int(os.environ.get('CALLBACK_QUEUE_WORKERS', '2')),
+    retry_delay=float(os.environ.get('CALLBACK_QUEUE_RETRY_DELAY', '1')),
+    spill_path=os.environ.get('CALLBACK_QUEUE_SPILL_PATH',
+                              os.path.join(DEFAULT_SPILL_DIR, 'payment_callbacks.pending.jsonl'))
+)
@@ -0,0 +1,234 @@
+"""
+Valorización del carrito en el servidor.
+
+Los precios salen del catálogo, no del cliente: cada línea indica `product_id` (o `sku`) y
+`quantity`, y se resuelve contra un índice de precios en memoria que se reconstruye con una sola
+consulta cuando cambia el catálogo (misma generación que la caché de src/services/catalog.py).
+Los importes se calculan en centavos (enteros), sin floats: descuento por volumen por línea,
+impuesto sobre el neto y redondeo half-up por línea.
+
+price_cart() no necesita la app si recibe el índice (PriceIndex.from_rows), así que se puede
+medir con carritos sintéticos (benchmarks/bench_pricing.py).
+"""
+import os
+import threading
+from collections import namedtuple
+from contextlib import nullcontext
+from decimal import Decimal
+import logging
+
+from flask import has_app_context
+from sqlalchemy import select
+
+from src.models.user import db
+from src.models.product import Product
+from src.services.catalog import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+# Centavos por unidad de la moneda (USD, código 840)
+MINOR_UNITS = 100
+
+
+def _basis_points(percent):
+    """'18' o '12.5' (por ciento) -> puntos básicos enteros (1800, 1250)"""
+    value = Decimal(percent) * 100
+    if value != value.to_integral_value() or not 0 <= value <= 10000:
+        raise ValueError(f'Porcentaje inválido: {percent}')
+    return int(value)
+
+
+def parse_tiers(value):
+    """'10:5,100:12' -> [(100, 1200), (10, 500)]: cantidad mínima y descuento en puntos básicos"""
+    tiers = []
+    for tier in filter(None, (part.strip() for part in value.split(','))):
+        min_quantity, percent = tier.split(':')
+        tiers.append((int(min_quantity), _basis_points(percent)))
+    return sorted(tiers, reverse=True)
+
+
+PRICING_CONFIG = {
+    # Impuesto en % sobre el neto de cada línea (0: sin impuesto, como hasta ahora)
+    'tax_bp': _basis_points(os.environ.get('PRICING_TAX_PERCENT', '0')),
+    'tax_exempt_categories': frozenset(filter(None, (
+        category.strip() for category in os.environ.get('PRICING_TAX_EXEMPT_CATEGORIES', '').split(',')))),
+    # Descuento por volumen por línea, "cantidad mínima:%" separados por comas (p. ej. 10:5,100:12)
+    'volume_discounts': parse_tiers(os.environ.get('PRICING_VOLUME_DISCOUNTS', '')),
+    'max_lines': int(os.environ.get('PRICING_MAX_LINES', '5000')),
+    'max_quantity': int(os.environ.get('PRICING_MAX_QUANTITY', '100000')),
+}
+
+
+class PricingError(Exception):
+    """El carrito no se puede valorizar (línea inválida o producto no disponible)"""
+
+
+PriceEntry = namedtuple('PriceEntry', 'id sku name unit_price category')
+PricedLine = namedtuple('PricedLine', 'entry quantity gross discount tax total')
+
+
+def to_decimal(minor):
+    """Centavos -> Decimal exacto con dos decimales (columnas Numeric)"""
+    return Decimal(minor).scaleb(-2)
+
+
+def to_amount(minor):
+    """Centavos -> número para JSON (Agilpay recibe importes numéricos)"""
+    return minor / MINOR_UNITS
+
+
+def _part(amount, basis_points):
+    """Fracción de un importe en centavos, redondeada half-up"""
+    return (amount * basis_points + 5000) // 10000
+
+
+class PriceIndex:
+    """Precios de los productos activos por id y por sku (inmutable)"""
+
+    __slots__ = ('by_id', 'by_sku')
+
+    def __init__(self, entries):
+        self.by_id = {entry.id: entry for entry in entries}
+        self.by_sku = {entry.sku: entry for entry in entries}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Filas (id, sku, name, price, category) con el precio en Decimal o texto"""
+        return cls([PriceEntry(id_, sku, name, int(Decimal(price).scaleb(2)), category)
+                    for id_, sku, name, price, category in rows])
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+class PriceIndexCache:
+    """Índice de precios vigente; se reconstruye cuando cambia la generación del catálogo"""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._index = None
+        self._generation = None
+        self.builds = 0
+
+    def init_app(self, app):
+        # La ruta ASGI de checkout valoriza fuera del contexto de Flask
+        self.app = app
+
+    def current(self):
+        with nullcontext() if has_app_context() else self.app.app_context():
+            generation = catalog_cache.generation()
+            if self._index is not None and generation == self._generation:
+                return self._index
+            with self._lock:
+                if self._index is None or generation != self._generation:
+                    rows = db.session.execute(
+                        select(Product.id, Product.sku, Product.name, Product.price, Product.category)
+                        .where(Product.active.is_(True))
+                    ).all()
+                    self._index = PriceIndex.from_rows(rows)
+                    self._generation = generation
+                    self.builds += 1
+                    logger.info(f"Índice de precios reconstruido: {len(self._index)} productos")
+                return self._index
+
+
+price_index = PriceIndexCache()
+
+
+class PricedCart:
+    """Carrito valorizado; todos los importes en centavos"""
+
+    __slots__ = ('lines', 'subtotal', 'discount', 'tax', 'total')
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.subtotal = sum(line.gross for line in lines)
+        self.discount = sum(line.discount for line in lines)
+        self.tax = sum(line.tax for line in lines)
+        self.total = sum(line.total for line in lines)
+
+    def totals(self):
+        return {
+            'subtotal': to_amount(self.subtotal),
+            'discount': to_amount(self.discount),
+            'tax': to_amount(self.tax),
+            'total': to_amount(self.total)
+        }
+
+    def agilpay_items(self):
+        """Líneas para el Detail de Agilpay (Amount incluye el impuesto de la línea)"""
+        return [{
+            'Description': line.entry.name,
+            'Quantity': str(line.quantity),
+            'Amount': to_amount(line.total),
+            'Tax': to_amount(line.tax)
+        } for line in self.lines]
+
+    def order_items(self):
+        """Líneas para OrderItem con importes Decimal exactos"""
+        return [{
+            'description': line.entry.name,
+            'quantity': line.quantity,
+            'unit_price': to_decimal(line.entry.unit_price),
+            'amount': to_decimal(line.total)
+        } for line in self.lines]
+
+
+def _quantity(value, max_quantity):
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if type(value) is not int or not 0 < value <= max_quantity:
+        return None
+    return value
+
+
+def price_cart(items, index=None, config=None):
+    """Valida y valoriza las líneas en una pasada; lanza PricingError con el primer problema.
+
+    Sin `index` se usa el índice del catálogo (requiere la app); `config` reemplaza PRICING_CONFIG.
+    """
+    config = config or PRICING_CONFIG
+    if not isinstance(items, list) or not items:
+        raise PricingError('Items debe ser una lista no vacía')
+    if len(items) > config['max_lines']:
+        raise PricingError(f"El carrito admite como máximo {config['max_lines']} líneas")
+
+    if index is None:
+        index = price_index.current()
+    by_id, by_sku = index.by_id, index.by_sku
+    tiers, tax_bp, exempt = config['volume_discounts'], config['tax_bp'], config['tax_exempt_categories']
+    max_quantity = config['max_quantity']
+
+    lines = []
+    for position, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise PricingError(f'Item {position} debe ser un objeto')
+
+        product_id = item.get('product_id')
+        if product_id is not None:
+            if isinstance(product_id, str) and product_id.isdigit():
+                product_id = int(product_id)
+            entry = by_id.get(product_id) if type(product_id) is int else None
+        elif item.get('sku') is not None:
+            entry = by_sku.get(item['sku']) if isinstance(item['sku'], str) else None
+        else:
+            raise PricingError(f'Item {position} falta product_id o sku')
+        if entry is None:
+            raise PricingError(f'Item {position}: producto no disponible')
+
+        quantity = _quantity(item.get('quantity'), max_quantity)
+        if quantity is None:
+            raise PricingError(f'Item {position} tiene cantidad inválida')
+
+        gross = entry.unit_price * quantity
+        discount = 0
+        for min_quantity, discount_bp in tiers:
+            if quantity >= min_quantity:
+                discount = _part(gross, discount_bp)
+                break
+        net = gross - discount
+        tax = 0 if entry.category in exempt else _part(net, tax_bp)
+        lines.append(PricedLine(entry, quantity, gross, discount, tax, net + tax))
+
+    return PricedCart(lines)
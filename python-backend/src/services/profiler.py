@@ -0,0 +1,332 @@
+"""
+Perfilado bajo demanda de peticiones en vivo.
+
+Desactivado por defecto. Cuando está activo se perfila una fracción de las peticiones
+(PROFILER_SAMPLE_RATE), acotada por un máximo por segundo y de perfiles simultáneos, y los
+resultados se agregan por endpoint. Dos modos:
+
+- cprofile: cProfile por petición; se descarga como archivo pstats (snakeviz, gprof2dot...)
+- sampler: muestreo de la pila del hilo cada PROFILER_INTERVAL_MS; se descarga en formato
+  "collapsed" (flamegraph.pl, speedscope)
+
+Una petición concreta se puede perfilar siempre con las cabeceras `X-Profile: 1` y
+`X-Admin-Token`. Las rutas de administración (/__profiler) exigen el mismo token.
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import logging
+
+from flask import Blueprint, Response, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+PROFILER_CONFIG = {
+    'enabled': os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true',
+    'mode': os.environ.get('PROFILER_MODE', 'cprofile'),
+    'sample_rate': float(os.environ.get('PROFILER_SAMPLE_RATE', '0.01')),
+    # Tope de peticiones perfiladas por segundo y en paralelo (acota el overhead)
+    'max_per_second': float(os.environ.get('PROFILER_MAX_PER_SECOND', '2')),
+    'max_concurrent': int(os.environ.get('PROFILER_MAX_CONCURRENT', '1')),
+    'interval_ms': float(os.environ.get('PROFILER_INTERVAL_MS', '5')),
+    'admin_token': os.environ.get('PROFILER_ADMIN_TOKEN', ''),
+    'path': os.environ.get('PROFILER_PATH', '/__profiler'),
+}
+
+PROFILER_MODES = ('cprofile', 'sampler')
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(code):
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}'
+
+
+def collapse_stack(frame):
+    """Pila de un frame como 'raíz;...;hoja' (formato collapsed de flamegraph)"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class StackSampler:
+    """Hilo que muestrea la pila de los hilos registrados mientras haya alguno activo"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, thread_id, counts):
+        with self._lock:
+            self._active[thread_id] = counts
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name='profiler-sampler')
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, thread_id):
+        with self._lock:
+            self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = dict(self._active)
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id, counts in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = collapse_stack(frame)
+                    counts[stack] = counts.get(stack, 0) + 1
+            time.sleep(self.interval)
+
+
+class Profiler:
+    """Decide qué peticiones perfilar y agrega los resultados por endpoint"""
+
+    def __init__(self, config=None):
+        config = dict(PROFILER_CONFIG, **(config or {}))
+        if config['mode'] not in PROFILER_MODES:
+            raise ValueError(f"PROFILER_MODE debe ser uno de: {', '.join(PROFILER_MODES)}")
+        self.enabled = config['enabled']
+        self.mode = config['mode']
+        self.sample_rate = config['sample_rate']
+        self.max_per_second = config['max_per_second']
+        self.max_concurrent = config['max_concurrent']
+        self.admin_token = config['admin_token']
+        self.sampler = StackSampler(config['interval_ms'] / 1000)
+        self._lock = threading.Lock()
+        self._tokens = max(self.max_per_second, 1.0)
+        self._refilled_at = time.monotonic()
+        self._running = 0
+        self._results = {}
+
+    def is_admin(self, req):
+        token = req.headers.get('X-Admin-Token', '')
+        return bool(self.admin_token) and hmac.compare_digest(token, self.admin_token)
+
+    def wants(self, req):
+        """¿Se debe perfilar esta petición? (muestreo aleatorio o cabecera de admin)"""
+        if req.headers.get('X-Profile') == '1' and self.is_admin(req):
+            return True
+        return self.enabled and random.random() < self.sample_rate
+
+    def _acquire(self):
+        # Token bucket de max_per_second más el tope de perfiles en paralelo
+        with self._lock:
+            now = time.monotonic()
+            burst = max(self.max_per_second, 1.0)
+            self._tokens = min(burst, self._tokens + (now - self._refilled_at) * self.max_per_second)
+            self._refilled_at = now
+            if self._tokens < 1 or self._running >= self.max_concurrent:
+                return False
+            self._tokens -= 1
+            self._running += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._running -= 1
+
+    def start(self, endpoint):
+        """Empieza a perfilar la petición actual; devuelve la sesión o None si no hay cupo"""
+        if not self._acquire():
+            return None
+        if self.mode == 'sampler':
+            counts = {}
+            self.sampler.add(threading.get_ident(), counts)
+            return (endpoint, time.perf_counter(), counts)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Desde Python 3.12 solo puede haber un perfilador activo por proceso
+            self._release()
+            return None
+        return (endpoint, time.perf_counter(), profile)
+
+    def finish(self, session):
+        endpoint, started, collected = session
+        elapsed = time.perf_counter() - started
+        try:
+            if self.mode == 'sampler':
+                self.sampler.remove(threading.get_ident())
+            else:
+                collected.disable()
+            with self._lock:
+                entry = self._results.setdefault(endpoint, {'requests': 0, 'total_s': 0.0, 'data': None})
+                entry['requests'] += 1
+                entry['total_s'] += elapsed
+                if self.mode == 'sampler':
+                    stacks = entry['data'] if entry['data'] is not None else {}
+                    # copy(): el hilo de muestreo puede estar terminando su última pasada
+                    for stack, count in collected.copy().items():
+                        stacks[stack] = stacks.get(stack, 0) + count
+                    entry['data'] = stacks
+                elif entry['data'] is None:
+                    entry['data'] = pstats.Stats(collected)
+                else:
+                    entry['data'].add(collected)
+        finally:
+            self._release()
+
+    def summary(self):
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    'requests': entry['requests'],
+                    'mean_ms': round(entry['total_s'] / entry['requests'] * 1000, 2)
+                }
+                for endpoint, entry in sorted(self._results.items())
+            }
+        return {
+            'enabled': self.enabled,
+            'mode': self.mode,
+            'sample_rate': self.sample_rate,
+            'max_per_second': self.max_per_second,
+            'max_concurrent': self.max_concurrent,
+            'endpoints': endpoints
+        }
+
+    def export(self, endpoint, fmt):
+        """Resultado agregado de un endpoint en el formato pedido; (cuerpo, content type) o None"""
+        with self._lock:
+            entry = self._results.get(endpoint)
+            if entry is None:
+                return None
+            data = entry['data']
+            if self.mode == 'sampler':
+                if fmt != 'collapsed':
+                    return None
+                lines = [f'{stack} {count}' for stack, count in sorted(data.items())]
+                return '\n'.join(lines) + '\n', 'text/plain; charset=utf-8'
+            if fmt == 'pstats':
+                return marshal.dumps(data.stats), 'application/octet-stream'
+            if fmt == 'text':
+                stream = io.StringIO()
+                # Copia: ordenar no debe alterar el agregado
+                report = pstats.Stats(stream=stream)
+                report.add(data)
+                report.sort_stats('cumulative').print_stats(60)
+                return stream.getvalue(), 'text/plain; charset=utf-8'
+        return None
+
+    @staticmethod
+    def _validate(values):
+        """Valida la configuración completa antes de aplicar nada; no convierte tipos"""
+        if not isinstance(values, dict):
+            raise ValueError('La configuración debe ser un objeto JSON')
+        if 'enabled' in values and not isinstance(values['enabled'], bool):
+            raise ValueError('enabled debe ser true o false')
+        for field, upper in (('sample_rate', 1.0), ('max_per_second', None)):
+            if field not in values:
+                continue
+            value = values[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f'{field} debe ser un número')
+            if not 0 <= value or (upper is not None and value > upper):
+                rango = f'estar entre 0 y {upper:g}' if upper is not None else 'ser mayor o igual que 0'
+                raise ValueError(f'{field} debe {rango}')
+
+    def update(self, values):
+        self._validate(values)
+        with self._lock:
+            if 'enabled' in values:
+                self.enabled = values['enabled']
+            if 'sample_rate' in values:
+                self.sample_rate = float(values['sample_rate'])
+            if 'max_per_second' in values:
+                self.max_per_second = float(values['max_per_second'])
+
+    def reset(self):
+        with self._lock:
+            self._results = {}
+
+
+profiler = Profiler()
+
+profiler_bp = Blueprint('profiler', __name__)
+
+
+@profiler_bp.before_request
+def _require_admin():
+    if not profiler.is_admin(request):
+        return jsonify({'success': False, 'error': 'No autorizado'}), 403
+
+
+@profiler_bp.route('', methods=['GET'])
+def profiler_summary():
+    return jsonify({'success': True, 'data': profiler.summary()})
+
+
+@profiler_bp.route('', methods=['DELETE'])
+def profiler_reset():
+    profiler.reset()
+    return jsonify({'success': True})
+
+
+@profiler_bp.route('/config', methods=['POST'])
+def profiler_config():
+    """Activa/desactiva el muestreo o cambia sus límites sin reiniciar"""
+    try:
+        profiler.update(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    logger.info(f"Configuración del profiler actualizada: {profiler.summary()}")
+    return jsonify({'success': True, 'data': profiler.summary()})
+
+
+@profiler_bp.route('/<endpoint>', methods=['GET'])
+def profiler_download(endpoint):
+    default_format = 'collapsed' if profiler.mode == 'sampler' else 'pstats'
+    fmt = request.args.get('format', default_format)
+    exported = profiler.export(endpoint, fmt)
+    if exported is None:
+        return jsonify({
+            'success': False,
+            'error': f"Sin datos de '{endpoint}' en formato '{fmt}' (modo {profiler.mode})"
+        }), 404
+    body, content_type = exported
+    extension = {'pstats': 'pstats', 'text': 'txt', 'collapsed': 'folded'}[fmt]
+    return Response(body, content_type=content_type, headers={
+        'Content-Disposition': f'attachment; filename="{endpoint}.{extension}"'
+    })
+
+
+def _start_profile():
+    if request.endpoint is None or request.endpoint.startswith('profiler.'):
+        return
+    if profiler.wants(request):
+        session = profiler.start(request.endpoint)
+        if session is not None:
+            g._profile_session = session
+
+
+def _finish_profile(exception=None):
+    session = g.pop('_profile_session', None)
+    if session is not None:
+        profiler.finish(session)
+
+
+def init_app(app):
+    """Registra los hooks de perfilado y las rutas de administración"""
+    app.before_request(_start_profile)
+    app.teardown_request(_finish_profile)
+    app.register_blueprint(profiler_bp, url_prefix=PROFILER_CONFIG['path'])
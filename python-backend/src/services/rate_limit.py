@@ -0,0 +1,359 @@
+"""
+Control de admisión delante de las rutas.
+
+- Límite por cliente: un token bucket por regla y cliente (IP o, con RATE_LIMIT_KEY_HEADER, la
+  API key). Detrás de un proxy (nginx) la IP del cliente sale de X-Forwarded-For solo con
+  RATE_LIMIT_TRUST_FORWARDED_FOR; si no, todos los clientes comparten el bucket del proxy. Las
+  reglas se eligen por endpoint ('agilpay.create_payment'), por blueprint ('user') o 'default';
+  las rutas sin regla no se limitan. Si el bucket está vacío se responde 429 con
+  Retry-After de inmediato, antes de leer el cuerpo o tocar la base de datos.
+- Límite global de llamadas en curso hacia Agilpay (upstream_slots): si ya hay
+  AGILPAY_MAX_IN_FLIGHT tokens pendientes en el proceso, el checkout responde 503 sin esperar.
+
+Estado de los buckets (RATE_LIMIT_BACKEND):
+- memory: en el proceso (un nodo); LRU acotado de RATE_LIMIT_MAX_KEYS clientes.
+- shared-local: SharedStateRateLimiter sobre LocalSharedStore, el sustituto en proceso de un
+  almacén compartido; sirve para probar el camino multi-nodo sin infraestructura.
+- 'paquete.modulo:fabrica': una fábrica que devuelva un RateLimitBackend, normalmente
+  SharedStateRateLimiter(almacén) con un SharedStore sobre Redis o memcached (get + CAS).
+"""
+import hashlib
+import importlib
+import math
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+from flask import request
+
+from src.services.json_provider import encode_json, json_response
+from src.services.metrics import admission_rejections, upstream_in_flight
+
+logger = logging.getLogger(__name__)
+
+# Unidades de las reglas: 5/s, 100/m, 1000/h
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_rules(value):
+    """'agilpay.create_payment=5/s:20,user=100/m' -> {nombre: (tokens por segundo, ráfaga)}.
+
+    Sin ráfaga se usa el número de peticiones de la regla (100/m admite 100 seguidas).
+    """
+    rules = {}
+    for rule in filter(None, (part.strip() for part in value.split(','))):
+        try:
+            name, limit = rule.split('=')
+            rate, _, burst = limit.partition(':')
+            count, _, unit = rate.partition('/')
+            per_second = float(count) / RATE_UNITS[unit.strip() or 's']
+            burst = float(burst) if burst else max(float(count), 1.0)
+        except (ValueError, KeyError):
+            raise ValueError(f'Regla de límite inválida: {rule} (se espera nombre=N/s|m|h[:ráfaga])')
+        if per_second <= 0 or burst < 1:
+            raise ValueError(f'Regla de límite inválida: {rule} (tasa y ráfaga deben ser positivas)')
+        rules[name.strip()] = (per_second, burst)
+    return rules
+
+
+def _trusted_proxies(value):
+    """RATE_LIMIT_TRUST_FORWARDED_FOR: proxies propios delante de la app (true = 1)"""
+    value = value.strip().lower()
+    if value in ('true', 'false', ''):
+        return 1 if value == 'true' else 0
+    return int(value)
+
+
+RATE_LIMIT_CONFIG = {
+    'enabled': os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+    'backend': os.environ.get('RATE_LIMIT_BACKEND', 'memory'),
+    'rules': parse_rules(os.environ.get(
+        'RATE_LIMIT_RULES', 'agilpay.create_payment=5/s:20,agilpay.create_payments=1/s:5')),
+    # Cabecera con la API key del cliente (p. ej. X-API-Key, validada por el gateway); sin ella, por IP
+    'key_header': os.environ.get('RATE_LIMIT_KEY_HEADER', ''),
+    # Proxies propios delante de la app (nginx: 1). La IP del cliente es la que agregó el más
+    # externo: la N-ésima desde la derecha de X-Forwarded-For (las de la izquierda las puede
+    # inventar el cliente). 0: se usa la IP de la conexión
+    'trusted_proxies': _trusted_proxies(os.environ.get('RATE_LIMIT_TRUST_FORWARDED_FOR', '0')),
+    'max_keys': int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000')),
+    # Tokens de Agilpay pendientes a la vez por proceso (0: sin límite)
+    'upstream_max_in_flight': int(os.environ.get('AGILPAY_MAX_IN_FLIGHT', '64')),
+}
+
+RATE_LIMITED_BODY = encode_json({
+    'success': False,
+    'error': 'Demasiadas solicitudes, intenta de nuevo más tarde'
+})
+
+
+class RateLimitBackend:
+    """Interfaz del estado de los token buckets"""
+
+    def consume(self, key, rate, burst):
+        """Toma un token del bucket `key`; devuelve (permitido, segundos hasta el próximo token)"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+class MemoryRateLimiter(RateLimitBackend):
+    """Token buckets en memoria del proceso, acotados a max_keys clientes (LRU)"""
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # clave -> (tokens, instante)
+        self.allowed = 0
+        self.rejected = 0
+
+    def consume(self, key, rate, burst):
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Un cliente desalojado vuelve con el bucket lleno: se desalojan primero los inactivos
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'clients': len(self._buckets),
+                'max_keys': self.max_keys,
+                'allowed': self.allowed,
+                'rejected': self.rejected
+            }
+
+
+class SharedStore:
+    """Almacén clave -> texto compartido entre nodos (Redis, memcached...)"""
+
+    def get(self, key):
+        """(valor, versión) o (None, None) si no existe"""
+        raise NotImplementedError
+
+    def compare_and_set(self, key, version, value, ttl):
+        """Guarda `value` con `ttl` segundos de vida solo si la versión no cambió desde get();
+        version=None exige que la clave no exista. Devuelve True si se guardó"""
+        raise NotImplementedError
+
+
+class LocalSharedStore(SharedStore):
+    """Sustituto en proceso de un almacén compartido, con la misma semántica de CAS y TTL"""
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}  # clave -> (valor, versión, expira)
+        self._versions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= self._clock():
+                return None, None
+            return entry[0], entry[1]
+
+    def compare_and_set(self, key, version, value, ttl):
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(key)
+            current = entry[1] if entry is not None and entry[2] > now else None
+            if current != version:
+                return False
+            self._versions += 1
+            self._entries[key] = (value, self._versions, now + ttl)
+            if len(self._entries) > 1000 and self._versions % 1000 == 0:
+                # Limpieza periódica de las claves expiradas (un almacén real lo hace solo)
+                self._entries = {k: e for k, e in self._entries.items() if e[2] > now}
+            return True
+
+
+class SharedStateRateLimiter(RateLimitBackend):
+    """Token buckets sobre un SharedStore compartido por varios nodos.
+
+    Cada consumo es get + compare_and_set (reintenta si otro nodo escribió en medio). Usa el
+    reloj de pared, común a los nodos, y las claves expiran cuando el bucket vuelve a estar lleno.
+    """
+
+    def __init__(self, store, max_attempts=5, clock=time.time):
+        self.store = store
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self.conflicts = 0
+
+    def consume(self, key, rate, burst):
+        for _ in range(self.max_attempts):
+            value, version = self.store.get(key)
+            now = self._clock()
+            if value is None:
+                tokens, updated = burst, now
+            else:
+                tokens, updated = (float(part) for part in value.split(':'))
+            tokens = min(burst, tokens + max(now - updated, 0) * rate)
+            allowed = tokens >= 1
+            remaining = tokens - 1 if allowed else tokens
+            ttl = math.ceil((burst - remaining) / rate) + 1
+            if self.store.compare_and_set(key, version, f'{remaining:.6f}:{now:.6f}', ttl):
+                return allowed, 0.0 if allowed else (1 - tokens) / rate
+            self.conflicts += 1
+        # Contención sostenida sobre la misma clave: se admite antes que rechazar por el almacén
+        logger.warning(f"Límite de '{key}' sin resolver tras {self.max_attempts} intentos; se admite")
+        return True, 0.0
+
+    def stats(self):
+        return {'backend': type(self.store).__name__, 'conflicts': self.conflicts}
+
+
+def load_backend(spec, max_keys):
+    """'memory', 'shared-local' o 'paquete.modulo:fabrica' (la fábrica recibe max_keys)"""
+    if spec == 'memory':
+        return MemoryRateLimiter(max_keys=max_keys)
+    if spec == 'shared-local':
+        return SharedStateRateLimiter(LocalSharedStore())
+    module_name, _, attribute = spec.partition(':')
+    if not attribute:
+        raise ValueError(f"Backend de límites inválido: {spec} (se espera 'memory', 'shared-local' o 'modulo:fabrica')")
+    factory = getattr(importlib.import_module(module_name), attribute)
+    return factory(max_keys=max_keys)
+
+
+def client_id(api_key, forwarded_for, remote_addr, config=None):
+    """Identidad del cliente para los buckets: API key (resumida) o IP"""
+    config = config or RATE_LIMIT_CONFIG
+    if api_key:
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+    trusted = config['trusted_proxies']
+    if trusted and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        return 'ip:' + hops[-min(trusted, len(hops))]
+    return 'ip:' + (remote_addr or '-')
+
+
+def rate_limited_response(retry_after):
+    return json_response(RATE_LIMITED_BODY, status=429,
+                         headers={'Retry-After': str(max(math.ceil(retry_after), 1))})
+
+
+class AdmissionControl:
+    """Token buckets por regla y cliente aplicados antes de cada petición"""
+
+    def __init__(self, config=None):
+        config = config or RATE_LIMIT_CONFIG
+        self.config = config
+        self.enabled = config['enabled']
+        self.rules = config['rules']
+        self.backend = load_backend(config['backend'], config['max_keys'])
+        self._proxy_warned = False
+
+    def rule_for(self, endpoint, blueprint):
+        """(nombre, tasa, ráfaga) de la regla más específica, o None si la ruta no se limita"""
+        for name in (endpoint, blueprint, 'default'):
+            if name and name in self.rules:
+                return (name, *self.rules[name])
+        return None
+
+    def admit(self, endpoint, blueprint, client):
+        """None si se admite; si no, los segundos que el cliente debe esperar"""
+        if not self.enabled:
+            return None
+        rule = self.rule_for(endpoint, blueprint)
+        if rule is None:
+            return None
+        name, rate, burst = rule
+        try:
+            allowed, retry_after = self.backend.consume(f'{name}|{client}', rate, burst)
+        except Exception as e:
+            # Si el almacén compartido falla se admite: el límite protege, no debe tumbar el servicio
+            logger.warning(f"Control de admisión no disponible, se admite la petición: {str(e)}")
+            return None
+        if allowed:
+            return None
+        admission_rejections.inc(name, 'rate_limit')
+        return retry_after
+
+    def _before_request(self):
+        if request.method == 'OPTIONS' or request.endpoint is None:
+            return None
+        key_header = self.config['key_header']
+        forwarded_for = request.headers.get('X-Forwarded-For')
+        if forwarded_for and not self.config['trusted_proxies'] and not self._proxy_warned:
+            self._proxy_warned = True
+            logger.warning("Peticiones con X-Forwarded-For pero RATE_LIMIT_TRUST_FORWARDED_FOR=0: "
+                           "los clientes detrás del proxy comparten un mismo límite (el de su IP)")
+        client = client_id(request.headers.get(key_header) if key_header else None,
+                           forwarded_for, request.remote_addr, self.config)
+        retry_after = self.admit(request.endpoint, request.blueprint, client)
+        if retry_after is None:
+            return None
+        logger.warning(f"Petición rechazada por límite: {request.endpoint} ({client})")
+        return rate_limited_response(retry_after)
+
+    def stats(self):
+        return dict(self.backend.stats(), enabled=self.enabled,
+                    rules={name: {'per_second': rate, 'burst': burst}
+                           for name, (rate, burst) in self.rules.items()})
+
+    def init_app(self, app):
+        if self.enabled:
+            app.before_request(self._before_request)
+
+
+class Overloaded(Exception):
+    """Se rechaza la llamada: ya hay demasiadas en curso hacia el servicio externo"""
+
+    def __init__(self, name, limit):
+        super().__init__(f"'{name}' tiene {limit} llamadas en curso")
+        self.name = name
+        self.retry_after = 1
+
+
+class ConcurrencyLimiter:
+    """Cupo de llamadas simultáneas sin cola: sin cupo se rechaza de inmediato (limit 0: sin límite)"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.limit and self.in_flight >= self.limit:
+                self.rejected += 1
+                admission_rejections.inc(self.name, 'in_flight')
+                raise Overloaded(self.name, self.limit)
+            self.in_flight += 1
+        upstream_in_flight.inc(self.name)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        upstream_in_flight.dec(self.name)
+
+    def snapshot(self):
+        with self._lock:
+            return {'limit': self.limit, 'in_flight': self.in_flight, 'rejected': self.rejected}
+
+
+admission = AdmissionControl()
+upstream_slots = ConcurrencyLimiter('agilpay_token', RATE_LIMIT_CONFIG['upstream_max_in_flight'])
+
+
+def init_app(app):
+    admission.init_app(app)
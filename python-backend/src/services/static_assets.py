@@ -0,0 +1,241 @@
+"""
+Archivos estáticos servidos desde memoria.
+
+Al arrancar se recorre src/static una vez y cada archivo queda en un manifiesto con su contenido,
+sus variantes comprimidas (gzip y, si está instalado el paquete `brotli`, br), su tipo y un ETag
+por hash de contenido. Servir un archivo o el fallback de la SPA (index.html) no toca el disco.
+Los archivos con huella se cachean un año como immutable y el resto se revalida con el ETag.
+Si el build dejó un manifiesto (Vite o webpack/Create React App), solo los archivos que este
+lista tienen huella; sin manifiesto, los que terminan en un hash hexadecimal (app.3f2a9c1b.js).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import logging
+
+from flask import Response, current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_CONFIG = {
+    # Archivos más grandes no se cargan en memoria y se sirven desde disco
+    'max_file_bytes': int(os.environ.get('STATIC_MAX_FILE_BYTES', str(5 * 1024 * 1024))),
+    'compress_min_bytes': int(os.environ.get('STATIC_COMPRESS_MIN_BYTES', '512')),
+    # Cache-Control de los archivos sin huella (0: revalidar siempre con el ETag)
+    'max_age': int(os.environ.get('STATIC_MAX_AGE', '0')),
+}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+INDEX_FILE = 'index.html'
+STATIC_URL_PREFIX = 'static/'
+
+# Manifiestos de build que listan los archivos emitidos con huella (rutas relativas a la carpeta)
+BUILD_MANIFESTS = ('.vite/manifest.json', 'asset-manifest.json')
+
+# Sin manifiesto de build: hash hexadecimal de 8 o más caracteres con alguna letra (app.3f2a9c1b.js,
+# main-4889e940.css). styles-version2.css o hero-20240101.jpg no cuentan: sus nombres no cambian con
+# el contenido y un año de caché dejaría a los navegadores con la versión vieja
+FINGERPRINT_PATTERN = re.compile(r'[.-](?=[0-9a-f]*[a-f])[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+
+# Formatos ya comprimidos: recomprimirlos no reduce el tamaño
+PRECOMPRESSED_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/avif',
+                       'font/woff', 'font/woff2', 'application/zip', 'application/gzip',
+                       'video/', 'audio/')
+
+
+class StaticAsset:
+    __slots__ = ('path', 'mimetype', 'etag', 'cache_control', 'variants', 'size')
+
+    def __init__(self, path, data, mimetype, cache_control):
+        self.path = path
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.size = len(data)
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+        # Codificación -> (cuerpo, ETag); cada variante tiene su propio ETag fuerte
+        self.variants = {'identity': (data, self.etag)}
+
+    def add_variant(self, encoding, data):
+        self.variants[encoding] = (data, f'{self.etag}-{encoding}')
+
+
+def _compressible(mimetype, size):
+    if size < STATIC_CONFIG['compress_min_bytes']:
+        return False
+    return not any(mimetype.startswith(prefix) for prefix in PRECOMPRESSED_TYPES)
+
+
+def read_build_manifest(root):
+    """Archivos con huella según el manifiesto de build de `root`; None si no hay manifiesto"""
+    for name in BUILD_MANIFESTS:
+        manifest_path = os.path.join(root, name)
+        if not os.path.isfile(manifest_path):
+            continue
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                data = json.load(f)
+            if name == 'asset-manifest.json':
+                # webpack / Create React App: {"files": {"main.js": "/static/js/main.8f2a9c1b.js", ...}}
+                files = list(data.get('files', {}).values())
+            else:
+                # Vite: {"src/main.js": {"file": "assets/main-4889e940.js", "css": [...], "assets": [...]}}
+                files = []
+                for chunk in data.values():
+                    files.append(chunk['file'])
+                    files.extend(chunk.get('css', ()))
+                    files.extend(chunk.get('assets', ()))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning(f"Manifiesto de build inválido ({manifest_path}), se ignora: {str(e)}")
+            continue
+        return {path.lstrip('/') for path in files if isinstance(path, str)}
+    return None
+
+
+def _fingerprinted(path, build_files):
+    if build_files is not None:
+        return path in build_files
+    return FINGERPRINT_PATTERN.search(path) is not None
+
+
+def _cache_control(path, mimetype, build_files=None):
+    if mimetype != 'text/html' and _fingerprinted(path, build_files):
+        return IMMUTABLE_CACHE_CONTROL
+    max_age = STATIC_CONFIG['max_age']
+    return f'public, max-age={max_age}' if max_age > 0 else 'no-cache'
+
+
+def load_asset(root, path, build_files=None):
+    """Lee un archivo y calcula sus variantes; None si supera max_file_bytes.
+
+    build_files: archivos con huella del manifiesto de build (None: se decide por el nombre)
+    """
+    full_path = os.path.join(root, path)
+    if os.path.getsize(full_path) > STATIC_CONFIG['max_file_bytes']:
+        return None
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    asset = StaticAsset(path, data, mimetype, _cache_control(path, mimetype, build_files))
+    if _compressible(mimetype, len(data)):
+        # Solo se guarda la variante si ahorra al menos un 10 %
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data) * 0.9:
+            asset.add_variant('gzip', compressed)
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data) * 0.9:
+                asset.add_variant('br', compressed)
+    return asset
+
+
+class StaticManifest:
+    """Índice en memoria de los archivos de la carpeta estática"""
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.on_disk = set()
+        self.signature = None
+
+    def _scan(self):
+        files = []
+        if self.root and os.path.isdir(self.root):
+            for directory, _, names in os.walk(self.root):
+                for name in names:
+                    full_path = os.path.join(directory, name)
+                    stat = os.stat(full_path)
+                    files.append((os.path.relpath(full_path, self.root).replace(os.sep, '/'),
+                                  stat.st_size, stat.st_mtime_ns))
+        return sorted(files)
+
+    def build(self):
+        files = self._scan()
+        build_files = read_build_manifest(self.root) if self.root else None
+        assets, on_disk = {}, set()
+        for path, _, _ in files:
+            asset = load_asset(self.root, path, build_files)
+            if asset is None:
+                on_disk.add(path)
+            else:
+                assets[path] = asset
+        self.assets, self.on_disk, self.signature = assets, on_disk, files
+        compressed = sum(1 for asset in assets.values() if len(asset.variants) > 1)
+        logger.info(f"Manifiesto estático: {len(assets)} archivos en memoria ({compressed} comprimidos, "
+                    f"brotli {'sí' if brotli else 'no'}), {len(on_disk)} desde disco")
+
+    def refresh_if_changed(self):
+        """Reconstruye si cambió algún archivo (solo en modo debug: recorre el directorio)"""
+        if self._scan() != self.signature:
+            self.build()
+
+    def index(self):
+        return self.assets.get(INDEX_FILE)
+
+
+def _choose_encoding(asset):
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and accepted[encoding] > 0:
+            return encoding
+    return 'identity'
+
+
+def asset_response(asset):
+    """Respuesta con la mejor codificación aceptada, o 304 si el cliente ya la tiene"""
+    encoding = _choose_encoding(asset)
+    body, etag = asset.variants[encoding]
+    headers = {'Cache-Control': asset.cache_control}
+    if len(asset.variants) > 1:
+        headers['Vary'] = 'Accept-Encoding'
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+
+    # Comparación débil (RFC 9110): un proxy que recomprime puede devolver W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(body, mimetype=asset.mimetype, headers=headers)
+    response.set_etag(etag)
+    return response
+
+
+def serve(path):
+    """Archivo estático desde memoria; las rutas desconocidas devuelven index.html (SPA)"""
+    manifest = current_app.extensions.get('static_manifest')
+    if manifest is None:
+        return "Static folder not configured", 404
+    if current_app.debug:
+        manifest.refresh_if_changed()
+
+    asset = manifest.assets.get(path)
+    if asset is None and path.startswith(STATIC_URL_PREFIX):
+        # Compatibilidad con las URLs /static/... de la ruta estática de Flask
+        path = path[len(STATIC_URL_PREFIX):]
+        asset = manifest.assets.get(path)
+    if asset is not None:
+        return asset_response(asset)
+    if path in manifest.on_disk:
+        return send_from_directory(manifest.root, path)
+
+    index = manifest.index()
+    if index is None:
+        return "index.html not found", 404
+    return asset_response(index)
+
+
+def init_app(app, folder):
+    """Construye el manifiesto de `folder` y registra la ruta comodín de la SPA"""
+    if folder is not None:
+        manifest = StaticManifest(folder)
+        manifest.build()
+        app.extensions['static_manifest'] = manifest
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
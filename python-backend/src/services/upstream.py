@@ -0,0 +1,289 @@
+import os
+import random
+import threading
+import time
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError, MaxRetryError, NewConnectionError, ProtocolError, ReadTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Métodos que se pueden reintentar aunque la petición haya llegado al servidor
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUS_CODES = frozenset([502, 503, 504])
+# Tamaño máximo de cada lectura del cuerpo: entre lecturas se vuelve a comprobar el deadline
+BODY_CHUNK_SIZE = 16384
+
+# Configuración del cliente (un pool por proceso, dimensionado a los hilos del worker)
+UPSTREAM_CONFIG = {
+    'pool_size': int(os.environ.get('AGILPAY_POOL_SIZE', os.environ.get('WORKER_THREADS', '8'))),
+    'connect_timeout': float(os.environ.get('AGILPAY_CONNECT_TIMEOUT', '3.05')),
+    'read_timeout': float(os.environ.get('AGILPAY_READ_TIMEOUT', '10')),
+    'max_retries': int(os.environ.get('AGILPAY_MAX_RETRIES', '2')),
+    'backoff_base': float(os.environ.get('AGILPAY_BACKOFF_BASE', '0.1')),
+    'backoff_max': float(os.environ.get('AGILPAY_BACKOFF_MAX', '1.0')),
+}
+
+
+class DeadlineExceeded(requests.Timeout):
+    """El presupuesto de tiempo de la llamada se agotó antes de completarla"""
+
+
+class PoolStats:
+    """Estadísticas del pool de conexiones (reutilización y tiempo de espera)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.new_connections = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+            self.requests = 0
+            self.retries = 0
+            self.failures = 0
+
+    def record_checkout(self, waited):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time_total += waited
+            if waited > self.wait_time_max:
+                self.wait_time_max = waited
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_request(self, retries, failed):
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            if failed:
+                self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            checkouts = self.checkouts
+            reused = max(checkouts - self.new_connections, 0)
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'checkouts': checkouts,
+                'new_connections': self.new_connections,
+                'reuse_ratio': round(reused / checkouts, 4) if checkouts else 0.0,
+                'wait_time_avg_ms': round(self.wait_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+                'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+            }
+
+
+def _instrumented_pool(base, stats, pool_timeout):
+    """Crea una subclase del pool de urllib3 que reporta esperas y conexiones nuevas.
+
+    requests no pasa pool_timeout a urllib3 (con pool_block la espera sería indefinida): se usa
+    el de la llamada en curso, pool_timeout(), que sale del presupuesto restante.
+    """
+
+    class InstrumentedPool(base):
+        def _get_conn(self, timeout=None):
+            if timeout is None:
+                timeout = pool_timeout()
+            start = time.monotonic()
+            try:
+                return super()._get_conn(timeout=timeout)
+            finally:
+                stats.record_checkout(time.monotonic() - start)
+
+        def _new_conn(self):
+            stats.record_new_connection()
+            return super()._new_conn()
+
+    return InstrumentedPool
+
+
+class PooledAdapter(HTTPAdapter):
+    """Adaptador HTTP con pool bloqueante e instrumentado"""
+
+    def __init__(self, stats, pool_size, **kwargs):
+        self._stats = stats
+        self._local = threading.local()
+        super().__init__(pool_connections=1, pool_maxsize=pool_size, pool_block=True,
+                         max_retries=0, **kwargs)
+
+    def set_pool_timeout(self, seconds):
+        """Espera máxima por una conexión libre para las peticiones de este hilo"""
+        self._local.pool_timeout = seconds
+
+    def _pool_timeout(self):
+        return getattr(self._local, 'pool_timeout', None)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _instrumented_pool(HTTPConnectionPool, self._stats, self._pool_timeout),
+            'https': _instrumented_pool(HTTPSConnectionPool, self._stats, self._pool_timeout),
+        }
+
+
+class UpstreamClient:
+    """Cliente HTTP compartido con keep-alive, reintentos acotados y presupuestos de tiempo"""
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=None, backoff_max=None):
+        self.pool_size = pool_size or UPSTREAM_CONFIG['pool_size']
+        self.connect_timeout = connect_timeout or UPSTREAM_CONFIG['connect_timeout']
+        self.read_timeout = read_timeout or UPSTREAM_CONFIG['read_timeout']
+        self.max_retries = UPSTREAM_CONFIG['max_retries'] if max_retries is None else max_retries
+        self.backoff_base = UPSTREAM_CONFIG['backoff_base'] if backoff_base is None else backoff_base
+        self.backoff_max = UPSTREAM_CONFIG['backoff_max'] if backoff_max is None else backoff_max
+        self.stats = PoolStats()
+
+        self.session = requests.Session()
+        self.adapter = PooledAdapter(self.stats, self.pool_size)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+    def _timeout_for(self, deadline):
+        """Calcula (connect, read) respetando el deadline de la llamada y fija la espera por el pool"""
+        if deadline is None:
+            self.adapter.set_pool_timeout(self.connect_timeout)
+            return (self.connect_timeout, self.read_timeout)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded('Presupuesto de tiempo agotado')
+        self.adapter.set_pool_timeout(remaining)
+        return (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+
+    def _read_body(self, response, deadline):
+        """Lee el cuerpo por partes sin pasar del deadline: un cuerpo que llega por goteo no lo extiende.
+
+        Los timeouts del socket acotan cada lectura, no la respuesta completa; antes de cada parte
+        se ajusta el timeout del socket al tiempo restante.
+        """
+        connection = response.raw.connection
+        sock = getattr(connection, 'sock', None)
+        chunks = []
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded('Presupuesto de tiempo agotado leyendo la respuesta')
+                if sock is not None:
+                    sock.settimeout(min(self.read_timeout, remaining))
+                chunk = response.raw.read1(BODY_CHUNK_SIZE, decode_content=True)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except ReadTimeoutError as e:
+            response.close()
+            if time.monotonic() >= deadline:
+                raise DeadlineExceeded('Presupuesto de tiempo agotado leyendo la respuesta')
+            raise requests.ReadTimeout(e, request=response.request)
+        except ProtocolError as e:
+            response.close()
+            raise requests.ConnectionError(e, request=response.request)
+        except DeadlineExceeded:
+            # La conexión tiene datos sin leer: se cierra en lugar de devolverla al pool
+            response.close()
+            raise
+        response._content = b''.join(chunks)
+        response._content_consumed = True
+        response.raw.release_conn()
+        return response
+
+    def _backoff(self, attempt):
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def _never_sent(error):
+        """Indica si el error ocurrió antes de enviar la petición al servidor"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = error.args[0] if error.args else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, NewConnectionError)
+
+    def _should_retry(self, method, error=None, response=None):
+        # Los errores de conexión son seguros: la petición nunca llegó al servidor
+        if isinstance(error, requests.ConnectionError) and self._never_sent(error):
+            return True
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        if isinstance(error, requests.Timeout):
+            return True
+        return response is not None and response.status_code in RETRY_STATUS_CODES
+
+    def request(self, method, url, deadline=None, **kwargs):
+        """Ejecuta una petición con reintentos acotados; deadline es un instante de time.monotonic()"""
+        method = method.upper()
+        attempt = 0
+        while True:
+            error = None
+            response = None
+            try:
+                # Con deadline el cuerpo se lee aparte (_read_body) para acotar la respuesta completa
+                response = self.session.request(method, url, timeout=self._timeout_for(deadline),
+                                                stream=deadline is not None, **kwargs)
+                if deadline is not None:
+                    response = self._read_body(response, deadline)
+            except EmptyPoolError:
+                # No se liberó ninguna conexión del pool dentro del presupuesto
+                self.stats.record_request(attempt, failed=True)
+                raise DeadlineExceeded('Presupuesto de tiempo agotado esperando una conexión del pool')
+            except DeadlineExceeded:
+                self.stats.record_request(attempt, failed=True)
+                raise
+            except requests.RequestException as e:
+                error = e
+
+            if attempt < self.max_retries and self._should_retry(method, error, response):
+                delay = self._backoff(attempt)
+                if deadline is None or time.monotonic() + delay < deadline:
+                    attempt += 1
+                    logger.warning(f"Reintentando {method} {url} (intento {attempt}): "
+                                   f"{error or response.status_code}")
+                    if response is not None:
+                        response.close()
+                    time.sleep(delay)
+                    continue
+
+            self.stats.record_request(attempt, failed=error is not None)
+            if error is not None:
+                raise error
+            return response
+
+    def post(self, url, deadline=None, **kwargs):
+        return self.request('POST', url, deadline=deadline, **kwargs)
+
+    def get(self, url, deadline=None, **kwargs):
+        return self.request('GET', url, deadline=deadline, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Devuelve el cliente compartido del proceso (se crea en el primer uso, tras el fork)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamClient()
+    return _client
+
+
+def deadline_in(seconds):
+    """Convierte un presupuesto en segundos a un deadline absoluto"""
+    return time.monotonic() + seconds
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import random
+import time
+import logging
+
+try:
+    import aiohttp
+except ImportError:  # Dependencia opcional: requirements-async.txt
+    aiohttp = None
+
+from src.services.upstream import UPSTREAM_CONFIG, IDEMPOTENT_METHODS, RETRY_STATUS_CODES, PoolStats
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDeadlineExceeded(Exception):
+    """El presupuesto de tiempo de la llamada se agotó antes de completarla"""
+
+
+class UpstreamResponse:
+    """Respuesta ya leída, con la misma interfaz mínima que requests.Response"""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _trace_config(stats):
+    """Reporta esperas del pool y conexiones nuevas/reutilizadas a PoolStats"""
+    trace = aiohttp.TraceConfig()
+
+    async def on_queued_start(session, context, params):
+        context.queued_at = time.monotonic()
+
+    async def on_queued_end(session, context, params):
+        context.waited = time.monotonic() - context.queued_at
+
+    async def on_create_end(session, context, params):
+        stats.record_new_connection()
+        stats.record_checkout(getattr(context, 'waited', 0.0))
+
+    async def on_reuse(session, context, params):
+        stats.record_checkout(getattr(context, 'waited', 0.0))
+
+    trace.on_connection_queued_start.append(on_queued_start)
+    trace.on_connection_queued_end.append(on_queued_end)
+    trace.on_connection_create_end.append(on_create_end)
+    trace.on_connection_reuseconn.append(on_reuse)
+    return trace
+
+
+class AsyncUpstreamClient:
+    """Versión asíncrona (aiohttp) del cliente compartido, con los mismos timeouts y reintentos"""
+
+    def __init__(self, max_connections=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=None, backoff_max=None):
+        if aiohttp is None:
+            raise RuntimeError('aiohttp no está instalado (pip install -r requirements-async.txt)')
+        # Un solo event loop atiende muchas peticiones, así que el pool no se limita a los hilos
+        self.pool_size = max_connections or max(UPSTREAM_CONFIG['pool_size'], 100)
+        self.connect_timeout = connect_timeout or UPSTREAM_CONFIG['connect_timeout']
+        self.read_timeout = read_timeout or UPSTREAM_CONFIG['read_timeout']
+        self.max_retries = UPSTREAM_CONFIG['max_retries'] if max_retries is None else max_retries
+        self.backoff_base = UPSTREAM_CONFIG['backoff_base'] if backoff_base is None else backoff_base
+        self.backoff_max = UPSTREAM_CONFIG['backoff_max'] if backoff_max is None else backoff_max
+        self.stats = PoolStats()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            trace_configs=[_trace_config(self.stats)],
+        )
+
+    def _timeout_for(self, deadline):
+        if deadline is None:
+            return aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise AsyncDeadlineExceeded('Presupuesto de tiempo agotado')
+        return aiohttp.ClientTimeout(total=remaining,
+                                     sock_connect=min(self.connect_timeout, remaining),
+                                     sock_read=min(self.read_timeout, remaining))
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _should_retry(self, method, error=None, response=None):
+        # Igual que el cliente síncrono: solo se reintenta un POST si nunca se envió
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return True
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        if isinstance(error, asyncio.TimeoutError):
+            return True
+        return response is not None and response.status_code in RETRY_STATUS_CODES
+
+    async def request(self, method, url, deadline=None, **kwargs):
+        """Ejecuta una petición con reintentos acotados; deadline es un instante de time.monotonic()"""
+        method = method.upper()
+        attempt = 0
+        while True:
+            error = None
+            response = None
+            try:
+                async with self.session.request(method, url, timeout=self._timeout_for(deadline),
+                                                **kwargs) as raw:
+                    response = UpstreamResponse(raw.status, await raw.read())
+            except AsyncDeadlineExceeded:
+                self.stats.record_request(attempt, failed=True)
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt < self.max_retries and self._should_retry(method, error, response):
+                delay = self._backoff(attempt)
+                if deadline is None or time.monotonic() + delay < deadline:
+                    attempt += 1
+                    logger.warning(f"Reintentando {method} {url} (intento {attempt}): "
+                                   f"{error or response.status_code}")
+                    await asyncio.sleep(delay)
+                    continue
+
+            self.stats.record_request(attempt, failed=error is not None)
+            if error is not None:
+                raise error
+            return response
+
+    async def post(self, url, deadline=None, **kwargs):
+        return await self.request('POST', url, deadline=deadline, **kwargs)
+
+    async def aclose(self):
+        await self.session.close()
+
+
+_clients = {}
+
+
+def get_async_client():
+    """Devuelve el cliente del event loop actual (las sesiones de aiohttp no se comparten entre loops)"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncUpstreamClient()
+    return client
+
+
+async def close_async_client():
+    """Cierra el cliente del loop actual (al apagar el servidor ASGI)"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
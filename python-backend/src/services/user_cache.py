@@ -0,0 +1,110 @@
+import os
+import threading
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.models.user import User
+from src.services.cache import load_backend
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_CONFIG = {
+    'enabled': os.environ.get('USER_CACHE_ENABLED', 'true').lower() == 'true',
+    # memory (LRU por proceso), sqlite (archivo compartido por los workers de la máquina) o una
+    # fábrica 'paquete.modulo:fabrica'. Con varios workers gunicorn.conf.py elige sqlite: con
+    # memory cada worker serviría su copia (y su ETag) hasta el TTL tras un cambio hecho en otro
+    'backend': os.environ.get('USER_CACHE_BACKEND', 'memory'),
+    'path': os.environ.get('USER_CACHE_PATH') or None,
+    'max_entries': int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000')),
+    # Límite de antigüedad: acota lo que otro worker puede servir tras un cambio hecho en este
+    'ttl': float(os.environ.get('USER_CACHE_TTL', '30')),
+}
+
+
+class UserCache:
+    """Respuestas de GET /api/users/<id> pre-serializadas, con su ETag (read-through).
+
+    Se invalidan al confirmar una transacción que crea, modifica o elimina usuarios
+    (eventos de la sesión). Las escrituras con sentencias Core/bulk, que no pasan por la
+    sesión, deben incrementar User.version y registrar los ids con track_user_changes().
+    """
+
+    def __init__(self, config=None):
+        config = config or USER_CACHE_CONFIG
+        self.enabled = config['enabled']
+        self.backend = load_backend(config['backend'], 'users', path=config['path'],
+                                    max_entries=config['max_entries'], ttl=config['ttl'])
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(user_id):
+        return f'user:{user_id}'
+
+    def get(self, user_id, load):
+        """(etag, cuerpo) del usuario; si no está, load() lo genera (None: no existe, no se guarda)"""
+        if not self.enabled:
+            return load()
+        key = self._key(user_id)
+        value = self.backend.get(key)
+        if value is not None:
+            # El almacén guarda bytes: b'<etag>\n<cuerpo>'
+            etag, _, body = value.partition(b'\n')
+            return etag.decode('ascii'), body
+
+        generation = self._generation
+        entry = load()
+        if entry is not None:
+            etag, body = entry
+            with self._lock:
+                # Si hubo una invalidación mientras se leía de la BD, lo leído puede estar viejo
+                if generation == self._generation:
+                    self.backend.set(key, etag.encode('ascii') + b'\n' + body)
+        return entry
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(user_ids)
+        self.backend.delete([self._key(user_id) for user_id in user_ids])
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self.backend.clear()
+
+    def stats(self):
+        return dict(self.backend.stats(), enabled=self.enabled, invalidations=self.invalidations)
+
+
+user_cache = UserCache()
+
+
+def track_user_changes(session, user_ids):
+    """Marca usuarios modificados en la transacción; se invalidan al confirmarla.
+
+    Las sentencias Core/bulk (UPDATE ... RETURNING) lo llaman a mano: no pasan por after_flush.
+    """
+    session.info.setdefault('user_cache_ids', set()).update(user_ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_user_changes(session, flush_context):
+    changed = [obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, User)]
+    if changed:
+        track_user_changes(session, changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    user_ids = session.info.pop('user_cache_ids', None)
+    if user_ids:
+        user_cache.invalidate(user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('user_cache_ids', None)
@@ -0,0 +1,142 @@
+import json
+import logging
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import User, db
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+CONFLICT = 'conflict'
+ERROR = 'error'
+
+
+def iter_json_rows(rows):
+    """(índice, fila) de un arreglo JSON ya parseado"""
+    return enumerate(rows)
+
+
+def iter_ndjson_rows(stream):
+    """(índice, fila) de un cuerpo NDJSON leído línea a línea; las líneas inválidas se reportan como error"""
+    index = 0
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError:
+            yield index, ValueError('JSON inválido')
+        index += 1
+
+
+def _normalize(index, row):
+    """Valida una fila; devuelve (resultado de error, None) o (None, valores a insertar)"""
+    if isinstance(row, ValueError):
+        return {'index': index, 'status': ERROR, 'error': str(row)}, None
+    if not isinstance(row, dict) or 'username' not in row or 'email' not in row:
+        return {'index': index, 'status': ERROR, 'error': 'Username y email son requeridos'}, None
+    if not isinstance(row['username'], str) or not isinstance(row['email'], str):
+        return {'index': index, 'status': ERROR, 'error': 'Username y email deben ser texto'}, None
+
+    username = row['username'].strip()
+    email = row['email'].strip().lower()
+    errors = User.validate_fields(username, email)
+    if errors:
+        return {'index': index, 'status': ERROR, 'error': 'Datos inválidos', 'details': errors}, None
+    return None, {'username': username, 'email': email}
+
+
+def _conflict(index):
+    return {'index': index, 'status': CONFLICT, 'error': 'Username o email ya existe'}
+
+
+def _insert_chunk(pending):
+    """Inserta las filas en una sola transacción; devuelve {índice: id}"""
+    indexes = [index for index, _ in pending]
+    result = db.session.execute(
+        insert(User).returning(User.id, sort_by_parameter_order=True),
+        [values for _, values in pending]
+    )
+    ids = dict(zip(indexes, result.scalars().all()))
+    db.session.commit()
+    return ids
+
+
+def _insert_rows_individually(pending, results):
+    """Respaldo si el lote choca con una inserción concurrente: fila a fila con savepoints"""
+    for index, values in pending:
+        try:
+            with db.session.begin_nested():
+                user_id = db.session.execute(insert(User).returning(User.id), values).scalar_one()
+            results.append({'index': index, 'status': CREATED, 'id': user_id})
+        except IntegrityError:
+            results.append(_conflict(index))
+    db.session.commit()
+
+
+def import_chunk(rows):
+    """Valida e inserta un lote [(índice, fila)] y devuelve los resultados por fila"""
+    results = []
+    pending = []
+    seen_usernames = set()
+    seen_emails = set()
+
+    for index, row in rows:
+        error, values = _normalize(index, row)
+        if error:
+            results.append(error)
+        elif values['username'] in seen_usernames or values['email'] in seen_emails:
+            results.append(_conflict(index))
+        else:
+            seen_usernames.add(values['username'])
+            seen_emails.add(values['email'])
+            pending.append((index, values))
+
+    if not pending:
+        return results
+
+    # Una sola consulta por lote para detectar duplicados ya existentes
+    existing = db.session.execute(
+        select(User.username, User.email).where(or_(
+            User.username.in_([values['username'] for _, values in pending]),
+            User.email.in_([values['email'] for _, values in pending])
+        ))
+    ).all()
+    taken_usernames = {row.username for row in existing}
+    taken_emails = {row.email for row in existing}
+
+    to_insert = []
+    for index, values in pending:
+        if values['username'] in taken_usernames or values['email'] in taken_emails:
+            results.append(_conflict(index))
+        else:
+            to_insert.append((index, values))
+
+    if to_insert:
+        try:
+            ids = _insert_chunk(to_insert)
+            results.extend({'index': index, 'status': CREATED, 'id': ids[index]} for index, _ in to_insert)
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning("Conflicto concurrente en importación masiva, insertando fila a fila")
+            _insert_rows_individually(to_insert, results)
+
+    return results
+
+
+def import_users(rows, chunk_size):
+    """Importa un iterable de (índice, fila) en lotes de chunk_size, un commit por lote"""
+    results = []
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            results.extend(import_chunk(chunk))
+            chunk = []
+    if chunk:
+        results.extend(import_chunk(chunk))
+    results.sort(key=lambda result: result['index'])
+    return results
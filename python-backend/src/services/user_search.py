@@ -0,0 +1,189 @@
+"""
+Búsqueda de usuarios para soporte (GET /api/users/search).
+
+- Prefijo (por defecto): username o email que empiezan por `q`, sin distinguir mayúsculas. Usa los
+  índices de expresión lower(username) y lower(email) del modelo con un rango
+  [q, sucesor(q)), así que cada consulta recorre solo `limit` entradas del índice.
+- Texto completo (mode=fulltext): palabras sueltas en cualquier parte del username o del email
+  ("perez", "example"), con ranking. En SQLite es una tabla FTS5 (user_search) con contenido
+  externo que mantienen triggers, también para las escrituras Core/bulk; en PostgreSQL, índices
+  GIN de trigramas (pg_trgm) sobre lower(username) y lower(email).
+
+create_search_index() crea lo necesario para el texto completo y se llama desde init-db.
+"""
+import os
+import re
+import logging
+
+from sqlalchemy import and_, func, select, text
+
+from src.models.user import User, db
+
+logger = logging.getLogger(__name__)
+
+USER_SEARCH_CONFIG = {
+    # Crear el índice de texto completo en init-db (los triggers agregan costo a cada escritura)
+    'fulltext': os.environ.get('USER_SEARCH_FULLTEXT', 'true').lower() == 'true',
+    'default_limit': int(os.environ.get('USER_SEARCH_DEFAULT_LIMIT', '20')),
+    'max_limit': int(os.environ.get('USER_SEARCH_MAX_LIMIT', '100')),
+    'max_query_length': 100,
+}
+
+FTS_TABLE = 'user_search'
+
+# Backend de texto completo por base de datos ('fts5', 'trigram' o None), detectado una vez
+_fulltext_backends = {}
+
+
+def _successor(prefix):
+    """Menor cadena mayor que todas las que empiezan por `prefix` (límite superior del rango)"""
+    return prefix[:-1] + chr(min(ord(prefix[-1]) + 1, 0x10FFFF))
+
+
+def _starts_with(expression, prefix):
+    # Un rango sobre la expresión indexada; LIKE 'q%' no usa el índice en SQLite
+    return and_(expression >= prefix, expression < _successor(prefix))
+
+
+def _user_dict(row):
+    return {'id': row.id, 'username': row.username, 'email': row.email}
+
+
+def prefix_search(query, limit):
+    """Usuarios cuyo username o email empieza por `query`: coincidencias exactas primero,
+    luego por username y luego por email, en orden alfabético"""
+    prefix = query.lower()
+    by_username = func.lower(User.username)
+    by_email = func.lower(User.email)
+    columns = (User.id, User.username, User.email)
+    # Dos recorridos acotados del índice en lugar de un OR que obligaría a ordenar todo
+    username_rows = db.session.execute(
+        select(*columns).where(_starts_with(by_username, prefix)).order_by(by_username).limit(limit)
+    ).all()
+    email_rows = db.session.execute(
+        select(*columns).where(_starts_with(by_email, prefix)).order_by(by_email).limit(limit)
+    ).all()
+
+    exact = [row for row in (*username_rows, *email_rows)
+             if row.username.lower() == prefix or row.email.lower() == prefix]
+    results = {}
+    for row in (*exact, *username_rows, *email_rows):
+        results.setdefault(row.id, row)
+    return [_user_dict(row) for row in list(results.values())[:limit]]
+
+
+def _fts_query(query):
+    """'Juan Pé' -> '"juan"* "pé"*': todas las palabras, cada una como prefijo"""
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _like_pattern(query):
+    escaped = query.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def fulltext_backend():
+    """'fts5' o 'trigram' si la base tiene el índice de texto completo; None si no"""
+    engine = db.engine
+    key = engine.url.render_as_string(hide_password=False)
+    if key not in _fulltext_backends:
+        backend = None
+        with engine.connect() as conn:
+            if engine.dialect.name == 'sqlite':
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}).first()
+                backend = 'fts5' if exists else None
+            elif engine.dialect.name == 'postgresql':
+                exists = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+                backend = 'trigram' if exists else None
+        _fulltext_backends[key] = backend
+    return _fulltext_backends[key]
+
+
+def fulltext_search(query, limit):
+    """Usuarios que contienen las palabras de `query`, del más al menos relevante"""
+    backend = fulltext_backend()
+    user_table = db.engine.dialect.identifier_preparer.format_table(User.__table__)
+    if backend == 'fts5':
+        match = _fts_query(query)
+        if not match:
+            return []
+        # bm25 con más peso para username que para email; rowid de FTS5 = id del usuario
+        rows = db.session.execute(text(
+            f'SELECT u.id, u.username, u.email FROM {FTS_TABLE} '
+            f'JOIN {user_table} AS u ON u.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH :match ORDER BY bm25({FTS_TABLE}, 2.0, 1.0) LIMIT :limit'
+        ), {'match': match, 'limit': limit}).all()
+    elif backend == 'trigram':
+        rows = db.session.execute(text(
+            f'SELECT id, username, email FROM {user_table} '
+            f'WHERE lower(username) LIKE :pattern OR lower(email) LIKE :pattern '
+            f'ORDER BY greatest(similarity(lower(username), :query), similarity(lower(email), :query)) DESC, id '
+            f'LIMIT :limit'
+        ), {'pattern': _like_pattern(query), 'query': query.lower(), 'limit': limit}).all()
+    else:
+        raise RuntimeError('La base de datos no tiene índice de texto completo (init-db)')
+    return [_user_dict(row) for row in rows]
+
+
+def _create_fts5(conn, user_table):
+    created = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+    ).first() is None
+    # Contenido externo: el índice guarda solo los términos; los valores se leen de la tabla de usuarios
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"username, email, content={user_table}, content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {user_table} BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email); END'
+    ))
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {user_table} BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email) "
+        f"VALUES ('delete', old.id, old.username, old.email); END"
+    ))
+    # Solo si cambian los campos indexados (no en cada incremento de version)
+    conn.execute(text(
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF username, email ON {user_table} BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, username, email) "
+        f"VALUES ('delete', old.id, old.username, old.email); "
+        f'INSERT INTO {FTS_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email); END'
+    ))
+    if created:
+        # Usuarios que ya existían antes de crear el índice
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        logger.info(f"Índice de texto completo creado: {FTS_TABLE} (FTS5)")
+
+
+def _create_trigram(conn, user_table):
+    conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    for column in ('username', 'email'):
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_user_{column}_trgm ON {user_table} '
+            f'USING gin (lower({column}) gin_trgm_ops)'
+        ))
+
+
+def create_search_index():
+    """Crea el índice de texto completo si está habilitado y la base lo admite (requiere app context)"""
+    if not USER_SEARCH_CONFIG['fulltext']:
+        return
+    engine = db.engine
+    user_table = engine.dialect.identifier_preparer.format_table(User.__table__)
+    try:
+        with engine.begin() as conn:
+            if engine.dialect.name == 'sqlite':
+                _create_fts5(conn, user_table)
+            elif engine.dialect.name == 'postgresql':
+                _create_trigram(conn, user_table)
+            else:
+                logger.info(f"Sin búsqueda de texto completo para {engine.dialect.name}")
+    except Exception as e:
+        # p. ej. SQLite sin FTS5 o un usuario de PostgreSQL sin permiso para CREATE EXTENSION
+        logger.warning(f"No se pudo crear el índice de texto completo: {str(e)}")
+    _fulltext_backends.pop(engine.url.render_as_string(hide_password=False), None)
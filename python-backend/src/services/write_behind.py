@@ -0,0 +1,371 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError, TimeoutError as PoolTimeout
+
+logger = logging.getLogger(__name__)
+
+
+# Códigos de SQLite que indican bloqueo o falta de recursos, no un problema del esquema o los datos:
+# SQLITE_BUSY, SQLITE_LOCKED, SQLITE_IOERR, SQLITE_FULL, SQLITE_CANTOPEN, SQLITE_PROTOCOL
+SQLITE_TRANSIENT_CODES = frozenset([5, 6, 10, 13, 14, 15])
+# Clases SQLSTATE equivalentes (PostgreSQL y compatibles): conexión, serialización/deadlock,
+# recursos insuficientes, intervención del operador
+SQLSTATE_TRANSIENT_CLASSES = frozenset(['08', '40', '53', '57'])
+TRANSIENT_MESSAGES = ('locked', 'busy', 'connection', 'timeout', 'timed out', 'server closed')
+
+
+def is_transient(error):
+    """Errores de la base (conexión, bloqueo, pool agotado) que se resuelven reintentando el mismo lote.
+
+    Un OperationalError no basta: en SQLite "no such table" o "no such column" también lo son y
+    reintentarlos no sirve. Se mira el código del driver (o el mensaje si no lo expone). El resto
+    (esquema, tipos o valores que la base rechaza, restricciones) son errores de los datos y el
+    lote se divide para aislar el elemento que falla.
+    """
+    if isinstance(error, (DisconnectionError, PoolTimeout)):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    if not isinstance(error, OperationalError):
+        return False
+    orig = error.orig
+    code = getattr(orig, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in SQLITE_TRANSIENT_CODES
+    sqlstate = getattr(orig, 'sqlstate', None) or getattr(orig, 'pgcode', None)
+    if sqlstate:
+        return sqlstate[:2] in SQLSTATE_TRANSIENT_CLASSES
+    message = str(orig).lower()
+    return any(text in message for text in TRANSIENT_MESSAGES)
+
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return {'$decimal': str(value)}
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError(f'Tipo no serializable: {type(value).__name__}')
+
+
+def _decode_value(obj):
+    if '$decimal' in obj:
+        return Decimal(obj['$decimal'])
+    if '$datetime' in obj:
+        return datetime.fromisoformat(obj['$datetime'])
+    return obj
+
+
+class QueueFull(Exception):
+    """La cola está llena y no se liberó espacio dentro del tiempo de espera"""
+
+
+class WriteBehindQueue:
+    """Cola en proceso que agrupa escrituras y las confirma en lotes (group commit).
+
+    submit() solo encola; `workers` hilos de fondo toman hasta batch_size elementos y
+    llaman a writer(lote) dentro de un app context, una transacción por lote. La capacidad
+    es acotada: si está llena, submit() espera hasta timeout y luego lanza QueueFull.
+
+    Los elementos ya se confirmaron al cliente, así que un lote no se descarta:
+    - Error transitorio de la base (is_transient): se reintenta con backoff hasta max_attempts;
+      después el lote se guarda en spill_path (JSON por línea) y se vuelve a escribir cuando la
+      base responde de nuevo o al arrancar el siguiente proceso.
+    - Error de los datos: el lote se divide en mitades hasta aislar los elementos que fallan,
+      que se registran y se apartan en el archivo de cuarentena (<spill_path>.quarantine).
+
+    writer puede devolver elementos que todavía no se pueden escribir (p. ej. un callback cuya orden
+    aún no está en la base): no cuentan como escritos y vuelven a la cola tras retry_delay segundos.
+    """
+
+    def __init__(self, name, writer, capacity=10000, batch_size=500, linger=0.01,
+                 put_timeout=2.0, max_attempts=5, workers=1, spill_path=None, retry_delay=1.0):
+        self.name = name
+        self.writer = writer
+        self.workers = workers
+        self.batch_size = batch_size
+        self.linger = linger
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self.spill_path = spill_path
+        self.retry_delay = retry_delay
+        self.app = None
+        self._queue = queue.Queue(maxsize=capacity)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._outage = False
+        self._replay_due = False
+        self._deferred = []
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.retries = 0
+        self.quarantined = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        atexit.register(self.stop)
+
+    def _ensure_started(self):
+        # Los hilos se crean en el primer uso, así cada worker (tras el fork) tiene los suyos
+        if self._threads and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True,
+                                          name=f'write-behind-{self.name}-{len(self._threads)}')
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item, timeout=None):
+        """Encola un elemento; lanza QueueFull si no hay espacio tras `timeout` segundos"""
+        if self._stopping.is_set():
+            raise QueueFull(f"Cola '{self.name}' detenida")
+        self._ensure_started()
+        timeout = self.put_timeout if timeout is None else timeout
+        entry = (time.monotonic(), item)
+        try:
+            if timeout <= 0:
+                self._queue.put_nowait(entry)
+            else:
+                self._queue.put(entry, timeout=timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise QueueFull(f"Cola '{self.name}' llena")
+        with self._stats_lock:
+            self.enqueued += 1
+
+    def _next_batch(self, block_timeout):
+        try:
+            batch = [self._queue.get(timeout=block_timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _append(self, path, items):
+        """Agrega los elementos a un archivo JSON por línea y lo sincroniza a disco"""
+        lines = ''.join(json.dumps(item, default=_encode_value, ensure_ascii=False) + '\n' for item in items)
+        with self._file_lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _quarantine_path(self):
+        root, ext = os.path.splitext(self.spill_path)
+        return f'{root}.quarantine{ext or ".jsonl"}'
+
+    def _quarantine(self, item, error):
+        with self._stats_lock:
+            self.quarantined += 1
+        logger.critical(f"Elemento de '{self.name}' rechazado por la base, se aparta: {str(error)} - {item!r}")
+        if self.spill_path:
+            try:
+                self._append(self._quarantine_path(), [item])
+            except OSError as e:
+                logger.error(f"No se pudo guardar en cuarentena el elemento de '{self.name}': {str(e)}")
+
+    def _spill(self, batch):
+        """Último recurso al apagar con la base caída: el lote queda en disco para el próximo arranque"""
+        if self.spill_path:
+            try:
+                self._append(self.spill_path, batch)
+                with self._stats_lock:
+                    self.spilled += len(batch)
+                logger.error(f"{len(batch)} elementos de '{self.name}' guardados en {self.spill_path}")
+                return
+            except OSError as e:
+                logger.error(f"No se pudo guardar el lote de '{self.name}' en {self.spill_path}: {str(e)}")
+        with self._stats_lock:
+            self.failed_batches += 1
+            self.dropped += len(batch)
+        # Sin archivo de respaldo el contenido queda en el log para poder recuperarlo
+        logger.critical(f"Lote descartado de '{self.name}': {batch!r}")
+
+    def _write_batch(self, batch):
+        """Escribe el lote; devuelve cuántos elementos se guardaron"""
+        attempt = 0
+        while True:
+            try:
+                with self.app.app_context():
+                    deferred = list(self.writer(batch) or ())
+                if self._outage:
+                    # La base volvió: lo guardado en disco durante la caída se reescribe
+                    self._outage = False
+                    self._replay_due = True
+                if deferred:
+                    self._defer(deferred)
+                return len(batch) - len(deferred)
+            except Exception as e:
+                if not is_transient(e):
+                    if len(batch) == 1:
+                        self._quarantine(batch[0], e)
+                        return 0
+                    middle = len(batch) // 2
+                    logger.warning(f"Lote de '{self.name}' rechazado ({len(batch)} elementos), "
+                                   f"se divide para aislar el error: {str(e)}")
+                    return self._write_batch(batch[:middle]) + self._write_batch(batch[middle:])
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                logger.error(f"Error escribiendo lote de '{self.name}' "
+                             f"({len(batch)} elementos, intento {attempt}): {str(e)}")
+                # Tras max_attempts (o 1 si la base ya estaba caída en el lote anterior) el lote va
+                # al archivo de respaldo: la cola no se queda bloqueada en un mismo lote
+                if attempt >= (1 if self._outage else self.max_attempts):
+                    self._outage = True
+                    self._spill(batch)
+                    return 0
+                time.sleep(min(0.1 * (2 ** attempt), 5))
+
+    def _defer(self, items):
+        """Aparta elementos que writer no pudo escribir todavía; al apagar van al archivo de respaldo"""
+        if self._stopping.is_set():
+            self._spill(items)
+            return
+        retry_at = time.monotonic() + self.retry_delay
+        with self._stats_lock:
+            self._deferred.extend((retry_at, item) for item in items)
+
+    def _release_deferred(self):
+        """Devuelve a la cola los elementos apartados cuyo retry_delay ya pasó"""
+        if not self._deferred:
+            return
+        now = time.monotonic()
+        with self._stats_lock:
+            due = [item for retry_at, item in self._deferred if retry_at <= now]
+            self._deferred = [entry for entry in self._deferred if entry[0] > now]
+        for index, item in enumerate(due):
+            try:
+                self._queue.put_nowait((now, item))
+            except queue.Full:
+                # Cola llena: lo que no entró espera al siguiente intento
+                self._defer(due[index:])
+                return
+
+    def _write(self, entries):
+        written = self._write_batch([item for _, item in entries])
+        # Retraso entre el encolado del elemento más antiguo del lote y su confirmación
+        lag = time.monotonic() - entries[0][0]
+        with self._stats_lock:
+            self.written += written
+            self.batches += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+
+    def _replay_spill(self):
+        """Escribe lo que un proceso anterior dejó en spill_path (lo reclama un solo proceso)"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        claimed = f'{self.spill_path}.{os.getpid()}.{threading.get_ident()}'
+        try:
+            os.rename(self.spill_path, claimed)
+        except OSError:
+            return  # Lo reclamó otro worker
+        with open(claimed, encoding='utf-8') as f:
+            items = [json.loads(line, object_hook=_decode_value) for line in f if line.strip()]
+        logger.info(f"Reescribiendo {len(items)} elementos pendientes de '{self.name}' desde {self.spill_path}")
+        written = 0
+        for start in range(0, len(items), self.batch_size):
+            written += self._write_batch(items[start:start + self.batch_size])
+        with self._stats_lock:
+            self.written += written
+        os.remove(claimed)
+
+    def _run(self):
+        self._replay_spill()
+        while not (self._stopping.is_set() and self._queue.empty()):
+            if self._replay_due and not self._stopping.is_set():
+                self._replay_due = False
+                self._replay_spill()
+            self._release_deferred()
+            entries = self._next_batch(0.5)
+            if entries:
+                self._write(entries)
+                for _ in entries:
+                    self._queue.task_done()
+        # Lo apartado que no llegó a reintentarse se guarda para el próximo arranque
+        with self._stats_lock:
+            deferred, self._deferred = self._deferred, []
+        if deferred:
+            self._spill([item for _, item in deferred])
+
+    def flush(self, timeout=None):
+        """Espera a que todo lo encolado hasta ahora quede procesado (lo apartado no se espera)"""
+        if not self._threads:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout=30):
+        """Deja de aceptar elementos, vacía la cola y detiene los hilos (al apagar el proceso)"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        if any(thread.is_alive() for thread in self._threads):
+            logger.error(f"La cola '{self.name}' no terminó de vaciarse al apagar "
+                         f"({self._queue.qsize()} pendientes)")
+
+    def oldest_pending_age(self):
+        """Segundos que lleva en cola el elemento pendiente más antiguo"""
+        with self._queue.mutex:
+            if not self._queue.queue:
+                return 0.0
+            return time.monotonic() - self._queue.queue[0][0]
+
+    def stats(self):
+        oldest_pending_age = self.oldest_pending_age()
+        with self._stats_lock:
+            return {
+                'depth': self._queue.qsize(),
+                'deferred': len(self._deferred),
+                'capacity': self._queue.maxsize,
+                'workers': self.workers,
+                'oldest_pending_age_s': round(oldest_pending_age, 3),
+                'last_lag_s': round(self.last_lag, 3),
+                'max_lag_s': round(self.max_lag, 3),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'batches': self.batches,
+                'failed_batches': self.failed_batches,
+                'retries': self.retries,
+                'quarantined': self.quarantined,
+                'spilled': self.spilled,
+                'dropped': self.dropped,
+                'rejected': self.rejected
+            }
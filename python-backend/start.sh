@@ -49,6 +49,14 @@ mkdir -p src/database
 echo "✓ Directorio de base de datos verificado"
 echo
 
+# Modo producción: ./start.sh --prod (gunicorn con gunicorn.conf.py)
+if [ "$1" = "--prod" ]; then
+    echo "Preparando base de datos..."
+    flask --app src.main init-db || exit 1
+    echo "Iniciando gunicorn en http://0.0.0.0:${PORT:-5000}"
+    exec gunicorn
+fi
+
 # Ejecutar la aplicación
 echo "Iniciando servidor Flask..."
 echo "La aplicación estará disponible en: http://localhost:5000"
@@ -87,20 +87,25 @@ def test_payment_creation():
     """Prueba la creación de un pago"""
     print("🧪 Probando creación de pago...")
     
-    payment_data = {
-        "customer_name": "Juan Pérez",
-        "customer_email": "juan@example.com",
-        "customer_address": "Calle 123, Ciudad",
-        "items": [
-            {
-                "name": "Producto de prueba",
-                "price": 99.99,
-                "quantity": 1
-            }
-        ]
-    }
-    
     try:
+        # Las líneas referencian productos del catálogo (sku o product_id); el precio lo pone el servidor
+        products = requests.get(f'{API_BASE}/agilpay/products').json().get('data') or []
+        if not products:
+            print("❌ El catálogo está vacío (ejecuta flask --app src.main init-db)")
+            return False
+        
+        payment_data = {
+            "customer_name": "Juan Pérez",
+            "customer_email": "juan@example.com",
+            "customer_address": "Calle 123, Ciudad",
+            "items": [
+                {
+                    "sku": products[0]['sku'],
+                    "quantity": 1
+                }
+            ]
+        }
+        
         response = requests.post(f'{API_BASE}/agilpay/create-payment', json=payment_data)
         if response.status_code == 200:
             data = response.json()
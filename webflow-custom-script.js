@@ -230,8 +230,7 @@ async function processPayment(customerData) {
             customer_email: customerData.email,
             customer_address: customerData.address,
             items: cart.map(item => ({
-                name: item.name,
-                price: item.price,
+                product_id: item.id,
                 quantity: item.quantity
             })),
             success_url: window.location.origin + '/success',